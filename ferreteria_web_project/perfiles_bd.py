@@ -0,0 +1,73 @@
+import os
+import tempfile
+from importlib.util import find_spec
+
+from django.core.exceptions import ImproperlyConfigured
+
+# Perfiles de conexión, elegidos con la variable de entorno DB_PERFIL:
+#   desarrollo  (por defecto) la configuración tal cual, sin ajustes
+#   produccion  SQLite: WAL, espera de bloqueos y transacciones IMMEDIATE para
+#               que varios cajeros vendan a la vez sin "database is locked".
+#               PostgreSQL: pool de conexiones y cursores del lado del servidor
+#               para recorrer reportes grandes con .iterator().
+PERFILES = ('desarrollo', 'produccion')
+
+SQLITE_PRAGMAS = [
+    ('journal_mode', 'WAL'),  # los lectores no bloquean al que escribe (y viceversa)
+    ('busy_timeout', 5000),  # ms que espera un bloqueo antes de fallar
+    ('synchronous', 'NORMAL'),  # seguro con WAL; no sincroniza a disco en cada commit
+    ('cache_size', -20000),  # ~20 MB de páginas en memoria por conexión
+    ('mmap_size', 128 * 1024 * 1024),
+    ('temp_store', 'MEMORY'),
+]
+
+# Conexiones abiertas por proceso como máximo (pool de psycopg 3)
+POOL_MAXIMO = int(os.getenv("DB_POOL_MAX", "10"))
+
+
+def _sqlite_produccion(config):
+    opciones = config['OPTIONS']
+    opciones['init_command'] = "; ".join(f"PRAGMA {nombre}={valor}" for nombre, valor in SQLITE_PRAGMAS)
+    # BEGIN IMMEDIATE toma el bloqueo de escritura al empezar la transacción:
+    # una venta espera su turno (busy_timeout) en vez de fallar al pasar de
+    # leer a escribir cuando otra venta ya está escribiendo
+    opciones['transaction_mode'] = 'IMMEDIATE'
+    # Las pruebas usan un archivo (no la base en memoria compartida, cuyos
+    # bloqueos no respetan busy_timeout) para poder probar la concurrencia
+    config.setdefault('TEST', {}).setdefault(
+        'NAME', os.path.join(tempfile.gettempdir(), 'ferreteria_test.sqlite3')
+    )
+    return config
+
+
+def _postgresql_produccion(config):
+    # Con psycopg 3 y psycopg_pool se usa el pool de Django (exige
+    # CONN_MAX_AGE=0); con psycopg2 cada hilo conserva su conexión y la
+    # verifica antes de reutilizarla
+    if find_spec('psycopg') and find_spec('psycopg_pool'):
+        config['OPTIONS']['pool'] = {'min_size': 1, 'max_size': POOL_MAXIMO, 'timeout': 10}
+        config['CONN_MAX_AGE'] = 0
+    else:
+        config['CONN_MAX_AGE'] = config.get('CONN_MAX_AGE') or 600
+        config['CONN_HEALTH_CHECKS'] = True
+    # .iterator() usa cursores del lado del servidor: los reportes y
+    # exportaciones se leen por partes. Detrás de pgbouncer en modo
+    # transacción hay que desactivarlos (DB_PGBOUNCER=1).
+    config['DISABLE_SERVER_SIDE_CURSORS'] = os.getenv("DB_PGBOUNCER") == "1"
+    return config
+
+
+def aplicar_perfil(config, perfil):
+    # Devuelve una copia de `config` (una entrada de DATABASES) con los
+    # ajustes del perfil para su motor
+    if perfil not in PERFILES:
+        raise ImproperlyConfigured(f"DB_PERFIL debe ser uno de {', '.join(PERFILES)}; se recibió {perfil!r}")
+
+    config = {**config, 'OPTIONS': dict(config.get('OPTIONS') or {})}
+    if perfil == 'desarrollo':
+        return config
+    if config['ENGINE'].endswith('sqlite3'):
+        return _sqlite_produccion(config)
+    if config['ENGINE'].endswith('postgresql'):
+        return _postgresql_produccion(config)
+    return config
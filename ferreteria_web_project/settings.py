@@ -3,6 +3,8 @@ import dj_database_url
 from pathlib import Path
 from decimal import Decimal
 
+from .perfiles_bd import aplicar_perfil
+
 # Redirección después de login
 LOGIN_REDIRECT_URL = 'inicio'
 
@@ -30,6 +32,7 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    'inventario.metricas.MetricasMiddleware',  # después de WhiteNoise: no mide los estáticos
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,6 +75,10 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL:
     DATABASES['default'] = dj_database_url.config(default=DATABASE_URL, conn_max_age=600)
 
+# Ajustes de conexión para producción (ver perfiles_bd.py): DB_PERFIL=produccion
+DB_PERFIL = os.getenv("DB_PERFIL", "desarrollo")
+DATABASES['default'] = aplicar_perfil(DATABASES['default'], DB_PERFIL)
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -97,3 +104,23 @@ SMARTCLICK_URL = "TU_URL_REAL_DE_SMARTCLICK"
 SMARTCLICK_METHOD = "GET"
 SMARTCLICK_API_KEY = "TU_API_KEY_REAL_DE_SMARTCLICK"
 TAX_RATE = Decimal('0.18')
+
+# Números de venta reservados por proceso en cada acceso al contador (1 = sin saltos)
+NUMERACION_BLOQUE = int(os.getenv("NUMERACION_BLOQUE", "1"))
+
+# Caché de fragmentos (tablas de productos, notas de venta): en la memoria de
+# cada proceso por defecto; con CACHE_DIR, en archivos compartidos por los
+# procesos del mismo servidor
+if os.getenv("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR"),
+        }
+    }
+
+# Métricas por vista en /metrics (ver inventario/metricas.py)
+METRICAS_ACTIVAS = os.getenv("METRICAS_ACTIVAS", "1") == "1"
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+# Consultas con la misma forma en una petición a partir de las cuales se avisa de un N+1
+METRICAS_UMBRAL_N_MAS_1 = int(os.getenv("METRICAS_UMBRAL_N_MAS_1", "10"))
@@ -1,12 +1,21 @@
-from django.contrib import admin
-from .models import Producto, Categoria, Cliente, Sale, SaleItem
+from django.contrib import admin, messages
+from django.shortcuts import redirect
+from django.urls import reverse
+from .models import Producto, Categoria, Cliente, Sale, SaleItem, TrabajoImportacion, CajaMovimiento, Reajuste
+from .reajuste import deshacer_reajuste
 
 # Admin para Producto
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
     list_display = ('nombre', 'marca', 'categoria', 'cantidad', 'precio_compra', 'precio_venta', 'ganancia')
     search_fields = ('nombre', 'marca')
-    list_filter = ('categoria',)
+    list_filter = ('categoria', 'activo')
+    actions = ['reajustar_precios']
+
+    @admin.action(description="Reajustar precios de los productos seleccionados")
+    def reajustar_precios(self, request, queryset):
+        ids = ",".join(str(pk) for pk in queryset.values_list('pk', flat=True))
+        return redirect(f"{reverse('reajustar_precios')}?ids={ids}")
 
 # Admin para Categoria
 @admin.register(Categoria)
@@ -46,3 +55,47 @@ class SaleItemAdmin(admin.ModelAdmin):
     def subtotal(self, obj):
         return obj.quantity * obj.price
     subtotal.short_description = "Subtotal"
+
+# Admin para las importaciones de Excel
+@admin.register(TrabajoImportacion)
+class TrabajoImportacionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'nombre_archivo', 'usuario', 'estado', 'filas_procesadas', 'filas_con_error', 'creado')
+    list_filter = ('estado',)
+    exclude = ('archivo',)
+
+# Libro de caja: los movimientos no se editan ni se borran
+@admin.register(CajaMovimiento)
+class CajaMovimientoAdmin(admin.ModelAdmin):
+    list_display = ('id', 'caja', 'tipo', 'monto', 'venta', 'usuario', 'creado')
+    list_filter = ('tipo', 'caja')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+# Reajustes masivos de precios: solo lectura, se deshacen con la acción
+@admin.register(Reajuste)
+class ReajusteAdmin(admin.ModelAdmin):
+    list_display = ('id', 'campo', 'operacion', 'valor', 'productos', 'usuario', 'creado', 'deshecho')
+    list_filter = ('campo', 'operacion')
+    exclude = ('anteriores',)
+    actions = ['deshacer']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    @admin.action(description="Deshacer los reajustes seleccionados")
+    def deshacer(self, request, queryset):
+        # Del más reciente al más antiguo para volver al estado original
+        for reajuste in queryset.filter(deshecho__isnull=True).order_by('-creado'):
+            try:
+                deshacer_reajuste(reajuste)
+            except ValueError as e:
+                self.message_user(request, str(e), level=messages.ERROR)
+                return
+        self.message_user(request, "Reajustes deshechos.")
@@ -0,0 +1,170 @@
+import bisect
+import re
+import threading
+import time
+import unicodedata
+
+from django.conf import settings
+
+from .models import Producto
+
+# Resultados por defecto y máximo permitido por consulta
+LIMITE_RESULTADOS = 20
+LIMITE_MAXIMO = 100
+
+
+def normalizar(texto):
+    # Minúsculas y sin tildes: "Martillo Cabeza Ñ" -> "martillo cabeza n"
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return re.sub(r"[^0-9a-z]+", " ", texto.casefold()).strip()
+
+
+def tokenizar(texto):
+    return normalizar(texto).split()
+
+
+class IndiceProductos:
+    # Índice en memoria (por proceso) sobre nombre, marca y categoría de los
+    # productos activos. Se actualiza producto por producto con las señales de
+    # Producto y se reconstruye completo cuando vence BUSQUEDA_TTL, para recoger
+    # los cambios hechos por otros procesos del servidor.
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._productos = {}  # id -> datos del producto
+        self._tokens_producto = {}  # id -> tokens del producto
+        self._indice = {}  # token -> ids
+        self._ordenados = []  # tokens ordenados para buscar por prefijo
+        self._construido = None
+
+    # --------------------------
+    # CONSTRUCCIÓN
+    # --------------------------
+    def construir(self):
+        filas = (
+            Producto.objects.filter(activo=True)
+            .values('id', 'nombre', 'marca', 'categoria__nombre', 'cantidad', 'precio_venta')
+            .iterator(chunk_size=2000)
+        )
+        with self._lock:
+            self._productos = {}
+            self._tokens_producto = {}
+            self._indice = {}
+            for fila in filas:
+                self._agregar(fila)
+            self._ordenados = sorted(self._indice)
+            self._construido = time.monotonic()
+
+    def invalidar(self):
+        with self._lock:
+            self._construido = None
+
+    def _vigente(self):
+        ttl = getattr(settings, "BUSQUEDA_TTL", 300)
+        return self._construido is not None and time.monotonic() - self._construido < ttl
+
+    def _asegurar(self):
+        if not self._vigente():
+            self.construir()
+
+    # --------------------------
+    # ACTUALIZACIÓN INCREMENTAL
+    # --------------------------
+    def _agregar(self, fila):
+        producto_id = fila['id']
+        tokens = set(tokenizar(f"{fila['nombre']} {fila['marca']} {fila['categoria__nombre']}"))
+        self._productos[producto_id] = {
+            'id': producto_id,
+            'nombre': fila['nombre'],
+            'marca': fila['marca'],
+            'categoria': fila['categoria__nombre'],
+            'stock': fila['cantidad'],
+            'precio_venta': fila['precio_venta'],
+            'nombre_normalizado': normalizar(fila['nombre']),
+        }
+        self._tokens_producto[producto_id] = tokens
+        for token in tokens:
+            self._indice.setdefault(token, set()).add(producto_id)
+
+    def _quitar(self, producto_id):
+        self._productos.pop(producto_id, None)
+        for token in self._tokens_producto.pop(producto_id, ()):
+            ids = self._indice.get(token)
+            if ids is None:
+                continue
+            ids.discard(producto_id)
+            if not ids:
+                del self._indice[token]
+                posicion = bisect.bisect_left(self._ordenados, token)
+                if posicion < len(self._ordenados) and self._ordenados[posicion] == token:
+                    del self._ordenados[posicion]
+
+    def actualizar(self, ids):
+        # Vuelve a leer los productos indicados (una sola consulta)
+        with self._lock:
+            if self._construido is None:
+                return  # se construirá completo en la próxima búsqueda
+            filas = {
+                fila['id']: fila
+                for fila in Producto.objects.filter(id__in=ids, activo=True).values(
+                    'id', 'nombre', 'marca', 'categoria__nombre', 'cantidad', 'precio_venta'
+                )
+            }
+            for producto_id in ids:
+                self._quitar(producto_id)
+                if producto_id in filas:
+                    self._agregar(filas[producto_id])
+                    for token in self._tokens_producto[producto_id]:
+                        posicion = bisect.bisect_left(self._ordenados, token)
+                        if posicion == len(self._ordenados) or self._ordenados[posicion] != token:
+                            self._ordenados.insert(posicion, token)
+
+    def quitar(self, ids):
+        with self._lock:
+            for producto_id in ids:
+                self._quitar(producto_id)
+
+    # --------------------------
+    # BÚSQUEDA
+    # --------------------------
+    def _ids_por_prefijo(self, prefijo):
+        ids = set()
+        posicion = bisect.bisect_left(self._ordenados, prefijo)
+        while posicion < len(self._ordenados) and self._ordenados[posicion].startswith(prefijo):
+            ids |= self._indice[self._ordenados[posicion]]
+            posicion += 1
+        return ids
+
+    def buscar(self, consulta, limite=LIMITE_RESULTADOS):
+        terminos = tokenizar(consulta)
+        if not terminos:
+            return []
+
+        with self._lock:
+            self._asegurar()
+
+            # Todos los términos deben coincidir con algún token (exacto o prefijo)
+            candidatos = None
+            for termino in terminos:
+                ids = self._ids_por_prefijo(termino)
+                candidatos = ids if candidatos is None else candidatos & ids
+                if not candidatos:
+                    return []
+
+            resultados = []
+            for producto_id in candidatos:
+                tokens = self._tokens_producto[producto_id]
+                producto = self._productos[producto_id]
+                exactos = sum(1 for termino in terminos if termino in tokens)
+                empieza = producto['nombre_normalizado'].startswith(terminos[0])
+                resultados.append((-exactos, not empieza, producto['nombre_normalizado'], producto))
+
+            resultados.sort(key=lambda r: r[:3])
+            return [
+                {k: v for k, v in r[3].items() if k != 'nombre_normalizado'}
+                for r in resultados[:limite]
+            ]
+
+
+indice = IndiceProductos()
@@ -0,0 +1,148 @@
+import json
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core import serializers
+from django.core.serializers.base import DeserializationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MODELOS_CAMBIOS, Eliminacion, Sale, SaleItem
+from .numeracion import ajustar_series_venta
+from .signals import agrupar_notificaciones, aplicando_cambios
+from .ventas_diarias import dia_de, reconstruir
+
+# Formato de las líneas; aplicar_cambios rechaza versiones que no conoce
+VERSION = 1
+
+# Solo se exportan cambios con esta antigüedad, para no saltarse filas de
+# transacciones que aún no se confirmaron (igual que los cortes de caja)
+MARGEN_EXPORTACION = timedelta(minutes=1)
+
+# Filas que se leen de la base por vez al exportar
+TAMANO_LOTE = 2000
+
+
+class CambiosInvalidos(Exception):
+    pass
+
+
+# --------------------------
+# EXPORTACIÓN
+# --------------------------
+def _filas_modificadas(modelo, campo, desde, hasta):
+    filas = modelo.objects.filter(**{f'{campo}__lte': hasta})
+    if desde is not None:
+        filas = filas.filter(**{f'{campo}__gt': desde})
+    # Las FK a modelos con clave natural (usuarios) se exportan por esa clave
+    naturales = [
+        f.name for f in modelo._meta.concrete_fields
+        if f.is_relation and hasattr(f.related_model, 'natural_key')
+    ]
+    return filas.select_related(*naturales).order_by(campo, 'pk')
+
+
+def exportar_cambios(salida, desde=None, hasta=None):
+    # Escribe en `salida` una línea JSON por fila creada, modificada o borrada
+    # en (desde, hasta], entre una línea de inicio y una de fin. Devuelve
+    # (hasta, registros): hasta es el `desde` de la próxima exportación.
+    hasta = hasta or timezone.now() - MARGEN_EXPORTACION
+    serializador = serializers.get_serializer('python')()
+
+    def escribir(datos):
+        salida.write(json.dumps(datos, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+
+    escribir({'tipo': 'inicio', 'version': VERSION, 'desde': desde, 'hasta': hasta})
+    registros = 0
+    for modelo, campo in MODELOS_CAMBIOS.items():
+        generados = [f.name for f in modelo._meta.concrete_fields if f.generated]
+        for objeto in _filas_modificadas(modelo, campo, desde, hasta).iterator(chunk_size=TAMANO_LOTE):
+            registro = serializador.serialize([objeto], use_natural_foreign_keys=True)[0]
+            for nombre in generados:
+                registro['fields'].pop(nombre, None)  # la base de destino los calcula
+            escribir(registro)
+            registros += 1
+
+    bajas = Eliminacion.objects.filter(eliminado__lte=hasta)
+    if desde is not None:
+        bajas = bajas.filter(eliminado__gt=desde)
+    for modelo, objeto_id in bajas.order_by('eliminado', 'id').values_list('modelo', 'objeto_id').iterator():
+        escribir({'model': modelo, 'pk': objeto_id, 'eliminado': True})
+        registros += 1
+
+    escribir({'tipo': 'fin', 'hasta': hasta, 'registros': registros})
+    return hasta, registros
+
+
+# --------------------------
+# APLICACIÓN
+# --------------------------
+def aplicar_cambios(entrada):
+    # Aplica las líneas de exportar_cambios como loaddata (sin Model.save ni
+    # auto_now), todo en una transacción: si el archivo está cortado o una
+    # línea falla no se aplica nada. Devuelve {'guardados', 'eliminados', 'hasta'}.
+    guardados = Counter()
+    eliminados = Counter()
+    bajas = defaultdict(list)
+    dias = set()
+    fin = None
+    leidos = 0
+
+    with transaction.atomic(), agrupar_notificaciones(), aplicando_cambios():
+        for numero, linea in enumerate(entrada, start=1):
+            if not linea.strip():
+                continue
+            if fin is not None:
+                raise CambiosInvalidos(f"Línea {numero}: hay datos después de la línea final")
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                raise CambiosInvalidos(f"Línea {numero}: no es JSON válido")
+
+            tipo = registro.get('tipo')
+            if tipo == 'inicio':
+                if registro.get('version') != VERSION:
+                    raise CambiosInvalidos(f"Versión de formato no soportada: {registro.get('version')}")
+                continue
+            if tipo == 'fin':
+                fin = registro
+                continue
+
+            leidos += 1
+            if registro.get('eliminado'):
+                bajas[registro.get('model')].append(registro.get('pk'))
+                continue
+            try:
+                for objeto in serializers.deserialize('python', [registro], ignorenonexistent=True):
+                    objeto.save()
+                    if isinstance(objeto.object, Sale):
+                        dias.add(dia_de(objeto.object))
+            except DeserializationError as e:
+                raise CambiosInvalidos(f"Línea {numero}: {e}")
+            guardados[registro['model']] += 1
+
+        if fin is None:
+            raise CambiosInvalidos("El archivo está incompleto: falta la línea final")
+        if fin.get('registros') != leidos:
+            raise CambiosInvalidos(f"Se esperaban {fin.get('registros')} registros y llegaron {leidos}")
+
+        # Bajas de los hijos antes que las de sus padres
+        for modelo in reversed(list(MODELOS_CAMBIOS)):
+            ids = bajas.pop(modelo._meta.label_lower, None)
+            if not ids:
+                continue
+            filas = modelo.objects.filter(pk__in=ids)
+            if modelo is Sale:
+                dias.update(dia_de(venta) for venta in filas.only('fecha'))
+            filas.delete()
+            eliminados[modelo._meta.label_lower] += len(ids)
+        if bajas:
+            raise CambiosInvalidos(f"Bajas de modelos que no se exportan: {', '.join(map(str, bajas))}")
+
+        if guardados[Sale._meta.label_lower] or guardados[SaleItem._meta.label_lower]:
+            ajustar_series_venta()
+        if dias:
+            reconstruir(min(dias), max(dias))
+
+    return {'guardados': guardados, 'eliminados': eliminados, 'hasta': fin.get('hasta')}
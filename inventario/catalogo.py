@@ -0,0 +1,66 @@
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .cambios import MARGEN_EXPORTACION
+from .models import Eliminacion, Producto
+from .numeracion import catalogo_completo_desde
+
+# Columnas de cada producto, en el orden de las filas (y con los nombres que
+# usa la búsqueda del servidor)
+CAMPOS = ['id', 'nombre', 'marca', 'categoria', 'precio_venta', 'stock']
+
+# Filas que se leen de la base por vez
+TAMANO_LOTE = 2000
+
+
+def leer_marca(valor):
+    # Marca devuelta por una respuesta anterior; None si falta o no es válida
+    try:
+        marca = datetime.fromisoformat(valor or "")
+    except ValueError:
+        return None
+    return marca if timezone.is_aware(marca) else None
+
+
+def _filas(productos):
+    productos = productos.order_by('id').values_list(
+        'id', 'nombre', 'marca', 'categoria__nombre', 'precio_venta', 'cantidad',
+    )
+    return [list(fila) for fila in productos.iterator(chunk_size=TAMANO_LOTE)]
+
+
+def catalogo(desde=None):
+    # Catálogo para los puntos de venta. Sin `desde` (o si todo el catálogo
+    # cambió después, p. ej. una importación) es la lista completa; con
+    # `desde` solo los productos modificados desde esa marca y los ids que ya
+    # no se venden. El cliente guarda `marca` y la envía en la próxima consulta.
+    # La marca lleva el mismo margen que exportar_cambios, para no saltarse
+    # cambios de transacciones que aún no se confirmaban: algunos productos
+    # se vuelven a enviar, y aplicarlos dos veces no cambia nada.
+    marca = timezone.now() - MARGEN_EXPORTACION
+    completo = desde is None or desde.timestamp() < catalogo_completo_desde()
+
+    if completo:
+        return {
+            'completo': True,
+            'marca': marca,
+            'campos': CAMPOS,
+            'productos': _filas(Producto.objects.filter(activo=True)),
+            'eliminados': [],
+        }
+
+    # El nombre de la categoría va en cada fila: renombrarla también cuenta
+    cambiados = Producto.objects.filter(Q(actualizado__gt=desde) | Q(categoria__actualizado__gt=desde))
+    borrados = Eliminacion.objects.filter(modelo=Producto._meta.label_lower, eliminado__gt=desde)
+    return {
+        'completo': False,
+        'marca': marca,
+        'campos': CAMPOS,
+        'productos': _filas(cambiados.filter(activo=True)),
+        'eliminados': [
+            *cambiados.filter(activo=False).values_list('id', flat=True),
+            *(int(objeto_id) for objeto_id in borrados.values_list('objeto_id', flat=True)),
+        ],
+    }
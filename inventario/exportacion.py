@@ -0,0 +1,169 @@
+import csv
+import re
+import tempfile
+from itertools import groupby
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Producto, Sale, SaleItem
+from .ventas_diarias import inicio_del_dia
+
+# Filas que se leen de la base por vez: la memoria no crece con el tamaño de
+# la exportación (openpyxl en modo write-only escribe cada hoja a disco)
+TAMANO_LOTE = 2000
+
+# Filas CSV que se envían juntas en cada trozo de la respuesta
+FILAS_POR_TROZO = 500
+
+# Las cinco primeras son las que lee importar_excel (ver importacion.leer_fila),
+# así el archivo exportado se puede volver a importar
+COLUMNAS_INVENTARIO = ['nombre', 'marca', 'cantidad', 'UM', 'precio', 'precio venta', 'total inversión']
+COLUMNAS_VENTAS = ['fecha', 'tipo', 'número', 'cliente', 'caja', 'total']
+COLUMNAS_ITEMS = ['fecha', 'tipo', 'número', 'cliente', 'producto', 'marca', 'cantidad', 'precio', 'subtotal']
+
+
+def _fecha_local(fecha):
+    # Excel no admite fechas con zona horaria
+    return timezone.localtime(fecha).replace(tzinfo=None, microsecond=0)
+
+
+# --------------------------
+# FILAS
+# --------------------------
+def filas_inventario():
+    # (categoría, fila) de los productos activos, ordenados por categoría
+    productos = (
+        Producto.objects.filter(activo=True)
+        .order_by('categoria__nombre', 'nombre', 'id')
+        .values_list(
+            'categoria__nombre', 'nombre', 'marca', 'cantidad', 'unidad_medida',
+            'precio_compra', 'precio_venta', 'total_inversion',
+        )
+    )
+    for categoria, *fila in productos.iterator(chunk_size=TAMANO_LOTE):
+        yield categoria, fila
+
+
+def _ventas_del_rango(queryset, campo, desde, hasta):
+    if desde:
+        queryset = queryset.filter(**{f'{campo}__gte': inicio_del_dia(desde)})
+    if hasta:
+        queryset = queryset.filter(**{f'{campo}__lt': inicio_del_dia(hasta, dias=1)})
+    return queryset
+
+
+def filas_ventas(desde=None, hasta=None):
+    ventas = _ventas_del_rango(Sale.objects.all(), 'fecha', desde, hasta).order_by('fecha', 'id').values_list(
+        'fecha', 'tipo_comprobante', 'numero_venta', 'cliente__nombre', 'caja_id', 'total',
+    )
+    for fecha, *resto in ventas.iterator(chunk_size=TAMANO_LOTE):
+        yield [_fecha_local(fecha), *resto]
+
+
+def filas_items(desde=None, hasta=None):
+    items = _ventas_del_rango(SaleItem.objects.all(), 'sale__fecha', desde, hasta).order_by(
+        'sale__fecha', 'sale_id', 'id'
+    ).values_list(
+        'sale__fecha', 'sale__tipo_comprobante', 'sale__numero_venta', 'sale__cliente__nombre',
+        'producto__nombre', 'producto__marca', 'cantidad', 'precio',
+    )
+    for fecha, *resto, cantidad, precio in items.iterator(chunk_size=TAMANO_LOTE):
+        yield [_fecha_local(fecha), *resto, cantidad, precio, cantidad * precio]
+
+
+# --------------------------
+# XLSX Y CSV
+# --------------------------
+def titulo_hoja(nombre, usados):
+    # Excel limita el título a 31 caracteres y no admite []:*?/\
+    base = re.sub(r'[\[\]:*?/\\]', ' ', str(nombre or 'SIN CATEGORIA')).strip()[:31] or 'HOJA'
+    titulo, n = base, 1
+    while titulo.upper() in usados:
+        n += 1
+        titulo = f"{base[:31 - len(str(n)) - 1]}~{n}"
+    usados.add(titulo.upper())
+    return titulo
+
+
+def escribir_xlsx(hojas, encabezado):
+    # hojas: iterable de (título, filas). Devuelve un archivo temporal con el
+    # libro, listo para enviarse
+    libro = Workbook(write_only=True)
+    usados = set()
+    for titulo, filas in hojas:
+        hoja = libro.create_sheet(titulo_hoja(titulo, usados))
+        hoja.append(encabezado)
+        for fila in filas:
+            hoja.append(fila)
+    if not usados:
+        libro.create_sheet('HOJA').append(encabezado)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+class _Eco:
+    # "Archivo" para csv.writer que devuelve la línea en vez de guardarla
+    def write(self, valor):
+        return valor
+
+
+def lineas_csv(encabezado, filas):
+    escritor = csv.writer(_Eco())
+    # BOM para que Excel reconozca el UTF-8 (tildes y Ñ)
+    yield '\ufeff' + escritor.writerow(encabezado)
+    trozo = []
+    for fila in filas:
+        trozo.append(escritor.writerow(fila))
+        if len(trozo) >= FILAS_POR_TROZO:
+            yield ''.join(trozo)
+            trozo = []
+    if trozo:
+        yield ''.join(trozo)
+
+
+# --------------------------
+# RESPUESTAS
+# --------------------------
+FORMATOS = ('xlsx', 'csv')
+
+
+def respuesta_xlsx(archivo, nombre):
+    return FileResponse(
+        archivo, as_attachment=True, filename=f"{nombre}.xlsx",
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+def respuesta_csv(lineas, nombre):
+    respuesta = StreamingHttpResponse(lineas, content_type='text/csv; charset=utf-8')
+    respuesta['Content-Disposition'] = f'attachment; filename="{nombre}.csv"'
+    return respuesta
+
+
+def exportar_inventario(formato):
+    nombre = f"inventario_{timezone.localdate():%Y-%m-%d}"
+    if formato == 'csv':
+        filas = ([categoria, *fila] for categoria, fila in filas_inventario())
+        return respuesta_csv(lineas_csv(['categoría', *COLUMNAS_INVENTARIO], filas), nombre)
+    # Una hoja por categoría, como las lee importar_excel
+    hojas = (
+        (categoria, (fila for _, fila in filas))
+        for categoria, filas in groupby(filas_inventario(), key=lambda par: par[0])
+    )
+    return respuesta_xlsx(escribir_xlsx(hojas, COLUMNAS_INVENTARIO), nombre)
+
+
+def exportar_ventas(formato, desde=None, hasta=None, detalle=False):
+    nombre = "items" if detalle else "ventas"
+    if desde or hasta:
+        nombre += f"_{desde or 'inicio'}_{hasta or 'hoy'}"
+    encabezado = COLUMNAS_ITEMS if detalle else COLUMNAS_VENTAS
+    filas = filas_items(desde, hasta) if detalle else filas_ventas(desde, hasta)
+    if formato == 'csv':
+        return respuesta_csv(lineas_csv(encabezado, filas), nombre)
+    return respuesta_xlsx(escribir_xlsx([("ITEMS" if detalle else "VENTAS", filas)], encabezado), nombre)
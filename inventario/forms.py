@@ -1,7 +1,7 @@
 # inventario/forms.py
 from django import forms
 from django.forms import inlineformset_factory
-from .models import Producto, Categoria, Cliente, Sale, SaleItem
+from .models import Producto, Categoria, Cliente, Reajuste, Sale, SaleItem
 from django.forms import modelformset_factory
 from decimal import Decimal
 
@@ -9,7 +9,7 @@ from decimal import Decimal
 class ProductoForm(forms.ModelForm):
     class Meta:
         model = Producto
-        fields = ['nombre','marca','categoria','cantidad','unidad_medida','precio_compra','porcentaje_ganancia']
+        fields = ['nombre','marca','categoria','cantidad','unidad_medida','precio_compra','porcentaje_ganancia','activo']
         widgets = {
             'cantidad': forms.NumberInput(attrs={'step':'0.01','min':'0'}),
             'precio_compra': forms.NumberInput(attrs={'step':'0.01','min':'0'}),
@@ -34,4 +34,34 @@ class SaleItemForm(forms.ModelForm):
         self.fields['producto'].label_from_instance = lambda obj: f"{obj.nombre} | {obj.marca} | Stock: {obj.cantidad} | Precio: {obj.precio}"
         # Hacer editable el precio
         self.fields['precio'].widget.attrs.update({'class': 'form-control', 'step': '0.01'})
-        self.fields['cantidad'].widget.attrs.update({'class': 'form-control'})
\ No newline at end of file
+        self.fields['cantidad'].widget.attrs.update({'class': 'form-control'})
+
+
+class ReajusteForm(forms.Form):
+    # Filtro de productos + cambio a aplicar (ver inventario/reajuste.py)
+    categoria = forms.ModelChoiceField(queryset=Categoria.objects.order_by('nombre'), required=False, empty_label="Todas")
+    marca = forms.CharField(max_length=200, required=False)
+    busqueda = forms.CharField(max_length=200, required=False, label="Nombre o marca contiene")
+    ids = forms.CharField(required=False, widget=forms.HiddenInput)
+    campo = forms.ChoiceField(choices=Reajuste.CAMPOS)
+    operacion = forms.ChoiceField(choices=Reajuste.OPERACIONES)
+    valor = forms.DecimalField(max_digits=12, decimal_places=2, widget=forms.NumberInput(attrs={'step': '0.01'}))
+
+    def clean_ids(self):
+        return [int(parte) for parte in self.cleaned_data['ids'].split(',') if parte.strip().isdigit()]
+
+    def clean(self):
+        datos = super().clean()
+        if not any(datos.get(campo) for campo in ('categoria', 'marca', 'busqueda', 'ids')):
+            raise forms.ValidationError("Elige una categoría, marca, búsqueda o productos a reajustar.")
+        return datos
+
+    def filtro(self):
+        datos = self.cleaned_data
+        filtro = {
+            'categoria': datos['categoria'].pk if datos.get('categoria') else None,
+            'marca': datos.get('marca'),
+            'busqueda': datos.get('busqueda'),
+            'ids': datos.get('ids'),
+        }
+        return {clave: valor for clave, valor in filtro.items() if valor}
@@ -0,0 +1,549 @@
+import hashlib
+import itertools
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from io import BytesIO
+
+import openpyxl
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .models import Producto, Categoria, TrabajoImportacion
+from .signals import agrupar_notificaciones, notificar_productos
+
+logger = logging.getLogger(__name__)
+
+# Filas que se acumulan en memoria antes de escribirlas con bulk_create
+TAMANO_LOTE = 500
+
+# Columnas esperadas en cada hoja: nombre, marca, cantidad, UM, precio.
+# El precio es el de compra (como lo indica importar_excel.html y como lo
+# escribe exportar_inventario); el de venta lo calcula la base de datos con el
+# % de ganancia. La importación original lo guardaba en precio_venta con
+# precio_compra en 0, y Producto.save lo volvía a poner en 0.
+NUM_COLUMNAS = 5
+
+
+class ResultadoImportacion:
+    def __init__(self):
+        self.creados = 0
+        self.procesadas = 0  # filas válidas leídas
+        self.errores = []
+        self.siguiente = None  # fila donde continuar si el bloque se cortó
+
+        # Solo en modo sincronizar
+        self.altas = 0
+        self.actualizados = 0
+        self.desactivados = 0
+        self.sin_cambios = 0
+        self.cambios = []
+        self.ids = set()  # productos creados, cambiados o desactivados
+
+    def agregar_error(self, hoja, fila, mensaje):
+        self.errores.append({'hoja': hoja, 'fila': fila, 'mensaje': mensaje})
+
+    def registrar_cambio(self, tipo, categoria, nombre, marca, antes=None, despues=None):
+        self.cambios.append({
+            'tipo': tipo,
+            'categoria': categoria,
+            'nombre': nombre,
+            'marca': marca,
+            'antes': antes or {},
+            'despues': despues or {},
+        })
+
+    @property
+    def filas_con_error(self):
+        return len(self.errores)
+
+
+# --------------------------
+# LECTURA DE FILAS
+# --------------------------
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ""
+
+
+def convertir_cantidad(valor):
+    if valor in [None, ""]:
+        return Decimal("0")
+    try:
+        return Decimal(str(valor).strip()).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"Cantidad inválida: {valor!r}")
+
+
+def convertir_precio(valor):
+    texto = _texto(valor)
+    if texto in ["", "nan"]:
+        return Decimal("0")
+    try:
+        return Decimal(texto.replace("S/", "").replace(",", "").strip())
+    except InvalidOperation:
+        raise ValueError(f"Precio inválido: {valor!r}")
+
+
+def leer_fila(fila):
+    # Devuelve un dict con los datos de la fila, None si la fila está vacía
+    # o lanza ValueError si algún valor no se puede interpretar
+    fila = tuple(fila[:NUM_COLUMNAS]) + (None,) * (NUM_COLUMNAS - len(fila))
+    nombre = _texto(fila[0])
+    if not nombre:  # si no hay nombre, no se guarda
+        return None
+
+    return {
+        'nombre': nombre,
+        'marca': _texto(fila[1]),
+        'cantidad': convertir_cantidad(fila[2]),
+        'unidad_medida': _texto(fila[3]),
+        'precio_compra': convertir_precio(fila[4]),
+    }
+
+
+def abrir_workbook(archivo):
+    # read_only: openpyxl recorre las filas en streaming sin cargar toda la hoja
+    return openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+
+
+def nombre_categoria(hoja):
+    return hoja.title.strip().upper()
+
+
+def iterar_filas(hoja, desde=2):
+    # Devuelve (numero_de_fila, valores) a partir de la fila indicada
+    for numero, fila in enumerate(hoja.iter_rows(min_row=desde, values_only=True), start=desde):
+        yield numero, fila
+
+
+class LectorFilas:
+    # Conserva el iterador de la hoja entre los pasos de una misma ejecución.
+    # En modo read_only cada iter_rows vuelve a leer la hoja desde el inicio:
+    # abrir uno por paso haría la importación cuadrática en filas.
+    def __init__(self):
+        self._hoja = None
+        self._fila = None  # número de la próxima fila que entrega el iterador
+        self._filas = None
+
+    def filas(self, hoja, desde=2):
+        # Si el cursor no coincide (otro proceso avanzó el trabajo) se reabre
+        if hoja is not self._hoja or desde != self._fila:
+            self._hoja = hoja
+            self._filas = iterar_filas(hoja, desde)
+        self._fila = desde
+        return self
+
+    def devolver(self, numero, fila):
+        # La fila leída de más queda para el siguiente paso
+        self._filas = itertools.chain([(numero, fila)], self._filas)
+        self._fila = numero
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        numero, fila = next(self._filas)
+        self._fila = numero + 1
+        return numero, fila
+
+
+# --------------------------
+# ESCRITURA POR LOTES
+# --------------------------
+def construir_productos(categoria, lote, porcentaje_ganancia=Decimal("30")):
+    # precio_venta, total_inversion y ganancia los calcula la base de datos
+    return [Producto(categoria=categoria, porcentaje_ganancia=porcentaje_ganancia, **datos) for datos in lote]
+
+
+def guardar_lote(categoria, lote, resultado):
+    # bulk_create devuelve los ids en PostgreSQL y SQLite 3.35+
+    if not lote:
+        return
+    creados = Producto.objects.bulk_create(construir_productos(categoria, lote))
+    resultado.creados += len(creados)
+    resultado.ids.update(producto.pk for producto in creados)
+
+
+def eliminar_categorias_vacias():
+    Categoria.objects.filter(producto__isnull=True).delete()
+
+
+def leer_filas_validas(hoja, resultado, desde=2, max_filas=None, lector=None):
+    # Genera (numero, datos) para las filas válidas y anota los errores en
+    # resultado. Si se alcanza max_filas deja en resultado.siguiente la fila
+    # donde continuar; si la hoja terminó queda en None.
+    resultado.siguiente = None
+    leidas = 0
+
+    filas = lector.filas(hoja, desde) if lector else iterar_filas(hoja, desde)
+    for numero, fila in filas:
+        if max_filas is not None and leidas >= max_filas:
+            resultado.siguiente = numero
+            if lector:
+                lector.devolver(numero, fila)
+            return
+        leidas += 1
+
+        try:
+            datos = leer_fila(fila)
+        except ValueError as e:
+            resultado.agregar_error(hoja.title, numero, str(e))
+            continue
+        if datos is None:
+            continue
+
+        resultado.procesadas += 1
+        yield numero, datos
+
+
+def importar_filas(hoja, categoria, resultado, desde=2, max_filas=None, tamano_lote=TAMANO_LOTE, lector=None):
+    # Inserta las filas de la hoja a partir de `desde`. Devuelve la siguiente
+    # fila pendiente si se alcanzó max_filas, o None si la hoja terminó.
+    lote = []
+    for _, datos in leer_filas_validas(hoja, resultado, desde, max_filas, lector):
+        lote.append(datos)
+        if len(lote) >= tamano_lote:
+            guardar_lote(categoria, lote, resultado)
+            lote = []
+
+    guardar_lote(categoria, lote, resultado)
+    return resultado.siguiente
+
+
+# --------------------------
+# SINCRONIZACIÓN POR DIFERENCIAS
+# --------------------------
+# Columnas del Excel que se comparan; nombre y marca forman la clave
+CAMPOS_SINCRONIZADOS = ('cantidad', 'unidad_medida', 'precio_compra')
+CAMPOS_ACTUALIZADOS = list(CAMPOS_SINCRONIZADOS) + ['activo', 'actualizado']
+
+# Máximo de cambios guardados para la vista previa
+MAX_CAMBIOS_GUARDADOS = 1000
+
+
+def clave_producto(nombre, marca):
+    return ((nombre or "").strip().casefold(), (marca or "").strip().casefold())
+
+
+def _normalizar(valor):
+    if isinstance(valor, Decimal):
+        return str(valor.quantize(Decimal("0.01")))
+    return str(valor or "").strip()
+
+
+def huella(datos):
+    texto = "|".join(_normalizar(datos[campo]) for campo in CAMPOS_SINCRONIZADOS)
+    return hashlib.sha1(texto.encode("utf-8")).hexdigest()
+
+
+def huella_producto(producto):
+    return huella({campo: getattr(producto, campo) for campo in CAMPOS_SINCRONIZADOS})
+
+
+def sincronizar_filas(hoja, resultado, desde=2, max_filas=None, simular=False, lector=None):
+    # Compara las filas con los productos de la categoría (categoria, nombre, marca)
+    # y solo escribe altas y cambios. Devuelve la siguiente fila pendiente o None.
+    categoria_nombre = nombre_categoria(hoja)
+    filas = list(leer_filas_validas(hoja, resultado, desde, max_filas, lector))
+    if not filas:
+        return resultado.siguiente
+
+    categoria = Categoria.objects.filter(nombre=categoria_nombre).first()
+    existentes = {}
+    if categoria:
+        for producto in Producto.objects.filter(categoria=categoria).order_by('id'):
+            existentes.setdefault(clave_producto(producto.nombre, producto.marca), producto)
+
+    nuevos = {}
+    modificados = {}
+    for _, datos in filas:
+        clave = clave_producto(datos['nombre'], datos['marca'])
+        producto = existentes.get(clave)
+
+        if producto is None:
+            nuevos[clave] = datos  # si la fila se repite, gana la última
+            continue
+
+        if producto.activo and huella_producto(producto) == huella(datos):
+            resultado.sin_cambios += 1
+            continue
+
+        antes = {campo: _normalizar(getattr(producto, campo)) for campo in CAMPOS_SINCRONIZADOS}
+        for campo in CAMPOS_SINCRONIZADOS:
+            setattr(producto, campo, datos[campo])
+        producto.activo = True
+        producto.actualizado = timezone.now()  # bulk_update no aplica auto_now
+        modificados[producto.pk] = producto
+        resultado.registrar_cambio(
+            'cambio', categoria_nombre, producto.nombre, producto.marca, antes,
+            {campo: _normalizar(datos[campo]) for campo in CAMPOS_SINCRONIZADOS},
+        )
+
+    for datos in nuevos.values():
+        resultado.registrar_cambio(
+            'alta', categoria_nombre, datos['nombre'], datos['marca'],
+            despues={campo: _normalizar(datos[campo]) for campo in CAMPOS_SINCRONIZADOS},
+        )
+    resultado.altas += len(nuevos)
+    resultado.actualizados += len(modificados)
+
+    if not simular:
+        if nuevos:
+            if categoria is None:
+                categoria, _ = Categoria.objects.get_or_create(nombre=categoria_nombre)
+            guardar_lote(categoria, list(nuevos.values()), resultado)
+        if modificados:
+            Producto.objects.bulk_update(modificados.values(), CAMPOS_ACTUALIZADOS, batch_size=TAMANO_LOTE)
+            resultado.ids.update(modificados)
+
+    return resultado.siguiente
+
+
+def desactivar_faltantes(workbook, resultado, simular=False):
+    # Desactiva los productos activos que ya no aparecen en ninguna hoja
+    claves = set()
+    for hoja in workbook.worksheets:
+        categoria_nombre = nombre_categoria(hoja)
+        for _, fila in iterar_filas(hoja):
+            if fila and fila[0]:
+                marca = fila[1] if len(fila) > 1 else None
+                claves.add((categoria_nombre,) + clave_producto(_texto(fila[0]), _texto(marca)))
+
+    faltantes = []
+    activos = Producto.objects.filter(activo=True).values_list('id', 'categoria__nombre', 'nombre', 'marca')
+    for producto_id, categoria_nombre, nombre, marca in activos.iterator():
+        if (categoria_nombre,) + clave_producto(nombre, marca) not in claves:
+            faltantes.append(producto_id)
+            resultado.registrar_cambio('baja', categoria_nombre, nombre, marca)
+
+    resultado.desactivados += len(faltantes)
+    if faltantes and not simular:
+        for i in range(0, len(faltantes), TAMANO_LOTE):
+            Producto.objects.filter(id__in=faltantes[i:i + TAMANO_LOTE]).update(activo=False, actualizado=timezone.now())
+        resultado.ids.update(faltantes)
+
+
+# --------------------------
+# IMPORTACIÓN COMPLETA
+# --------------------------
+def importar_workbook(archivo, tamano_lote=TAMANO_LOTE):
+    resultado = ResultadoImportacion()
+    workbook = abrir_workbook(archivo)
+
+    try:
+        with transaction.atomic(), agrupar_notificaciones():
+            # ⚠️ Esto borra todos los productos antes de importar
+            Producto.objects.all().delete()
+
+            for hoja in workbook.worksheets:
+                categoria_obj, _ = Categoria.objects.get_or_create(nombre=nombre_categoria(hoja))
+                importar_filas(hoja, categoria_obj, resultado, tamano_lote=tamano_lote)
+
+            eliminar_categorias_vacias()
+            notificar_productos()
+    finally:
+        workbook.close()
+
+    return resultado
+
+
+def sincronizar_workbook(archivo, simular=False, desactivar=False):
+    resultado = ResultadoImportacion()
+    workbook = abrir_workbook(archivo)
+
+    try:
+        with transaction.atomic():
+            for hoja in workbook.worksheets:
+                sincronizar_filas(hoja, resultado, simular=simular)
+            if desactivar:
+                desactivar_faltantes(workbook, resultado, simular=simular)
+            # Solo se avisa de los productos que cambiaron; sin diferencias, nada
+            if resultado.ids:
+                notificar_productos(resultado.ids)
+    finally:
+        workbook.close()
+
+    return resultado
+
+
+# --------------------------
+# IMPORTACIÓN POR PASOS (TRABAJOS)
+# --------------------------
+# Máximo de errores guardados en el trabajo; el contador sigue sumando
+MAX_ERRORES_GUARDADOS = 500
+
+# Segundos sin avance tras los cuales un trabajo "procesando" se considera caído
+TIEMPO_TRABAJO_CAIDO = 120
+
+
+def crear_trabajo(archivo, usuario=None, modo=TrabajoImportacion.SINCRONIZAR,
+                  simular=False, desactivar_faltantes=False):
+    return TrabajoImportacion.objects.create(
+        usuario=usuario,
+        nombre_archivo=getattr(archivo, "name", "") or "",
+        archivo=archivo.read(),
+        modo=modo,
+        # La vista previa solo tiene sentido al sincronizar
+        simular=simular and modo == TrabajoImportacion.SINCRONIZAR,
+        desactivar_faltantes=desactivar_faltantes,
+    )
+
+
+def aplicar_vista_previa(trabajo, usuario=None):
+    # Crea el trabajo que aplica los cambios mostrados en una vista previa
+    return TrabajoImportacion.objects.create(
+        usuario=usuario,
+        nombre_archivo=trabajo.nombre_archivo,
+        archivo=trabajo.archivo,
+        modo=trabajo.modo,
+        desactivar_faltantes=trabajo.desactivar_faltantes,
+    )
+
+
+def _acumular(trabajo, resultado):
+    trabajo.filas_procesadas += resultado.procesadas
+    trabajo.filas_con_error += resultado.filas_con_error
+    trabajo.altas += resultado.altas
+    trabajo.actualizados += resultado.actualizados
+    trabajo.desactivados += resultado.desactivados
+    trabajo.sin_cambios += resultado.sin_cambios
+
+    espacio = MAX_ERRORES_GUARDADOS - len(trabajo.errores)
+    if espacio > 0 and resultado.errores:
+        trabajo.errores = trabajo.errores + resultado.errores[:espacio]
+    espacio = MAX_CAMBIOS_GUARDADOS - len(trabajo.cambios)
+    if espacio > 0 and resultado.cambios:
+        trabajo.cambios = trabajo.cambios + resultado.cambios[:espacio]
+
+
+def _guardar_avisos(trabajo, pendiente, resultado):
+    # Los avisos de cada paso quedan en el trabajo y se envían una sola vez al
+    # terminar; al reemplazar se avisa de todo el catálogo, no hace falta guardarlos
+    if not trabajo.simular and trabajo.modo == TrabajoImportacion.SINCRONIZAR:
+        trabajo.ids_pendientes = sorted(set(trabajo.ids_pendientes) | pendiente['ids'] | resultado.ids)
+        trabajo.categorias_pendientes = sorted(
+            set(trabajo.categorias_pendientes) | pendiente['categorias'] - {None}
+        )
+    pendiente['todo'] = False
+    pendiente['ids'].clear()
+    pendiente['categorias'].clear()
+
+
+def procesar_paso(trabajo_id, workbook=None, max_filas=TAMANO_LOTE, lector=None):
+    # Procesa hasta max_filas filas de la hoja actual. Los productos y el cursor
+    # se guardan en la misma transacción: si el proceso muere, el siguiente paso
+    # continúa exactamente donde quedó el último que se confirmó.
+    cerrar = workbook is None
+    with transaction.atomic(), agrupar_notificaciones() as pendiente:
+        trabajo = TrabajoImportacion.objects.select_for_update().get(pk=trabajo_id)
+        if trabajo.terminado:
+            return trabajo
+
+        if workbook is None:
+            workbook = abrir_workbook(BytesIO(trabajo.archivo))
+        try:
+            hojas = workbook.worksheets
+
+            reemplazar = trabajo.modo == TrabajoImportacion.REEMPLAZAR
+            resultado = ResultadoImportacion()
+
+            if trabajo.estado == TrabajoImportacion.PENDIENTE:
+                if reemplazar:
+                    # ⚠️ Esto borra todos los productos antes de importar
+                    Producto.objects.all().delete()
+                trabajo.estado = TrabajoImportacion.PROCESANDO
+                trabajo.total_hojas = len(hojas)
+
+            if trabajo.indice_hoja >= len(hojas):
+                if reemplazar:
+                    eliminar_categorias_vacias()
+                elif trabajo.desactivar_faltantes:
+                    desactivar_faltantes(workbook, resultado, simular=trabajo.simular)
+                    _acumular(trabajo, resultado)
+                _guardar_avisos(trabajo, pendiente, resultado)
+                trabajo.estado = TrabajoImportacion.COMPLETADO
+                trabajo.hoja_actual = ""
+                trabajo.save()
+                if reemplazar:
+                    notificar_productos()
+                elif trabajo.ids_pendientes or trabajo.categorias_pendientes:
+                    notificar_productos(trabajo.ids_pendientes, trabajo.categorias_pendientes)
+                return trabajo
+
+            hoja = hojas[trabajo.indice_hoja]
+            if reemplazar:
+                categoria_obj, _ = Categoria.objects.get_or_create(nombre=nombre_categoria(hoja))
+                siguiente = importar_filas(
+                    hoja, categoria_obj, resultado,
+                    desde=trabajo.fila_siguiente, max_filas=max_filas, lector=lector,
+                )
+            else:
+                siguiente = sincronizar_filas(
+                    hoja, resultado,
+                    desde=trabajo.fila_siguiente, max_filas=max_filas, simular=trabajo.simular,
+                    lector=lector,
+                )
+
+            trabajo.hoja_actual = hoja.title
+            if siguiente is None:
+                trabajo.indice_hoja += 1
+                trabajo.fila_siguiente = 2
+            else:
+                trabajo.fila_siguiente = siguiente
+
+            _acumular(trabajo, resultado)
+            _guardar_avisos(trabajo, pendiente, resultado)
+            trabajo.save()
+            return trabajo
+        finally:
+            if cerrar:
+                workbook.close()
+
+
+def ejecutar_trabajo(trabajo_id, max_filas=TAMANO_LOTE):
+    # Ejecuta pasos hasta terminar. El workbook y el iterador de filas se abren
+    # una sola vez por ejecución.
+    trabajo = TrabajoImportacion.objects.get(pk=trabajo_id)
+    workbook = abrir_workbook(BytesIO(trabajo.archivo))
+    lector = LectorFilas()
+    try:
+        while not trabajo.terminado:
+            trabajo = procesar_paso(trabajo_id, workbook=workbook, max_filas=max_filas, lector=lector)
+    except Exception as e:
+        TrabajoImportacion.objects.filter(pk=trabajo_id).update(
+            estado=TrabajoImportacion.ERROR, mensaje=str(e), actualizado=timezone.now()
+        )
+        logger.exception("Error en la importación %s", trabajo_id)
+    finally:
+        workbook.close()
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    try:
+        ejecutar_trabajo(trabajo_id)
+    finally:
+        connections.close_all()
+
+
+def lanzar_trabajo(trabajo):
+    # Por defecto el trabajo corre en un hilo fuera de la petición; con
+    # IMPORTACION_EN_HILO = False se ejecuta en línea (tests, comandos)
+    if getattr(settings, "IMPORTACION_EN_HILO", True):
+        hilo = threading.Thread(target=_ejecutar_en_hilo, args=(trabajo.pk,), daemon=True)
+        hilo.start()
+    else:
+        ejecutar_trabajo(trabajo.pk)
+
+
+def reclamar_trabajo(trabajo):
+    # Toma un trabajo caído para reanudarlo. El UPDATE condicionado es atómico:
+    # si dos consultas lo ven caído a la vez, solo una lo reclama y lo lanza.
+    limite = timezone.now() - timedelta(seconds=TIEMPO_TRABAJO_CAIDO)
+    reclamados = TrabajoImportacion.objects.filter(
+        pk=trabajo.pk,
+        estado__in=[TrabajoImportacion.PENDIENTE, TrabajoImportacion.PROCESANDO],
+        actualizado__lt=limite,
+    ).update(actualizado=timezone.now())
+    return reclamados == 1
@@ -0,0 +1,101 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Caja, CajaCorte, CajaMovimiento
+
+# Los cortes solo cubren movimientos con esta antigüedad, para no dejar fuera
+# movimientos de transacciones que aún no se confirmaron
+MARGEN_CORTE = timedelta(minutes=1)
+
+
+def registrar_movimiento(caja, tipo, monto, venta=None, usuario=None, descripcion=""):
+    # caja puede ser la instancia o solo su id
+    destino = {'caja': caja} if isinstance(caja, Caja) else {'caja_id': caja}
+    return CajaMovimiento.objects.create(
+        **destino,
+        tipo=tipo,
+        monto=monto,
+        venta=venta,
+        usuario=usuario,
+        descripcion=descripcion,
+    )
+
+
+def _tipo_por_signo(monto):
+    return CajaMovimiento.VENTA if monto > 0 else CajaMovimiento.DEVOLUCION
+
+
+def registrar_cambio_venta(venta, total_anterior, caja_anterior_id):
+    # Registra en el libro la diferencia entre el total anterior y el actual de
+    # la venta, en vez de reescribir Caja.total
+    total_anterior = total_anterior or Decimal("0.00")
+
+    if caja_anterior_id and caja_anterior_id != venta.caja_id and total_anterior:
+        registrar_movimiento(
+            caja_anterior_id, CajaMovimiento.DEVOLUCION, -total_anterior, venta=venta,
+            descripcion=f"Venta {venta.numero_venta} movida a otra caja",
+        )
+        total_anterior = Decimal("0.00")
+    elif caja_anterior_id != venta.caja_id:
+        total_anterior = Decimal("0.00")
+
+    diferencia = venta.total - total_anterior
+    if diferencia and venta.caja and venta.caja.abierta:
+        registrar_movimiento(
+            venta.caja, _tipo_por_signo(diferencia), diferencia, venta=venta,
+            descripcion=f"Venta {venta.numero_venta}",
+        )
+
+
+def _ultimo_corte(caja_id):
+    return CajaCorte.objects.filter(caja_id=caja_id).order_by('-hasta_movimiento').first()
+
+
+def saldo_caja(caja):
+    # Último corte + movimientos posteriores: dos consultas sobre índices, sin
+    # bloquear la fila de la caja. Solo lee; los cortes los guardan el comando
+    # cortes_caja y el cierre de la caja.
+    caja_id = getattr(caja, 'pk', caja)
+    corte = _ultimo_corte(caja_id)
+    desde = corte.hasta_movimiento if corte else 0
+    base = corte.total if corte else Decimal("0.00")
+
+    pendientes = CajaMovimiento.objects.filter(caja_id=caja_id, id__gt=desde).aggregate(total=Sum('monto'))
+    return base + (pendientes['total'] or Decimal("0.00"))
+
+
+def crear_corte(caja, hasta=None):
+    # Guarda el saldo acumulado hasta el último movimiento con antigüedad
+    # suficiente (o hasta el momento indicado)
+    caja_id = getattr(caja, 'pk', caja)
+    corte = _ultimo_corte(caja_id)
+    desde = corte.hasta_movimiento if corte else 0
+    base = corte.total if corte else Decimal("0.00")
+    hasta = hasta or timezone.now() - MARGEN_CORTE
+
+    nuevos = CajaMovimiento.objects.filter(caja_id=caja_id, id__gt=desde, creado__lte=hasta).aggregate(
+        total=Sum('monto'), cantidad=Count('id'), ultimo=Max('id')
+    )
+    if not nuevos['cantidad']:
+        return corte
+
+    return CajaCorte.objects.create(
+        caja_id=caja_id,
+        hasta_movimiento=nuevos['ultimo'],
+        total=base + nuevos['total'],
+        movimientos=(corte.movimientos if corte else 0) + nuevos['cantidad'],
+    )
+
+
+def cerrar_caja(caja, monto_cierre):
+    # Corte final con todos los movimientos y total congelado en la caja
+    crear_corte(caja, hasta=timezone.now())
+    caja.total = saldo_caja(caja)
+    caja.monto_cierre = monto_cierre
+    caja.fecha_cierre = timezone.now()
+    caja.abierta = False
+    caja.save()
+    return caja
@@ -0,0 +1,32 @@
+import gzip
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.cambios import CambiosInvalidos, aplicar_cambios
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica en una transacción un archivo generado por exportar_cambios. Los usuarios de las "
+        "cajas deben existir en esta base (se buscan por nombre de usuario)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help="Archivo .jsonl (o .jsonl.gz).")
+
+    def handle(self, *args, **options):
+        ruta = options['archivo']
+        abrir = gzip.open if ruta.endswith('.gz') else open
+        try:
+            with abrir(ruta, 'rt', encoding='utf-8') as entrada:
+                resultado = aplicar_cambios(entrada)
+        except OSError as e:
+            raise CommandError(f"No se pudo leer el archivo: {e}")
+        except CambiosInvalidos as e:
+            raise CommandError(f"No se aplicó ningún cambio. {e}")
+
+        for modelo, cantidad in resultado['guardados'].items():
+            self.stdout.write(f"{modelo}: {cantidad} guardados")
+        for modelo, cantidad in resultado['eliminados'].items():
+            self.stdout.write(f"{modelo}: {cantidad} eliminados")
+        self.stdout.write(self.style.SUCCESS(f"Cambios aplicados hasta {resultado['hasta']}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventario.libro_caja import crear_corte, saldo_caja
+from inventario.models import Caja
+
+
+class Command(BaseCommand):
+    help = "Guarda un corte del libro de caja para cada caja abierta (para ejecutar periódicamente)."
+
+    def handle(self, *args, **options):
+        for caja in Caja.objects.filter(abierta=True):
+            corte = crear_corte(caja)
+            movimientos = corte.movimientos if corte else 0
+            self.stdout.write(f"Caja {caja.pk}: saldo S/ {saldo_caja(caja):.2f} ({movimientos} movimientos en cortes)")
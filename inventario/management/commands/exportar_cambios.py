@@ -0,0 +1,43 @@
+import gzip
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from inventario.cambios import exportar_cambios
+
+
+def abrir_salida(ruta):
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, 'wt', encoding='utf-8')
+    return open(ruta, 'w', encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporta como JSON Lines las filas creadas, modificadas o borradas desde una marca de tiempo. "
+        "Sin --desde ni --marca exporta todo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help="Marca de la exportación anterior (ISO 8601).")
+        parser.add_argument('--marca', help="Archivo con la marca: se lee como --desde y se actualiza al terminar.")
+        parser.add_argument('--salida', help="Archivo de salida (.gz para comprimir). Por defecto la salida estándar.")
+
+    def handle(self, *args, **options):
+        marca = Path(options['marca']) if options['marca'] else None
+        texto = options['desde'] or (marca.read_text().strip() if marca and marca.exists() else None)
+        desde = parse_datetime(texto) if texto else None
+        if texto and desde is None:
+            raise CommandError(f"Marca inválida: {texto!r}")
+
+        if options['salida']:
+            with abrir_salida(options['salida']) as salida:
+                hasta, registros = exportar_cambios(salida, desde)
+        else:
+            hasta, registros = exportar_cambios(self.stdout, desde)
+
+        # La marca solo avanza si la exportación terminó completa
+        if marca:
+            marca.write_text(hasta.isoformat() + "\n")
+        self.stderr.write(f"{registros} cambios exportados hasta {hasta.isoformat()}")
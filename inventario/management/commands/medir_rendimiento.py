@@ -0,0 +1,79 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from inventario import rendimiento
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos en una base de pruebas temporal, mide las vistas principales "
+        "(p50/p95 y consultas SQL) y muestra el resultado en JSON. Con --base falla si algún "
+        "escenario empeora respecto de una medición guardada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categorias', type=int, default=rendimiento.CATEGORIAS)
+        parser.add_argument('--productos', type=int, default=rendimiento.PRODUCTOS)
+        parser.add_argument('--ventas', type=int, default=rendimiento.VENTAS)
+        parser.add_argument('--cajas-cerradas', type=int, default=rendimiento.CAJAS_CERRADAS)
+        parser.add_argument('--repeticiones', type=int, default=20, help="Peticiones medidas por escenario.")
+        parser.add_argument('--semilla', type=int, default=0)
+        parser.add_argument('--solo', nargs='+', metavar='ESCENARIO', help="Mide solo estos escenarios.")
+        parser.add_argument('--salida', help="Guarda el JSON en este archivo (sirve luego como --base).")
+        parser.add_argument('--base', help="JSON de una medición anterior con el que comparar.")
+        parser.add_argument('--tolerancia', type=float, default=rendimiento.TOLERANCIA,
+                            help="Aumento de p95 admitido respecto de la base (0.25 = 25%%).")
+
+    def handle(self, *args, **options):
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as archivo:
+                    base = json.load(archivo)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"No se pudo leer la base: {e}")
+
+        datos = {
+            'categorias': options['categorias'],
+            'productos': options['productos'],
+            'ventas': options['ventas'],
+            'cajas_cerradas': options['cajas_cerradas'],
+            'semilla': options['semilla'],
+        }
+
+        # Nunca toca la base real: se crea una de pruebas y se destruye al final
+        setup_test_environment(debug=False)
+        nombre_original = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(IMPORTACION_EN_HILO=False):
+                self.stderr.write("Generando datos...")
+                usuario = rendimiento.generar_datos(**datos)
+                self.stderr.write("Midiendo...")
+                escenarios = rendimiento.ejecutar(
+                    usuario, options['repeticiones'], options['solo'], options['semilla']
+                )
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            teardown_test_environment()
+
+        resultado = {'motor': connection.vendor, 'datos': datos, 'escenarios': escenarios}
+        texto = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                archivo.write(texto + "\n")
+        self.stdout.write(texto)
+
+        if base is None:
+            return
+        if base.get('datos') != datos or base.get('motor') != connection.vendor:
+            self.stderr.write(self.style.WARNING(
+                "La base se midió con otros datos o con otro motor: la comparación es orientativa"
+            ))
+        regresiones = rendimiento.comparar(escenarios, base.get('escenarios', {}), options['tolerancia'])
+        if regresiones:
+            raise CommandError("Empeoró respecto de la base:\n" + "\n".join(regresiones))
+        self.stderr.write(self.style.SUCCESS("Sin regresiones respecto de la base"))
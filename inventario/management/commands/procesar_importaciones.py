@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from inventario.importacion import ejecutar_trabajo, reclamar_trabajo
+from inventario.models import TrabajoImportacion
+
+
+class Command(BaseCommand):
+    help = "Ejecuta las importaciones pendientes y reanuda las que quedaron a medias."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--todas", action="store_true",
+            help="Reanudar también los trabajos en proceso que aún no se consideran caídos.",
+        )
+
+    def handle(self, *args, **options):
+        trabajos = TrabajoImportacion.objects.exclude(
+            estado__in=[TrabajoImportacion.COMPLETADO, TrabajoImportacion.ERROR]
+        ).order_by("creado")
+
+        for trabajo in trabajos:
+            # Un trabajo caído se reclama antes, para no correr junto a otra reanudación
+            if trabajo.estado == TrabajoImportacion.PROCESANDO and not (options["todas"] or reclamar_trabajo(trabajo)):
+                continue
+            self.stdout.write(f"Procesando importación {trabajo.id} ({trabajo.nombre_archivo})...")
+            ejecutar_trabajo(trabajo.id)
+            trabajo.refresh_from_db()
+            self.stdout.write(
+                f"  {trabajo.estado}: {trabajo.filas_procesadas} filas, {trabajo.filas_con_error} con error"
+            )
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.models import Categoria, Reajuste
+from inventario.reajuste import aplicar_reajuste, deshacer_reajuste, vista_previa
+
+
+class Command(BaseCommand):
+    help = (
+        "Reajusta en bloque el precio de compra o el porcentaje de ganancia de una "
+        "categoría, marca o búsqueda. Sin --aplicar solo muestra la vista previa."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categoria', help="Nombre de la categoría.")
+        parser.add_argument('--marca')
+        parser.add_argument('--buscar', help="Texto en el nombre o la marca.")
+        parser.add_argument('--campo', choices=[c for c, _ in Reajuste.CAMPOS], default=Reajuste.PRECIO_COMPRA)
+        parser.add_argument('--operacion', choices=[o for o, _ in Reajuste.OPERACIONES], default=Reajuste.PORCENTAJE)
+        parser.add_argument('--valor', type=Decimal)
+        parser.add_argument('--aplicar', action='store_true', help="Aplica el reajuste (por defecto solo vista previa).")
+        parser.add_argument('--deshacer', type=int, metavar='ID', help="Deshace el reajuste indicado.")
+
+    def handle(self, *args, **options):
+        if options['deshacer']:
+            try:
+                restaurados = deshacer_reajuste(Reajuste.objects.get(pk=options['deshacer']))
+            except Reajuste.DoesNotExist:
+                raise CommandError(f"No existe el reajuste #{options['deshacer']}")
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f"Reajuste #{options['deshacer']} deshecho ({restaurados} productos)"))
+            return
+
+        if options['valor'] is None:
+            raise CommandError("Indica --valor")
+        filtro = {'marca': options['marca'], 'busqueda': options['buscar']}
+        if options['categoria']:
+            try:
+                filtro['categoria'] = Categoria.objects.get(nombre__iexact=options['categoria']).pk
+            except Categoria.DoesNotExist:
+                raise CommandError(f"No existe la categoría {options['categoria']}")
+        filtro = {clave: valor for clave, valor in filtro.items() if valor}
+        if not filtro:
+            raise CommandError("Indica --categoria, --marca o --buscar")
+
+        campo, operacion, valor = options['campo'], options['operacion'], options['valor']
+        if not options['aplicar']:
+            try:
+                previa = vista_previa(filtro, campo, operacion, valor)
+            except ValueError as e:
+                raise CommandError(str(e))
+            for producto in previa['productos']:
+                self.stdout.write(
+                    f"{producto.nombre} ({producto.marca}): {getattr(producto, campo)} -> {producto.nuevo_valor:.2f}, "
+                    f"venta {producto.precio_venta} -> {producto.nuevo_precio_venta:.2f}"
+                )
+            self.stdout.write(f"{previa['total']} productos. Usa --aplicar para guardar el reajuste.")
+            return
+
+        try:
+            reajuste = aplicar_reajuste(filtro, campo, operacion, valor)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Reajuste #{reajuste.pk} aplicado a {reajuste.productos} productos"))
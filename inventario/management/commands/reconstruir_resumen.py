@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from inventario.resumen import actualizar_resumen, totales_inventario
+
+
+class Command(BaseCommand):
+    help = "Recalcula desde cero el resumen de inventario de todas las categorías."
+
+    def handle(self, *args, **options):
+        actualizar_resumen()
+        totales = totales_inventario()
+        self.stdout.write(self.style.SUCCESS(
+            f"Resumen reconstruido: {totales['productos'] or 0} productos, "
+            f"inversión S/ {totales['total_inversion'] or 0:.2f}, "
+            f"ganancia S/ {totales['ganancia'] or 0:.2f}"
+        ))
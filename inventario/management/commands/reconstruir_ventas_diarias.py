@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from inventario.ventas_diarias import reconstruir
+
+
+class Command(BaseCommand):
+    help = "Recalcula las ventas diarias acumuladas a partir de las ventas registradas."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', type=date.fromisoformat, help="Primer día a recalcular (AAAA-MM-DD).")
+        parser.add_argument('--hasta', type=date.fromisoformat, help="Último día a recalcular (AAAA-MM-DD).")
+
+    def handle(self, *args, **options):
+        filas = reconstruir(options['desde'], options['hasta'])
+        self.stdout.write(self.style.SUCCESS(f"Ventas diarias reconstruidas: {filas} filas"))
@@ -0,0 +1,53 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from inventario.respaldo import restaurar
+
+# Errores por registro que se muestran como máximo
+MAX_ERRORES = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura un respaldo de dumpdata (datos.json, backup.json) leyéndolo por partes. "
+        "Tolera bytes latin-1, omite modelos desconocidos e inserta todo en una transacción."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo')
+        parser.add_argument('--limpiar', action='store_true',
+                            help="Borra antes los registros de los modelos que trae el respaldo.")
+        parser.add_argument('--simular', action='store_true', help="Solo lee el archivo y muestra el resumen.")
+
+    def handle(self, *args, **options):
+        inicio = time.monotonic()
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = restaurar(archivo, limpiar=options['limpiar'], simular=options['simular'])
+        except OSError as e:
+            raise CommandError(f"No se pudo abrir el archivo: {e}")
+        except IntegrityError as e:
+            raise CommandError(f"Registros en conflicto con los existentes ({e}). Usa --limpiar para reemplazarlos.")
+
+        for modelo, cantidad in resultado.restaurados.items():
+            self.stdout.write(f"{modelo}: {cantidad}")
+        for modelo, cantidad in resultado.omitidos.most_common():
+            self.stdout.write(self.style.WARNING(f"Omitido {modelo}: {cantidad} registros"))
+        for modelo, campos in resultado.campos_ignorados.items():
+            self.stdout.write(self.style.WARNING(f"Campos ignorados en {modelo}: {', '.join(sorted(campos))}"))
+        for error in resultado.errores[:MAX_ERRORES]:
+            self.stdout.write(self.style.ERROR(f"{error['modelo']} #{error['pk']}: {error['mensaje']}"))
+        if len(resultado.errores) > MAX_ERRORES:
+            self.stdout.write(self.style.ERROR(f"... y {len(resultado.errores) - MAX_ERRORES} errores más"))
+        if resultado.reparados:
+            self.stdout.write(self.style.WARNING(f"Bytes no UTF-8 leídos como latin-1: {resultado.reparados}"))
+        if resultado.truncado:
+            self.stdout.write(self.style.WARNING(
+                f"El archivo está cortado en el carácter {resultado.posicion}: se restauró lo leído hasta ahí"
+            ))
+
+        accion = "Leídos" if options['simular'] else "Restaurados"
+        total = sum(resultado.restaurados.values())
+        self.stdout.write(self.style.SUCCESS(f"{accion} {total} registros en {time.monotonic() - inicio:.1f} s"))
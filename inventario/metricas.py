@@ -0,0 +1,187 @@
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Límites de los buckets: latencia en segundos y consultas SQL por petición
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Veces que una misma forma de consulta puede repetirse en una petición antes
+# de marcarla como N+1
+UMBRAL_N_MAS_1 = 10
+
+# Solo se buscan repeticiones en consultas de datos (no en BEGIN, SAVEPOINT...)
+_CONSULTA_DE_DATOS = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+# IN (%s, %s, ...) con cualquier cantidad de parámetros cuenta como una forma
+_LISTA_PARAMETROS = re.compile(r"\((?:%s, )*%s\)")
+
+
+def forma_consulta(sql):
+    return _LISTA_PARAMETROS.sub("(%s, ...)", sql)
+
+
+# --------------------------
+# REGISTRO EN MEMORIA
+# --------------------------
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.series = {}  # vista -> [conteo por bucket..., suma, total]
+
+    def observar(self, vista, valor):
+        serie = self.series.get(vista)
+        if serie is None:
+            serie = self.series[vista] = [0] * len(self.limites) + [0, 0]
+        posicion = bisect.bisect_left(self.limites, valor)
+        if posicion < len(self.limites):
+            serie[posicion] += 1
+        serie[-2] += valor
+        serie[-1] += 1
+
+    def lineas(self, nombre):
+        for vista, serie in sorted(self.series.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.limites, serie):
+                acumulado += conteo
+                yield f'{nombre}_bucket{{vista="{_escapar(vista)}",le="{limite}"}} {acumulado}'
+            yield f'{nombre}_bucket{{vista="{_escapar(vista)}",le="+Inf"}} {serie[-1]}'
+            yield f'{nombre}_sum{{vista="{_escapar(vista)}"}} {serie[-2]}'
+            yield f'{nombre}_count{{vista="{_escapar(vista)}"}} {serie[-1]}'
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metricas:
+    # Métricas del proceso. Con varios workers cada uno expone las suyas y
+    # Prometheus las suma por instancia.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        with self._lock:
+            self.latencia = Histograma(BUCKETS_LATENCIA)
+            self.consultas = Histograma(BUCKETS_CONSULTAS)
+            self.segundos_sql = Counter()
+            self.n_mas_1 = Counter()
+            self.cache = Counter()  # (fragmento, resultado) -> lecturas
+
+    def registrar(self, vista, segundos, consultas, segundos_sql, repetidas):
+        with self._lock:
+            self.latencia.observar(vista, segundos)
+            self.consultas.observar(vista, consultas)
+            self.segundos_sql[vista] += segundos_sql
+            if repetidas:
+                self.n_mas_1[vista] += 1
+
+    def contar_cache(self, fragmento, acierto):
+        with self._lock:
+            self.cache[fragmento, "acierto" if acierto else "fallo"] += 1
+
+    def texto(self):
+        # Formato de exposición de texto de Prometheus
+        with self._lock:
+            lineas = [
+                "# HELP ferreteria_peticion_segundos Duración de las peticiones por vista.",
+                "# TYPE ferreteria_peticion_segundos histogram",
+                *self.latencia.lineas("ferreteria_peticion_segundos"),
+                "# HELP ferreteria_peticion_consultas Consultas SQL por petición.",
+                "# TYPE ferreteria_peticion_consultas histogram",
+                *self.consultas.lineas("ferreteria_peticion_consultas"),
+                "# HELP ferreteria_sql_segundos_total Tiempo total en consultas SQL.",
+                "# TYPE ferreteria_sql_segundos_total counter",
+                *(f'ferreteria_sql_segundos_total{{vista="{_escapar(v)}"}} {s}' for v, s in sorted(self.segundos_sql.items())),
+                "# HELP ferreteria_n_mas_1_total Peticiones con una misma consulta repetida (posible N+1).",
+                "# TYPE ferreteria_n_mas_1_total counter",
+                *(f'ferreteria_n_mas_1_total{{vista="{_escapar(v)}"}} {n}' for v, n in sorted(self.n_mas_1.items())),
+                "# HELP ferreteria_cache_total Lecturas de fragmentos en caché por resultado.",
+                "# TYPE ferreteria_cache_total counter",
+                *(
+                    f'ferreteria_cache_total{{fragmento="{_escapar(f)}",resultado="{r}"}} {n}'
+                    for (f, r), n in sorted(self.cache.items())
+                ),
+            ]
+        return "\n".join(lineas) + "\n"
+
+
+metricas = Metricas()
+
+
+# --------------------------
+# MIDDLEWARE
+# --------------------------
+class ConsultasPeticion:
+    # execute_wrapper que cuenta y cronometra las consultas de una petición.
+    # Solo guarda el texto SQL (con %s, sin valores); las formas se agrupan
+    # al final, una vez por texto distinto.
+
+    def __init__(self):
+        self.total = 0
+        self.segundos = 0.0
+        self.textos = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.segundos += time.perf_counter() - inicio
+            self.total += 1
+            self.textos[sql] += 1
+
+    def repetidas(self, umbral):
+        formas = Counter()
+        for sql, veces in self.textos.items():
+            if _CONSULTA_DE_DATOS.match(sql):
+                formas[forma_consulta(sql)] += veces
+        return [(forma, veces) for forma, veces in formas.most_common() if veces >= umbral]
+
+
+class MetricasMiddleware:
+    # Latencia, consultas y tiempo SQL por vista (nombre de la URL). El cuerpo
+    # de las respuestas en streaming se genera después y no entra en la medida.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activo = getattr(settings, "METRICAS_ACTIVAS", True)
+        self.umbral = getattr(settings, "METRICAS_UMBRAL_N_MAS_1", UMBRAL_N_MAS_1)
+
+    def __call__(self, request):
+        if not self.activo:
+            return self.get_response(request)
+
+        consultas = ConsultasPeticion()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(consultas))
+            respuesta = self.get_response(request)
+        duracion = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = (coincidencia.view_name if coincidencia else None) or "sin_ruta"
+        repetidas = consultas.repetidas(self.umbral)
+        if repetidas:
+            forma, veces = repetidas[0]
+            logger.warning("Posible N+1 en %s: %s consultas iguales: %s", vista, veces, forma[:300])
+        metricas.registrar(vista, duracion, consultas.total, consultas.segundos, repetidas)
+
+        if settings.DEBUG:
+            respuesta['Server-Timing'] = (
+                f"sql;dur={consultas.segundos * 1000:.1f};desc=\"{consultas.total} consultas\", "
+                f"total;dur={duracion * 1000:.1f}"
+            )
+        return respuesta
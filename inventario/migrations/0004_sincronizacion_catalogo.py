@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='activo',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='actualizados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='altas',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='cambios',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='desactivados',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='desactivar_faltantes',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='modo',
+            field=models.CharField(choices=[('sincronizar', 'Sincronizar (solo cambios)'), ('reemplazar', 'Reemplazar todo el catálogo')], default='sincronizar', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='simular',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='sin_cambios',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['categoria', 'nombre', 'marca'], name='producto_clave_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def calcular_resumenes(apps, schema_editor):
+    Categoria = apps.get_model('inventario', 'Categoria')
+    Producto = apps.get_model('inventario', 'Producto')
+    ResumenCategoria = apps.get_model('inventario', 'ResumenCategoria')
+
+    totales = {
+        fila['categoria_id']: fila
+        for fila in Producto.objects.filter(activo=True)
+        .values('categoria_id')
+        .annotate(n=Count('id'), unidades=Sum('cantidad'), inversion=Sum('total_inversion'), utilidad=Sum('ganancia'))
+        .order_by()
+    }
+    ResumenCategoria.objects.bulk_create([
+        ResumenCategoria(
+            categoria_id=categoria_id,
+            productos=totales.get(categoria_id, {}).get('n') or 0,
+            unidades=totales.get(categoria_id, {}).get('unidades') or 0,
+            total_inversion=totales.get(categoria_id, {}).get('inversion') or 0,
+            ganancia=totales.get(categoria_id, {}).get('utilidad') or 0,
+        )
+        for categoria_id in Categoria.objects.values_list('id', flat=True)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0004_sincronizacion_catalogo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenCategoria',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='resumen', serialize=False, to='inventario.categoria')),
+                ('productos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('total_inversion', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('ganancia', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(calcular_resumenes, migrations.RunPython.noop),
+    ]
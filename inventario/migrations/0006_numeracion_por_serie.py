@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:32
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def iniciar_series(apps, schema_editor):
+    # Cada serie continúa desde el último número ya emitido para ese tipo
+    Sale = apps.get_model('inventario', 'Sale')
+    Secuencia = apps.get_model('inventario', 'Secuencia')
+    ultimos = Sale.objects.values('tipo_comprobante').annotate(ultimo=Max('numero_venta')).order_by()
+    Secuencia.objects.bulk_create([
+        Secuencia(serie=f"venta-{fila['tipo_comprobante']}", ultimo=fila['ultimo'] or 0)
+        for fila in ultimos
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_resumencategoria'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('serie', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('ultimo', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='sale',
+            name='numero_venta',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='sale',
+            constraint=models.UniqueConstraint(fields=('tipo_comprobante', 'numero_venta'), name='venta_numero_por_serie'),
+        ),
+        migrations.RunPython(iniciar_series, migrations.RunPython.noop),
+    ]
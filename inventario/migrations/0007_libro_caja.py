@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def migrar_saldos(apps, schema_editor):
+    # El total acumulado hasta ahora entra al libro como un ajuste inicial
+    Caja = apps.get_model('inventario', 'Caja')
+    CajaMovimiento = apps.get_model('inventario', 'CajaMovimiento')
+    CajaMovimiento.objects.bulk_create([
+        CajaMovimiento(caja_id=caja_id, tipo='ajuste', monto=total, descripcion="Saldo migrado")
+        for caja_id, total in Caja.objects.exclude(total=0).values_list('id', 'total')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_numeracion_por_serie'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CajaCorte',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hasta_movimiento', models.PositiveBigIntegerField()),
+                ('total', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('movimientos', models.PositiveIntegerField(default=0)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('caja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cortes', to='inventario.caja')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['caja', '-hasta_movimiento'], name='corte_caja_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CajaMovimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('venta', 'Venta'), ('devolucion', 'Devolución'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('descripcion', models.CharField(blank=True, max_length=200)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('caja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.caja')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='inventario.sale')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['caja', 'id'], name='movimiento_caja_idx')],
+            },
+        ),
+        migrations.RunPython(migrar_saldos, migrations.RunPython.noop),
+    ]
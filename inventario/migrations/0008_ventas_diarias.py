@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def calcular_ventas_diarias(apps, schema_editor):
+    Sale = apps.get_model('inventario', 'Sale')
+    VentaDiaria = apps.get_model('inventario', 'VentaDiaria')
+    filas = (
+        Sale.objects.annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        .values('dia', 'caja_id', 'tipo_comprobante')
+        .annotate(n=Count('id'), suma=Sum('total'))
+        .order_by()
+    )
+    VentaDiaria.objects.bulk_create([
+        VentaDiaria(
+            fecha=fila['dia'], caja_id=fila['caja_id'], tipo_comprobante=fila['tipo_comprobante'],
+            ventas=fila['n'], total=fila['suma'] or 0,
+        )
+        for fila in filas
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_libro_caja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_comprobante', models.CharField(max_length=50)),
+                ('ventas', models.IntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('caja', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to='inventario.caja')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'caja', 'tipo_comprobante'), name='venta_diaria_unica')],
+            },
+        ),
+        migrations.RunPython(calcular_ventas_diarias, migrations.RunPython.noop),
+    ]
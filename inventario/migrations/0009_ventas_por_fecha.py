@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_ventas_diarias'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-fecha', '-id'], name='venta_fecha_idx'),
+        ),
+    ]
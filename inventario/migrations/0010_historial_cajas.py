@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_ventas_por_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['-fecha_apertura'], name='caja_apertura_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['usuario', '-fecha_apertura'], name='caja_usuario_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0010_historial_cajas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
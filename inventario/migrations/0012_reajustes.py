@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0011_version_nota_venta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reajuste',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campo', models.CharField(choices=[('precio_compra', 'Precio de compra'), ('porcentaje_ganancia', 'Porcentaje de ganancia')], max_length=30)),
+                ('operacion', models.CharField(choices=[('porcentaje', 'Variar en %'), ('sumar', 'Sumar monto'), ('fijar', 'Fijar valor')], max_length=20)),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('filtro', models.JSONField(blank=True, default=dict)),
+                ('productos', models.PositiveIntegerField(default=0)),
+                ('anteriores', models.JSONField(blank=True, default=dict)),
+                ('creado', models.DateTimeField(auto_now_add=True)),
+                ('deshecho', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:45
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+from django.db.models.lookups import GreaterThan
+
+# Copia de las expresiones de models.py en el momento de esta migración.
+# Una columna normal no se puede convertir en calculada: se elimina y se vuelve
+# a crear, y la base de datos calcula el valor de todas las filas existentes.
+DINERO = models.DecimalField(max_digits=15, decimal_places=2)
+
+
+def _decimal(valor):
+    return models.Value(Decimal(valor), output_field=DINERO)
+
+
+def precio_venta():
+    return models.Case(
+        models.When(
+            GreaterThan(F('precio_compra'), 0),
+            then=Round(F('precio_compra') * (_decimal(1) + F('porcentaje_ganancia') * _decimal('0.01')), 2),
+        ),
+        default=_decimal(0),
+        output_field=DINERO,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_reajustes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(model_name='producto', name='precio_venta'),
+        migrations.RemoveField(model_name='producto', name='total_inversion'),
+        migrations.RemoveField(model_name='producto', name='ganancia'),
+        migrations.AddField(
+            model_name='producto',
+            name='precio_venta',
+            field=models.GeneratedField(
+                expression=precio_venta(),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2),
+                db_persist=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='total_inversion',
+            field=models.GeneratedField(
+                expression=Round(F('cantidad') * F('precio_compra'), 2),
+                output_field=models.DecimalField(max_digits=15, decimal_places=2),
+                db_persist=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='ganancia',
+            field=models.GeneratedField(
+                expression=Round(F('cantidad') * (precio_venta() - F('precio_compra')), 2),
+                output_field=models.DecimalField(max_digits=15, decimal_places=2),
+                db_persist=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='margen',
+            field=models.GeneratedField(
+                expression=models.Case(
+                    models.When(
+                        precio_compra__gt=0,
+                        then=Round((precio_venta() - F('precio_compra')) * _decimal(100) / F('precio_compra'), 2),
+                    ),
+                    default=_decimal(0),
+                    output_field=DINERO,
+                ),
+                output_field=models.DecimalField(max_digits=9, decimal_places=2),
+                db_persist=True,
+            ),
+        ),
+    ]
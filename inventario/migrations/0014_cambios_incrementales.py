@@ -0,0 +1,81 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_precios_calculados'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Eliminacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.CharField(max_length=64)),
+                ('eliminado', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='caja',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='cliente',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='saleitem',
+            name='actualizado',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='caja',
+            index=models.Index(fields=['actualizado', 'id'], name='caja_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cajamovimiento',
+            index=models.Index(fields=['creado', 'id'], name='movimiento_creado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['actualizado', 'id'], name='categoria_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['actualizado', 'id'], name='cliente_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado', 'id'], name='producto_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['actualizado', 'id'], name='venta_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='saleitem',
+            index=models.Index(fields=['actualizado', 'id'], name='item_actualizado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eliminacion',
+            index=models.Index(fields=['eliminado', 'id'], name='eliminacion_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:28
+
+from django.db import migrations, models
+
+
+def unir_filas_sin_caja(apps, schema_editor):
+    # Las filas sin caja repetidas (antes NULL no chocaba) se suman en una
+    VentaDiaria = apps.get_model('inventario', 'VentaDiaria')
+    unicas = {}
+    for fila in VentaDiaria.objects.filter(caja__isnull=True).order_by('id'):
+        clave = (fila.fecha, fila.tipo_comprobante)
+        primera = unicas.get(clave)
+        if primera is None:
+            unicas[clave] = fila
+            continue
+        primera.ventas += fila.ventas
+        primera.total += fila.total
+        primera.save(update_fields=['ventas', 'total'])
+        fila.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_envios_venta'),
+    ]
+
+    operations = [
+        migrations.RunPython(unir_filas_sin_caja, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name='ventadiaria',
+            name='venta_diaria_unica',
+        ),
+        migrations.AddIndex(
+            model_name='ventadiaria',
+            index=models.Index(fields=['fecha', 'tipo_comprobante'], name='venta_diaria_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='ventadiaria',
+            constraint=models.UniqueConstraint(condition=models.Q(('caja__isnull', False)), fields=('fecha', 'caja', 'tipo_comprobante'), name='venta_diaria_unica'),
+        ),
+        migrations.AddConstraint(
+            model_name='ventadiaria',
+            constraint=models.UniqueConstraint(condition=models.Q(('caja__isnull', True)), fields=('fecha', 'tipo_comprobante'), name='venta_diaria_unica_sin_caja'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_ventas_diarias_sin_caja'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reajuste',
+            name='nuevos',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0017_reajuste_nuevos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='categorias_pendientes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='trabajoimportacion',
+            name='ids_pendientes',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
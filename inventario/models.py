@@ -2,6 +2,8 @@ from django.db import models
 from decimal import Decimal
 from django.utils.timezone import now
 from django.db.models import Sum, F, FloatField
+from django.db.models.functions import Round
+from django.db.models.lookups import GreaterThan
 from django.contrib.auth.models import User
 
 
@@ -12,7 +14,16 @@ class Caja(models.Model):
     abierta = models.BooleanField(default=True)
     fecha_apertura = models.DateTimeField(auto_now_add=True)
     fecha_cierre = models.DateTimeField(null=True, blank=True)
-    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # <-- agregar
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)  # congelado al cerrar; mientras está abierta ver libro_caja.saldo_caja
+    actualizado = models.DateTimeField(auto_now=True)  # marca para exportar_cambios
+
+    class Meta:
+        indexes = [
+            # Historial de cajas, general y por usuario
+            models.Index(fields=['-fecha_apertura'], name='caja_apertura_idx'),
+            models.Index(fields=['usuario', '-fecha_apertura'], name='caja_usuario_idx'),
+            models.Index(fields=['actualizado', 'id'], name='caja_actualizado_idx'),
+        ]
 
     def __str__(self):
         return f"Caja de {self.usuario.username} - {self.fecha_apertura.date()}"
@@ -21,19 +32,56 @@ class Caja(models.Model):
 class Cliente(models.Model):
     nombre = models.CharField(max_length=200)
     documento = models.CharField(max_length=20, blank=True, null=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actualizado', 'id'], name='cliente_actualizado_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
 
 class Categoria(models.Model):
     nombre = models.CharField(max_length=120, unique=True)
+    actualizado = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["nombre"]
+        indexes = [
+            models.Index(fields=['actualizado', 'id'], name='categoria_actualizado_idx'),
+        ]
 
     def __str__(self):
         return self.nombre
 
+# Columnas de Producto que calcula la base de datos (GeneratedField): se
+# mantienen correctas también con bulk_create, update() y loaddata
+CAMPOS_CALCULADOS = ('precio_venta', 'total_inversion', 'ganancia', 'margen')
+
+DINERO = models.DecimalField(max_digits=15, decimal_places=2)
+
+
+def _decimal(valor):
+    return models.Value(Decimal(valor), output_field=DINERO)
+
+
+def expresion_precio_venta(precio_compra=None, porcentaje_ganancia=None):
+    # precio_compra * (1 + % / 100), o 0 sin precio de compra. Recibe otras
+    # expresiones para calcular precios hipotéticos (ver reajuste.py). Se
+    # multiplica por 0.01 porque SQLite divide enteros sin decimales.
+    precio_compra = precio_compra if precio_compra is not None else F('precio_compra')
+    porcentaje_ganancia = porcentaje_ganancia if porcentaje_ganancia is not None else F('porcentaje_ganancia')
+    return models.Case(
+        models.When(
+            GreaterThan(precio_compra, 0),
+            then=Round(precio_compra * (_decimal(1) + porcentaje_ganancia * _decimal('0.01')), 2),
+        ),
+        default=_decimal(0),
+        output_field=DINERO,
+    )
+
+
 class Producto(models.Model):
     nombre = models.CharField(max_length=200)
     marca = models.CharField(max_length=200)
@@ -42,37 +90,96 @@ class Producto(models.Model):
     cantidad = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     unidad_medida = models.CharField(max_length=20, blank=True)
     precio_compra = models.DecimalField(max_digits=12, decimal_places=2, default=0)
-    precio_venta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     porcentaje_ganancia = models.DecimalField(max_digits=5, decimal_places=2, default=30)  # % por defecto
-    total_inversion = models.DecimalField(max_digits=15, decimal_places=2, default=0)
-    ganancia = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    precio_venta = models.GeneratedField(
+        expression=expresion_precio_venta(),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+    )
+    total_inversion = models.GeneratedField(
+        expression=Round(F('cantidad') * F('precio_compra'), 2),
+        output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        db_persist=True,
+    )
+    ganancia = models.GeneratedField(
+        expression=Round(F('cantidad') * (expresion_precio_venta() - F('precio_compra')), 2),
+        output_field=models.DecimalField(max_digits=15, decimal_places=2),
+        db_persist=True,
+    )
+    margen = models.GeneratedField(
+        # % de ganancia efectivo sobre el precio de compra, para ordenar y filtrar
+        expression=models.Case(
+            models.When(
+                precio_compra__gt=0,
+                then=Round((expresion_precio_venta() - F('precio_compra')) * _decimal(100) / F('precio_compra'), 2),
+            ),
+            default=_decimal(0),
+            output_field=DINERO,
+        ),
+        output_field=models.DecimalField(max_digits=9, decimal_places=2),
+        db_persist=True,
+    )
     precio = models.DecimalField(max_digits=10, decimal_places=2, default=0)  # editable al registrar venta
+    activo = models.BooleanField(default=True)  # los productos que ya no llegan en la lista se desactivan
+    # Las escrituras masivas (update, bulk_update) también deben fijarlo
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Clave estable con la que la sincronización empareja las filas del Excel
+            models.Index(fields=['categoria', 'nombre', 'marca'], name='producto_clave_idx'),
+            models.Index(fields=['actualizado', 'id'], name='producto_actualizado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Categoría con la que se leyó, para actualizar ambos resúmenes si cambia
+        instancia._categoria_original = instancia.__dict__.get('categoria_id')
+        return instancia
 
     def save(self, *args, **kwargs):
         self.precio_compra = Decimal(self.precio_compra or 0)
         self.porcentaje_ganancia = Decimal(self.porcentaje_ganancia or 0)
         self.cantidad = Decimal(self.cantidad or 0)
-
-        if self.precio_compra > 0:
-            self.precio_venta = self.precio_compra * (1 + self.porcentaje_ganancia / Decimal(100))
-        else:
-            self.precio_venta = Decimal(0)
-
-        self.total_inversion = self.cantidad * self.precio_compra
-        self.ganancia = self.cantidad * (self.precio_venta - self.precio_compra)
+        actualizando = not self._state.adding
 
         super().save(*args, **kwargs)
 
+        # Al insertar, la base de datos devuelve las columnas calculadas; al
+        # actualizar se descartan para que se vuelvan a leer al usarlas
+        if actualizando:
+            for campo in CAMPOS_CALCULADOS:
+                self.__dict__.pop(campo, None)
+
     def __str__(self):
         return f"{self.nombre} ({self.marca})"
 
+class ResumenCategoria(models.Model):
+    # Totales de inventario por categoría (solo productos activos), mantenidos
+    # desde inventario/resumen.py para no recorrer todos los productos
+    categoria = models.OneToOneField(Categoria, on_delete=models.CASCADE, primary_key=True, related_name='resumen')
+    productos = models.PositiveIntegerField(default=0)
+    unidades = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    total_inversion = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    ganancia = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Resumen {self.categoria_id}"
+
 # ========================
 # MODELOS DE VENTA
 # ========================
 
-from decimal import Decimal
-from django.db import models
-from django.db.models import Sum, F, FloatField
+class Secuencia(models.Model):
+    # Contador por serie (una por tipo de comprobante); ver inventario/numeracion.py
+    serie = models.CharField(max_length=50, primary_key=True)
+    ultimo = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.serie}: {self.ultimo}"
+
 
 class Sale(models.Model):
     cliente = models.ForeignKey("Cliente", on_delete=models.CASCADE)
@@ -85,31 +192,83 @@ class Sale(models.Model):
         ]
     )
     fecha = models.DateTimeField(auto_now_add=True)
-    numero_venta = models.PositiveIntegerField(unique=True, blank=True, null=True)
+    numero_venta = models.PositiveIntegerField(blank=True, null=True)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     caja = models.ForeignKey("Caja", on_delete=models.SET_NULL, null=True, blank=True)
+    actualizado = models.DateTimeField(auto_now=True)  # versión de la nota de venta en caché
 
-    def save(self, *args, **kwargs):
+    class Meta:
+        constraints = [
+            # Cada tipo de comprobante lleva su propia serie de numeración
+            models.UniqueConstraint(fields=['tipo_comprobante', 'numero_venta'], name='venta_numero_por_serie'),
+        ]
+        indexes = [
+            # Listado de ventas por cursor (ventas_views.pagina_ventas)
+            models.Index(fields=['-fecha', '-id'], name='venta_fecha_idx'),
+            models.Index(fields=['actualizado', 'id'], name='venta_actualizado_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Valores con los que se leyó, para registrar solo la diferencia en la
+        # caja y mover la venta de fila en las ventas diarias
+        instancia._total_original = instancia.__dict__.get('total')
+        instancia._caja_id_original = instancia.__dict__.get('caja_id')
+        instancia._tipo_original = instancia.__dict__.get('tipo_comprobante')
+        instancia._fecha_original = instancia.__dict__.get('fecha')
+        return instancia
+
+    def _marcar_guardado(self):
+        self._total_original = self.total
+        self._caja_id_original = self.caja_id
+        self._tipo_original = self.tipo_comprobante
+        self._fecha_original = self.fecha
+
+    def save(self, *args, recalcular=True, **kwargs):
         from .models import Caja  # dentro de la función para evitar circularidad
+        from .libro_caja import registrar_cambio_venta
+        from .ventas_diarias import registrar_venta_diaria
 
         # ----------------------------
         # 1️⃣ Número de venta consecutivo
         # ----------------------------
         if not self.numero_venta:
-            last_sale = Sale.objects.order_by('-numero_venta').first()
-            self.numero_venta = 1 if not last_sale else last_sale.numero_venta + 1
+            from .numeracion import numero_venta
+            self.numero_venta = numero_venta(self.tipo_comprobante)
+
+        # recalcular=False: el llamador ya calculó el total y ajusta la caja y
+        # las ventas diarias (ver ventas_servicio.registrar_venta)
+        if not recalcular:
+            super().save(*args, **kwargs)
+            self._marcar_guardado()
+            return
 
         # ----------------------------
         # 2️⃣ Guardar datos previos si es edición
         # ----------------------------
         is_new = self.pk is None
         previous_total = Decimal("0.00")
-        previous_caja = None
+        previous_caja_id = None
+        previous_tipo = previous_fecha = None
 
         if not is_new:
-            prev = Sale.objects.get(pk=self.pk)
-            previous_total = prev.total
-            previous_caja = prev.caja
+            if hasattr(self, '_total_original'):
+                previous_total = self._total_original or Decimal("0.00")
+                previous_caja_id = self._caja_id_original
+                previous_tipo = self._tipo_original
+                previous_fecha = self._fecha_original
+            else:
+                prev = Sale.objects.values('total', 'caja_id', 'tipo_comprobante', 'fecha').get(pk=self.pk)
+                previous_total = prev['total']
+                previous_caja_id = prev['caja_id']
+                previous_tipo = prev['tipo_comprobante']
+                previous_fecha = prev['fecha']
+
+            if previous_tipo and previous_tipo != self.tipo_comprobante:
+                # Cambió de serie: toma el siguiente número de la nueva
+                from .numeracion import numero_venta
+                self.numero_venta = numero_venta(self.tipo_comprobante)
 
         # ----------------------------
         # 3️⃣ Guardar la venta primero para tener pk
@@ -134,42 +293,32 @@ class Sale(models.Model):
                 self.caja = caja_abierta
 
         # ----------------------------
-        # 6️⃣ Guardar venta con total actualizado
+        # 6️⃣ Guardar venta con total actualizado (en una edición, también el
+        # tipo, la fecha y demás campos que cambiaron)
         # ----------------------------
-        super().save(update_fields=['total', 'caja'])
+        super().save(update_fields=['total', 'caja', 'actualizado'] if is_new else None)
 
         # ----------------------------
-        # 7️⃣ Ajustar total de la caja correctamente
+        # 7️⃣ Registrar la diferencia en el libro de caja
         # ----------------------------
-        if self.caja and self.caja.abierta:
-            if self.caja.total is None:
-                self.caja.total = Decimal("0.00")
-
-            if is_new:
-                # Nueva venta → sumar total a la caja
-                self.caja.total += self.total
-            else:
-                # Venta editada
-                if previous_caja == self.caja:
-                    # Caja no cambió → restar total anterior y sumar el nuevo
-                    self.caja.total = self.caja.total - previous_total + self.total
-                else:
-                    # Caja cambió → restar de la caja anterior y sumar en la nueva
-                    if previous_caja:
-                        if previous_caja.total is None:
-                            previous_caja.total = Decimal("0.00")
-                        previous_caja.total -= previous_total
-                        previous_caja.save(update_fields=['total'])
-                    self.caja.total += self.total
-
-            # Guardar total actualizado de la caja
-            self.caja.save(update_fields=['total'])
+        registrar_cambio_venta(self, previous_total, previous_caja_id)
+        registrar_venta_diaria(
+            self, previous_total, previous_caja_id, nueva=is_new,
+            tipo_anterior=previous_tipo, fecha_anterior=previous_fecha,
+        )
+        self._marcar_guardado()
 
 class SaleItem(models.Model):
     sale = models.ForeignKey(Sale, related_name="items", on_delete=models.CASCADE)
     producto = models.ForeignKey("Producto", on_delete=models.CASCADE)
     cantidad = models.PositiveIntegerField()
     precio = models.DecimalField(max_digits=12, decimal_places=2)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['actualizado', 'id'], name='item_actualizado_idx'),
+        ]
 
     def subtotal(self):
         return self.cantidad * self.precio
@@ -185,4 +334,259 @@ class SaleItem(models.Model):
             self.sale.save()
 
     def __str__(self):
-        return f"{self.producto.nombre} x {self.cantidad}"
\ No newline at end of file
+        return f"{self.producto.nombre} x {self.cantidad}"
+
+
+class EnvioVenta(models.Model):
+    # Venta enviada con una clave generada por el cliente (formulario de venta,
+    # api/ventas/lote/). Reenviar la misma clave devuelve este resultado sin
+    # volver a registrar la venta ni descontar stock.
+    REGISTRADA = "registrada"
+    RECHAZADA = "rechazada"
+    ESTADOS = [
+        (REGISTRADA, "Registrada"),
+        (RECHAZADA, "Rechazada"),
+    ]
+
+    clave = models.CharField(max_length=64, unique=True)
+    huella = models.CharField(max_length=64)  # sha256 de los datos enviados con la clave
+    estado = models.CharField(max_length=20, choices=ESTADOS)
+    venta = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='envios')
+    error = models.TextField(blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.clave}: {self.estado}"
+
+# ========================
+# REAJUSTES DE PRECIOS
+# ========================
+
+class Reajuste(models.Model):
+    # Reajuste masivo aplicado con un solo UPDATE (ver inventario/reajuste.py).
+    # Guarda el valor anterior de cada producto para poder deshacerlo.
+    PRECIO_COMPRA = 'precio_compra'
+    PORCENTAJE_GANANCIA = 'porcentaje_ganancia'
+    CAMPOS = [
+        (PRECIO_COMPRA, 'Precio de compra'),
+        (PORCENTAJE_GANANCIA, 'Porcentaje de ganancia'),
+    ]
+
+    PORCENTAJE = 'porcentaje'
+    SUMAR = 'sumar'
+    FIJAR = 'fijar'
+    OPERACIONES = [
+        (PORCENTAJE, 'Variar en %'),
+        (SUMAR, 'Sumar monto'),
+        (FIJAR, 'Fijar valor'),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    campo = models.CharField(max_length=30, choices=CAMPOS)
+    operacion = models.CharField(max_length=20, choices=OPERACIONES)
+    valor = models.DecimalField(max_digits=12, decimal_places=2)
+    filtro = models.JSONField(default=dict, blank=True)  # categoría, marca, búsqueda o ids
+    productos = models.PositiveIntegerField(default=0)
+    anteriores = models.JSONField(default=dict, blank=True)  # {id: valor anterior}
+    nuevos = models.JSONField(default=dict, blank=True)  # {id: valor aplicado}, para no deshacer ediciones posteriores
+    creado = models.DateTimeField(auto_now_add=True)
+    deshecho = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reajuste #{self.pk}: {self.get_campo_display()} {self.get_operacion_display()} {self.valor}"
+
+
+# ========================
+# IMPORTACIONES EN SEGUNDO PLANO
+# ========================
+
+class TrabajoImportacion(models.Model):
+    PENDIENTE = "pendiente"
+    PROCESANDO = "procesando"
+    COMPLETADO = "completado"
+    ERROR = "error"
+    ESTADOS = [
+        (PENDIENTE, "Pendiente"),
+        (PROCESANDO, "Procesando"),
+        (COMPLETADO, "Completado"),
+        (ERROR, "Error"),
+    ]
+
+    REEMPLAZAR = "reemplazar"
+    SINCRONIZAR = "sincronizar"
+    MODOS = [
+        (SINCRONIZAR, "Sincronizar (solo cambios)"),
+        (REEMPLAZAR, "Reemplazar todo el catálogo"),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    archivo = models.BinaryField()  # el Excel se guarda en la BD para poder reanudar
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=PENDIENTE)
+    modo = models.CharField(max_length=20, choices=MODOS, default=SINCRONIZAR)
+    simular = models.BooleanField(default=False)  # vista previa: calcula los cambios sin guardarlos
+    desactivar_faltantes = models.BooleanField(default=False)
+
+    # Cursor: hoja y fila desde donde continúa el siguiente paso
+    indice_hoja = models.PositiveIntegerField(default=0)
+    fila_siguiente = models.PositiveIntegerField(default=2)
+    total_hojas = models.PositiveIntegerField(default=0)
+    hoja_actual = models.CharField(max_length=120, blank=True)
+
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_con_error = models.PositiveIntegerField(default=0)
+    errores = models.JSONField(default=list, blank=True)
+    mensaje = models.TextField(blank=True)
+
+    # Resultado de la sincronización (o de la vista previa)
+    altas = models.PositiveIntegerField(default=0)
+    actualizados = models.PositiveIntegerField(default=0)
+    desactivados = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+    cambios = models.JSONField(default=list, blank=True)
+
+    # Productos y categorías tocados por los pasos; se avisan al terminar
+    ids_pendientes = models.JSONField(default=list, blank=True)
+    categorias_pendientes = models.JSONField(default=list, blank=True)
+
+    creado = models.DateTimeField(auto_now_add=True)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-creado"]
+
+    @property
+    def terminado(self):
+        return self.estado in (self.COMPLETADO, self.ERROR)
+
+    @property
+    def creados(self):
+        return self.filas_procesadas
+
+    def __str__(self):
+        return f"Importación {self.pk} ({self.estado})"
+
+
+# ========================
+# LIBRO DE CAJA
+# ========================
+
+class CajaMovimiento(models.Model):
+    # Una fila inmutable por venta, devolución o ajuste manual. El saldo de la
+    # caja es la suma de sus movimientos (ver inventario/libro_caja.py).
+    VENTA = "venta"
+    DEVOLUCION = "devolucion"
+    AJUSTE = "ajuste"
+    TIPOS = [
+        (VENTA, "Venta"),
+        (DEVOLUCION, "Devolución"),
+        (AJUSTE, "Ajuste"),
+    ]
+
+    caja = models.ForeignKey(Caja, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    monto = models.DecimalField(max_digits=15, decimal_places=2)
+    venta = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    descripcion = models.CharField(max_length=200, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['caja', 'id'], name='movimiento_caja_idx'),
+            models.Index(fields=['creado', 'id'], name='movimiento_creado_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self.pk is not None:
+            raise ValueError("Los movimientos de caja no se modifican; registra un ajuste.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Los movimientos de caja no se eliminan; registra un ajuste.")
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} S/ {self.monto} (caja {self.caja_id})"
+
+
+class CajaCorte(models.Model):
+    # Saldo acumulado de la caja hasta un movimiento: el saldo actual es el del
+    # último corte más los movimientos posteriores
+    caja = models.ForeignKey(Caja, on_delete=models.CASCADE, related_name='cortes')
+    hasta_movimiento = models.PositiveBigIntegerField()
+    total = models.DecimalField(max_digits=15, decimal_places=2)
+    movimientos = models.PositiveIntegerField(default=0)
+    creado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['caja', '-hasta_movimiento'], name='corte_caja_idx'),
+        ]
+
+    def __str__(self):
+        return f"Corte caja {self.caja_id} hasta {self.hasta_movimiento}: S/ {self.total}"
+
+
+class VentaDiaria(models.Model):
+    # Ventas acumuladas por día, caja y tipo de comprobante, mantenidas desde
+    # inventario/ventas_diarias.py para cerrar periodos sin recorrer Sale
+    fecha = models.DateField()
+    caja = models.ForeignKey(Caja, on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_diarias')
+    tipo_comprobante = models.CharField(max_length=50)
+    ventas = models.IntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Una fila por día, caja y tipo; las ventas sin caja también son
+            # una sola fila por día y tipo (NULL no choca en un UNIQUE normal)
+            models.UniqueConstraint(
+                fields=['fecha', 'caja', 'tipo_comprobante'], condition=models.Q(caja__isnull=False),
+                name='venta_diaria_unica',
+            ),
+            models.UniqueConstraint(
+                fields=['fecha', 'tipo_comprobante'], condition=models.Q(caja__isnull=True),
+                name='venta_diaria_unica_sin_caja',
+            ),
+        ]
+        indexes = [
+            # Rangos de fechas de totales_periodo y búsqueda de la fila en sumar()
+            models.Index(fields=['fecha', 'tipo_comprobante'], name='venta_diaria_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} caja {self.caja_id} {self.tipo_comprobante}: {self.ventas} ventas, S/ {self.total}"
+
+
+# ========================
+# CAMBIOS INCREMENTALES
+# ========================
+
+class Eliminacion(models.Model):
+    # Filas borradas de los modelos que se exportan, para que exportar_cambios
+    # también envíe las bajas (ver inventario/cambios.py)
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.CharField(max_length=64)
+    eliminado = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['eliminado', 'id'], name='eliminacion_fecha_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} eliminado {self.eliminado}"
+
+
+# Modelos que exportar_cambios envía, en orden de dependencias, con el campo
+# que marca su última modificación (los movimientos de caja no se modifican)
+MODELOS_CAMBIOS = {
+    Categoria: 'actualizado',
+    Cliente: 'actualizado',
+    Caja: 'actualizado',
+    Producto: 'actualizado',
+    Sale: 'actualizado',
+    SaleItem: 'actualizado',
+    CajaMovimiento: 'creado',
+}
@@ -0,0 +1,109 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max
+
+from .models import Sale, Secuencia
+
+
+def serie_venta(tipo_comprobante):
+    return f"venta-{tipo_comprobante}"
+
+
+def reservar(serie, cantidad=1):
+    # Reserva `cantidad` números consecutivos de la serie y devuelve el rango.
+    # El UPDATE bloquea la fila del contador hasta el fin de la transacción
+    # (igual que SELECT ... FOR UPDATE, pero también en SQLite), así que dos
+    # cajeros nunca leen el mismo valor.
+    with transaction.atomic(savepoint=False):
+        if not Secuencia.objects.filter(serie=serie).update(ultimo=F('ultimo') + cantidad):
+            try:
+                with transaction.atomic():
+                    Secuencia.objects.create(serie=serie, ultimo=cantidad)
+            except IntegrityError:
+                # Otro proceso creó la serie al mismo tiempo
+                Secuencia.objects.filter(serie=serie).update(ultimo=F('ultimo') + cantidad)
+        ultimo = Secuencia.objects.values_list('ultimo', flat=True).get(serie=serie)
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+class _Bloque:
+    def __init__(self, numeros):
+        self.siguiente = numeros.start
+        self.fin = numeros.stop
+        self.confirmado = False
+
+
+class AsignadorNumeros:
+    # Entrega números reservando bloques de NUMERACION_BLOQUE por proceso
+    # (por defecto 1: numeración estrictamente consecutiva). Con bloques más
+    # grandes se ahorran consultas a cambio de posibles saltos si el proceso
+    # se reinicia con números sin usar.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloques = {}
+
+    def _confirmar(self, bloque):
+        bloque.confirmado = True
+
+    def siguiente(self, serie):
+        tamano = max(int(getattr(settings, "NUMERACION_BLOQUE", 1)), 1)
+        with self._lock:
+            bloque = self._bloques.get(serie)
+            # Un bloque cuya reserva no llegó a confirmarse pudo revertirse: se descarta
+            if bloque is None or bloque.siguiente >= bloque.fin or not bloque.confirmado:
+                bloque = _Bloque(reservar(serie, tamano))
+                self._bloques[serie] = bloque
+                transaction.on_commit(lambda: self._confirmar(bloque))
+            numero = bloque.siguiente
+            bloque.siguiente += 1
+            return numero
+
+
+asignador = AsignadorNumeros()
+
+
+def numero_venta(tipo_comprobante):
+    return asignador.siguiente(serie_venta(tipo_comprobante))
+
+
+def ajustar_series_venta():
+    # Tras cargar ventas con su número ya asignado (respaldos, cambios de otra
+    # tienda), cada serie sigue después del mayor número registrado
+    maximos = Sale.objects.values_list('tipo_comprobante').annotate(ultimo=Max('numero_venta'))
+    for tipo, ultimo in maximos:
+        serie = serie_venta(tipo)
+        actual = Secuencia.objects.filter(serie=serie).values_list('ultimo', flat=True).first() or 0
+        if (ultimo or 0) > actual:
+            Secuencia.objects.update_or_create(serie=serie, defaults={'ultimo': ultimo})
+
+
+# Versión del catálogo: contador que sube cada vez que cambian productos o
+# stock (ver signals.avanzar_version_catalogo). Sirve de ETag para las APIs.
+SERIE_CATALOGO = "catalogo"
+
+
+def version_catalogo():
+    return Secuencia.objects.filter(serie=SERIE_CATALOGO).values_list('ultimo', flat=True).first() or 0
+
+
+def avanzar_catalogo():
+    return reservar(SERIE_CATALOGO)[0]
+
+
+# Segundos Unix del último cambio de todo el catálogo (importaciones,
+# restauraciones: productos_modificados con ids=None). Las copias del
+# catálogo anteriores a ese momento se descargan completas otra vez.
+SERIE_CATALOGO_COMPLETO = "catalogo-completo"
+
+
+def catalogo_completo_desde():
+    return Secuencia.objects.filter(serie=SERIE_CATALOGO_COMPLETO).values_list('ultimo', flat=True).first() or 0
+
+
+def marcar_catalogo_completo():
+    Secuencia.objects.update_or_create(serie=SERIE_CATALOGO_COMPLETO, defaults={'ultimo': math.ceil(time.time())})
@@ -0,0 +1,181 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Max, Q, Value, When
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from .models import DINERO, Producto, Reajuste, expresion_precio_venta
+from .signals import notificar_productos
+
+# Productos por UPDATE al deshacer (un WHEN por producto)
+LOTE_DESHACER = 500
+
+# Filas de ejemplo en la vista previa
+LIMITE_VISTA_PREVIA = 50
+
+
+def _decimal(valor):
+    return Value(Decimal(valor), output_field=DINERO)
+
+
+# --------------------------
+# FILTRO Y EXPRESIONES
+# --------------------------
+def productos_filtrados(filtro):
+    # filtro: {'categoria': id, 'marca': texto, 'busqueda': texto, 'ids': [...]}
+    productos = Producto.objects.filter(activo=True)
+    if filtro.get('ids'):
+        productos = productos.filter(id__in=filtro['ids'])
+    if filtro.get('categoria'):
+        productos = productos.filter(categoria_id=filtro['categoria'])
+    if filtro.get('marca'):
+        productos = productos.filter(marca__iexact=filtro['marca'])
+    if filtro.get('busqueda'):
+        productos = productos.filter(Q(nombre__icontains=filtro['busqueda']) | Q(marca__icontains=filtro['busqueda']))
+    return productos
+
+
+def nuevo_valor(campo, operacion, valor):
+    # Expresión SQL del nuevo valor del campo (redondeado y nunca negativo)
+    actual = F(campo)
+    if operacion == Reajuste.PORCENTAJE:
+        expresion = actual * (_decimal(1) + _decimal(valor) * _decimal('0.01'))
+    elif operacion == Reajuste.SUMAR:
+        expresion = actual + _decimal(valor)
+    elif operacion == Reajuste.FIJAR:
+        expresion = _decimal(valor)
+    else:
+        raise ValueError(f"Operación desconocida: {operacion}")
+    return Greatest(Round(expresion, 2), _decimal(0), output_field=DINERO)
+
+
+def valor_maximo(campo):
+    # Mayor valor que cabe en la columna (999.99 para porcentaje_ganancia)
+    columna = Producto._meta.get_field(campo)
+    return Decimal(10) ** (columna.max_digits - columna.decimal_places) - Decimal(10) ** -columna.decimal_places
+
+
+def verificar_limite(productos, campo, nuevo):
+    # Rechaza el reajuste antes del UPDATE si algún valor no cabe en la
+    # columna. El máximo se lee como float: en SQLite un decimal más largo que
+    # la columna no se puede convertir.
+    maximo = productos.aggregate(maximo=Max(nuevo, output_field=FloatField()))['maximo']
+    if maximo is not None and maximo > float(valor_maximo(campo)):
+        nombre = dict(Reajuste.CAMPOS)[campo].lower()
+        raise ValueError(
+            f"El reajuste llevaría el {nombre} hasta {maximo:.2f}; el máximo permitido es {valor_maximo(campo)}."
+        )
+
+
+def precio_venta_nuevo(campo, expresion):
+    # Precio de venta que resultará del reajuste, con la misma expresión que la
+    # columna calculada Producto.precio_venta
+    if campo == Reajuste.PRECIO_COMPRA:
+        return expresion_precio_venta(precio_compra=expresion)
+    return expresion_precio_venta(porcentaje_ganancia=expresion)
+
+
+# --------------------------
+# VISTA PREVIA, APLICAR Y DESHACER
+# --------------------------
+def vista_previa(filtro, campo, operacion, valor, limite=LIMITE_VISTA_PREVIA):
+    # Valores actuales y nuevos calculados por la base de datos con las mismas
+    # expresiones que usará el UPDATE
+    nuevo = nuevo_valor(campo, operacion, valor)
+    productos = productos_filtrados(filtro)
+    verificar_limite(productos, campo, nuevo)
+    muestra = (
+        productos.select_related('categoria')
+        .annotate(nuevo_valor=nuevo, nuevo_precio_venta=precio_venta_nuevo(campo, nuevo))
+        .order_by('categoria__nombre', 'nombre')[:limite]
+    )
+    return {'total': productos.count(), 'productos': list(muestra)}
+
+
+def aplicar_reajuste(filtro, campo, operacion, valor, usuario=None):
+    with transaction.atomic():
+        productos = productos_filtrados(filtro)
+        anteriores = dict(productos.select_for_update().values_list('id', campo))
+        nuevos = {}
+        if anteriores:
+            nuevo = nuevo_valor(campo, operacion, valor)
+            verificar_limite(productos, campo, nuevo)
+            # Un solo UPDATE; precio_venta, total_inversion y ganancia los
+            # recalcula la base de datos
+            reajustados = Producto.objects.filter(id__in=list(anteriores))
+            reajustados.update(**{campo: nuevo}, actualizado=timezone.now())
+            nuevos = dict(reajustados.values_list('id', campo))
+            notificar_productos(anteriores.keys())
+
+        return Reajuste.objects.create(
+            usuario=usuario,
+            campo=campo,
+            operacion=operacion,
+            valor=valor,
+            filtro=filtro,
+            productos=len(anteriores),
+            anteriores={str(pid): str(anterior) for pid, anterior in anteriores.items()},
+            nuevos={str(pid): str(nuevo) for pid, nuevo in nuevos.items()},
+        )
+
+
+def reajuste_posterior(reajuste):
+    # Reajuste más reciente del mismo campo, aún vigente, que tocó alguno de
+    # sus productos: deshacer este pisaría sus valores
+    ids = set(reajuste.anteriores)
+    posteriores = Reajuste.objects.filter(
+        campo=reajuste.campo, creado__gt=reajuste.creado, deshecho__isnull=True,
+    ).order_by('-creado')
+    for posterior in posteriores.only('id', 'anteriores'):
+        if ids & set(posterior.anteriores):
+            return posterior
+    return None
+
+
+def deshacer_reajuste(reajuste):
+    # Devuelve a cada producto su valor anterior, por lotes de LOTE_DESHACER.
+    # Los productos cuyo valor ya no es el que dejó el reajuste (se editaron
+    # después) no se tocan. Devuelve cuántos productos se restauraron.
+    with transaction.atomic():
+        reajuste = Reajuste.objects.select_for_update().get(pk=reajuste.pk)
+        if reajuste.deshecho:
+            raise ValueError(f"El reajuste #{reajuste.pk} ya fue deshecho.")
+        posterior = reajuste_posterior(reajuste)
+        if posterior:
+            raise ValueError(
+                f"Primero deshaz el reajuste #{posterior.pk}, que cambió los mismos productos después."
+            )
+
+        campo = reajuste.campo
+
+        def sin_editar(pid, actual):
+            # Los reajustes anteriores a `nuevos` no lo guardaban: se restauran
+            aplicado = reajuste.nuevos.get(str(pid))
+            return aplicado is None or Decimal(aplicado) == actual
+
+        anteriores = [(int(pid), Decimal(valor)) for pid, valor in reajuste.anteriores.items()]
+        restaurados = []
+        for inicio in range(0, len(anteriores), LOTE_DESHACER):
+            lote = anteriores[inicio:inicio + LOTE_DESHACER]
+            actuales = dict(
+                Producto.objects.select_for_update().filter(id__in=[pid for pid, _ in lote]).values_list('id', campo)
+            )
+            lote = [(pid, valor) for pid, valor in lote if pid in actuales and sin_editar(pid, actuales[pid])]
+            if not lote:
+                continue
+            anterior = Case(
+                *[When(pk=pid, then=_decimal(valor)) for pid, valor in lote],
+                default=F(campo),
+                output_field=DINERO,
+            )
+            Producto.objects.filter(id__in=[pid for pid, _ in lote]).update(
+                **{campo: anterior}, actualizado=timezone.now()
+            )
+            restaurados.extend(pid for pid, _ in lote)
+        if restaurados:
+            notificar_productos(restaurados)
+
+        reajuste.deshecho = timezone.now()
+        reajuste.save(update_fields=['deshecho'])
+    return len(restaurados)
@@ -0,0 +1,243 @@
+import math
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .exportacion import COLUMNAS_INVENTARIO, escribir_xlsx
+from .models import Caja, CajaMovimiento, Categoria, Cliente, Producto, Sale, SaleItem
+from .numeracion import ajustar_series_venta
+from .respaldo import insertar
+from .signals import notificar_productos
+from .ventas_diarias import reconstruir
+
+# Tamaño por defecto del conjunto sintético
+CATEGORIAS = 20
+PRODUCTOS = 2000
+VENTAS = 5000
+CAJAS_CERRADAS = 10
+DIAS = 60  # las ventas se reparten en los últimos DIAS días
+
+# Líneas por venta: la mayoría son compras chicas de mostrador
+LINEAS_POR_VENTA = [1] * 4 + [2] * 3 + [3] * 2 + [4, 5, 8, 12]
+
+# Un escenario empeora si sus consultas pasan las de la base, o si su p95
+# supera el de la base en más de esta fracción
+TOLERANCIA = 0.25
+# ...y en al menos estos milisegundos (en vistas de pocos ms el ruido pesa más)
+MARGEN_MINIMO_MS = 5
+
+_MARCAS = ["STANLEY", "TRUPER", "BOSCH", "PAVCO", "CELIMA", "VENCEDOR", "TOOLS", "3M"]
+_ARTICULOS = ["Martillo", "Alicate", "Tubo", "Codo", "Llave", "Cable", "Pintura", "Clavo", "Perno", "Brocha"]
+_MEDIDAS = ["1/2", "3/4", "1", "2", "10mm", "20mm", "x 3m", "galón", "kg", "caja"]
+_UNIDADES = ["UND", "KG", "M", "GLN", "CJA"]
+
+
+# --------------------------
+# DATOS SINTÉTICOS
+# --------------------------
+def generar_datos(categorias=CATEGORIAS, productos=PRODUCTOS, ventas=VENTAS,
+                  cajas_cerradas=CAJAS_CERRADAS, semilla=0):
+    # Llena una base vacía con datos reproducibles (misma semilla, mismos
+    # datos): productos con stock de sobra, ventas de los últimos DIAS días
+    # repartidas en cajas cerradas y una caja abierta. Devuelve el usuario.
+    azar = random.Random(semilla)
+    ahora = timezone.now()
+
+    with transaction.atomic():
+        usuario = User.objects.create_user("benchmark", password="benchmark", is_staff=True)
+        clientes = Cliente.objects.bulk_create(
+            [Cliente(nombre=f"Cliente {n}", documento=f"{10000000 + n}") for n in range(200)]
+        )
+        grupos = Categoria.objects.bulk_create([Categoria(nombre=f"CATEGORIA {n:03}") for n in range(categorias)])
+
+        nuevos = []
+        for n in range(productos):
+            compra = Decimal(azar.randint(50, 50000)) / 100
+            nuevos.append(Producto(
+                nombre=f"{azar.choice(_ARTICULOS)} {azar.choice(_MEDIDAS)} #{n}",
+                marca=azar.choice(_MARCAS),
+                categoria=grupos[n % categorias],
+                cantidad=azar.randint(ventas, ventas * 4),
+                unidad_medida=azar.choice(_UNIDADES),
+                precio_compra=compra,
+                precio=(compra * Decimal("1.30")).quantize(Decimal("0.01")),
+            ))
+        insertar(Producto, nuevos)
+
+        # Una caja cerrada por tramo de días y la abierta para los últimos
+        cajas = [
+            Caja(
+                usuario=usuario, monto_inicial=Decimal("100.00"), abierta=False,
+                fecha_apertura=ahora - timedelta(days=DIAS - n * DIAS // max(cajas_cerradas, 1)),
+                fecha_cierre=ahora - timedelta(days=DIAS - (n + 1) * DIAS // max(cajas_cerradas, 1)),
+            )
+            for n in range(cajas_cerradas)
+        ]
+        cajas.append(Caja(usuario=usuario, monto_inicial=Decimal("100.00"), abierta=True, fecha_apertura=ahora))
+        insertar(Caja, cajas)
+
+        inicio = ahora - timedelta(days=DIAS)
+        fechas = sorted(inicio + timedelta(seconds=azar.uniform(0, DIAS * 86400)) for _ in range(ventas))
+        numeros = {}
+        nuevas, lineas = [], []
+        for fecha in fechas:
+            tipo = azar.choice(["Nota", "Nota", "Boleta", "Factura"])
+            numeros[tipo] = numeros.get(tipo, 0) + 1
+            caja = next((c for c in cajas[:-1] if c.fecha_apertura <= fecha < c.fecha_cierre), cajas[-1])
+            elegidos = azar.sample(nuevos, min(azar.choice(LINEAS_POR_VENTA), len(nuevos)))
+            items = [(producto, azar.randint(1, 5), producto.precio) for producto in elegidos]
+            nuevas.append(Sale(
+                cliente=azar.choice(clientes), tipo_comprobante=tipo, numero_venta=numeros[tipo], caja=caja,
+                fecha=fecha, actualizado=fecha, total=sum(cantidad * precio for _, cantidad, precio in items),
+            ))
+            lineas.append(items)
+        insertar(Sale, nuevas)
+        insertar(SaleItem, [
+            SaleItem(sale=venta, producto=producto, cantidad=cantidad, precio=precio)
+            for venta, items in zip(nuevas, lineas) for producto, cantidad, precio in items
+        ])
+
+        # Libro de caja: un movimiento por venta; las cerradas congelan su total
+        insertar(CajaMovimiento, [
+            CajaMovimiento(caja=venta.caja, tipo=CajaMovimiento.VENTA, monto=venta.total, venta=venta, creado=venta.fecha)
+            for venta in nuevas
+        ])
+        totales = {}
+        for venta in nuevas:
+            totales[venta.caja.pk] = totales.get(venta.caja.pk, 0) + venta.total
+        for caja in cajas[:-1]:
+            caja.total = caja.monto_cierre = totales.get(caja.pk, Decimal("0.00"))
+        Caja.objects.bulk_update(cajas[:-1], ['total', 'monto_cierre'])
+
+        ajustar_series_venta()
+        reconstruir()
+        notificar_productos(None)
+    return usuario
+
+
+def libro_importacion(ajuste=Decimal("1")):
+    # Excel del inventario actual (una hoja por categoría, como lo exporta la
+    # tienda) con los precios de compra multiplicados por `ajuste`
+    filas = Producto.objects.filter(activo=True).order_by('categoria__nombre', 'id').values_list(
+        'categoria__nombre', 'nombre', 'marca', 'cantidad', 'unidad_medida', 'precio_compra',
+    )
+    hojas = {}
+    for categoria, *fila, compra in filas:
+        hojas.setdefault(categoria, []).append([*fila, (compra * ajuste).quantize(Decimal("0.01"))])
+    archivo = escribir_xlsx(hojas.items(), COLUMNAS_INVENTARIO[:5])
+    with archivo:
+        return archivo.read()
+
+
+# --------------------------
+# MEDICIÓN
+# --------------------------
+def percentil(valores, p):
+    # Rango más cercano: el menor valor que deja al menos p% de la muestra debajo
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+
+def medir(peticion, repeticiones):
+    # peticion(n) hace la petición n y devuelve la respuesta. La primera vez
+    # es de calentamiento (plantillas, cachés de Python) y no cuenta.
+    peticion(-1)
+    tiempos, consultas = [], []
+    for n in range(repeticiones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = peticion(n)
+            tiempos.append(time.perf_counter() - inicio)
+        if respuesta.status_code >= 400:
+            raise RuntimeError(f"La petición respondió {respuesta.status_code}")
+        consultas.append(len(capturadas))
+    return {
+        'repeticiones': repeticiones,
+        'p50_ms': round(percentil(tiempos, 50) * 1000, 2),
+        'p95_ms': round(percentil(tiempos, 95) * 1000, 2),
+        'consultas': percentil(consultas, 50),
+        'consultas_max': max(consultas),
+    }
+
+
+def escenarios(cliente, semilla=0):
+    # {nombre: peticion(n)} de las vistas más usadas en la tienda
+    azar = random.Random(semilla)
+    productos = list(Producto.objects.filter(activo=True).values_list('id', 'nombre', 'precio'))
+    ventas = list(Sale.objects.values_list('id', flat=True))
+    hoy = timezone.localdate()
+    libros = [BytesIO(libro_importacion(ajuste)) for ajuste in (Decimal("1.05"), Decimal("1"))]
+
+    def vender(n):
+        lineas = azar.sample(productos, min(azar.choice(LINEAS_POR_VENTA), len(productos)))
+        return cliente.post(reverse('ventas_nueva'), {
+            'cliente': f"Cliente {azar.randrange(200)}",
+            'tipo_comprobante': "Nota",
+            'producto_id[]': [pid for pid, _, _ in lineas],
+            'cantidad[]': [1] * len(lineas),
+            'precio[]': [str(precio) for _, _, precio in lineas],
+        })
+
+    def importar(n):
+        # Alterna dos libros para que cada importación cambie todos los precios
+        libro = libros[n % 2]
+        libro.seek(0)
+        libro.name = "inventario.xlsx"
+        return cliente.post(reverse('importar_excel'), {'archivo': libro})
+
+    return {
+        'lista_productos': lambda n: cliente.get(reverse('lista_productos')),
+        'lista_productos_busqueda': lambda n: cliente.get(
+            reverse('lista_productos'), {'q': azar.choice(_ARTICULOS).lower()}
+        ),
+        'registrar_venta_get': lambda n: cliente.get(reverse('ventas_nueva')),
+        'registrar_venta_post': vender,
+        'listar_ventas': lambda n: cliente.get(reverse('listar_ventas')),
+        'nota_venta': lambda n: cliente.get(reverse('nota_venta', args=[azar.choice(ventas)])),
+        'cerrar_caja_periodo': lambda n: cliente.get(
+            reverse('cerrar_caja_periodo', args=['mes', f"{hoy:%Y-%m}"])
+        ),
+        'importar_excel': importar,
+    }
+
+
+def ejecutar(usuario, repeticiones=20, solo=None, semilla=0):
+    # Mide cada escenario con el cliente de pruebas de Django (vista completa:
+    # middleware, plantillas y consultas; sin red ni servidor web)
+    cache.clear()
+    cliente = Client()
+    cliente.force_login(usuario)
+    resultados = {}
+    for nombre, peticion in escenarios(cliente, semilla).items():
+        if solo and nombre not in solo:
+            continue
+        # La importación es mucho más lenta que el resto: menos vueltas
+        vueltas = max(repeticiones // 5, 2) if nombre == 'importar_excel' else repeticiones
+        resultados[nombre] = medir(peticion, vueltas)
+    return resultados
+
+
+def comparar(resultados, base, tolerancia=TOLERANCIA):
+    # Mensajes de los escenarios que empeoraron respecto de la base. Las
+    # consultas son deterministas y se comparan exactas; el tiempo con margen.
+    regresiones = []
+    for nombre, actual in resultados.items():
+        anterior = base.get(nombre)
+        if not anterior:
+            continue
+        if actual['consultas'] > anterior['consultas']:
+            regresiones.append(f"{nombre}: {actual['consultas']} consultas (base {anterior['consultas']})")
+        limite = max(anterior['p95_ms'] * (1 + tolerancia), anterior['p95_ms'] + MARGEN_MINIMO_MS)
+        if actual['p95_ms'] > limite:
+            regresiones.append(f"{nombre}: p95 {actual['p95_ms']} ms (base {anterior['p95_ms']} ms)")
+    return regresiones
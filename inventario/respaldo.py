@@ -0,0 +1,314 @@
+import json
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.apps import apps
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .models import Caja, CajaMovimiento, Categoria, Producto, Sale, VentaDiaria
+from .numeracion import ajustar_series_venta
+from .signals import agrupar_notificaciones, aplicando_cambios, notificar_productos
+from .ventas_diarias import reconstruir
+
+# Bytes que se leen del archivo por vez y registros por INSERT
+TAMANO_BLOQUE = 64 * 1024
+TAMANO_LOTE = 1000
+
+# Modelos que `migrate` vuelve a crear o que no vale la pena restaurar
+EXCLUIDOS = {'contenttypes.contenttype', 'auth.permission', 'sessions.session', 'admin.logentry'}
+
+
+# --------------------------
+# LECTURA EN STREAMING
+# --------------------------
+def decodificar(datos, final=False):
+    # UTF-8, y los bytes que no lo son se leen como latin-1 (los dumps viejos
+    # traen "BAÑO" en latin-1). Devuelve (texto, bytes_pendientes, reparados):
+    # los pendientes son un carácter UTF-8 cortado al final del bloque.
+    partes = []
+    reparados = 0
+    inicio = 0
+    while True:
+        try:
+            partes.append(datos[inicio:].decode('utf-8'))
+            return "".join(partes), b"", reparados
+        except UnicodeDecodeError as e:
+            partes.append(datos[inicio:inicio + e.start].decode('utf-8'))
+            if e.reason == 'unexpected end of data' and not final:
+                return "".join(partes), datos[inicio + e.start:], reparados
+            partes.append(datos[inicio + e.start:inicio + e.end].decode('latin-1'))
+            reparados += e.end - e.start
+            inicio += e.end
+
+
+class LectorRespaldo:
+    # Recorre un dump de `dumpdata` (lista JSON) objeto por objeto sin cargar
+    # el archivo completo. Si el archivo está cortado, entrega lo que se pudo
+    # leer y deja truncado=True.
+
+    def __init__(self, archivo, tamano_bloque=TAMANO_BLOQUE):
+        self.archivo = archivo
+        self.tamano_bloque = tamano_bloque
+        self.reparados = 0  # bytes no UTF-8 leídos como latin-1
+        self.truncado = False
+        self.posicion = 0  # caracteres consumidos, para ubicar el corte
+
+    def objetos(self):
+        decodificador = json.JSONDecoder(parse_float=Decimal)
+        texto, pendiente, pos, fin = "", b"", 0, False
+        while True:
+            while pos < len(texto) and texto[pos] in " \t\r\n,[":
+                pos += 1
+            if pos < len(texto):
+                if texto[pos] == "]":
+                    return
+                try:
+                    objeto, pos = decodificador.raw_decode(texto, pos)
+                except json.JSONDecodeError:
+                    if fin:
+                        self.truncado = True
+                        self.posicion += pos
+                        return
+                else:
+                    yield objeto
+                    continue
+            elif fin:
+                return
+
+            bloque = self.archivo.read(self.tamano_bloque)
+            fin = not bloque
+            nuevo, pendiente, reparados = decodificar(pendiente + bloque, final=fin)
+            self.reparados += reparados
+            self.posicion += pos
+            texto, pos = texto[pos:] + nuevo, 0
+
+
+# --------------------------
+# RESTAURACIÓN
+# --------------------------
+class ResultadoRestauracion:
+    def __init__(self):
+        self.restaurados = Counter()  # modelo -> registros insertados (o leídos, al simular)
+        self.omitidos = Counter()  # modelos desconocidos o excluidos -> registros
+        self.campos_ignorados = defaultdict(set)  # modelo -> campos que ya no existen
+        self.errores = []
+        self.reparados = 0
+        self.truncado = False
+        self.posicion = 0
+
+    def agregar_error(self, modelo, pk, mensaje):
+        self.errores.append({'modelo': modelo, 'pk': pk, 'mensaje': mensaje})
+
+
+def modelo_de(etiqueta):
+    try:
+        modelo = apps.get_model(etiqueta)
+    except (LookupError, ValueError, TypeError):
+        return None  # "producto" sin app, modelos que ya no existen
+    return None if modelo._meta.label_lower in EXCLUIDOS else modelo
+
+
+def construir_instancia(modelo, registro, resultado):
+    # Instancia sin guardar y sus relaciones muchos a muchos {campo: [ids]}
+    instancia = modelo()
+    if registro.get('pk') is not None:
+        instancia.pk = modelo._meta.pk.to_python(registro['pk'])
+
+    relaciones = {}
+    for nombre, valor in (registro.get('fields') or {}).items():
+        try:
+            campo = modelo._meta.get_field(nombre)
+        except FieldDoesNotExist:
+            resultado.campos_ignorados[modelo._meta.label_lower].add(nombre)
+            continue
+        if campo.many_to_many:
+            relaciones[campo] = [campo.target_field.to_python(v) for v in valor or ()]
+        elif not campo.concrete or campo.generated:
+            continue  # relaciones inversas y columnas que calcula la base de datos
+        elif campo.is_relation:
+            setattr(instancia, campo.attname, None if valor is None else campo.target_field.to_python(valor))
+        else:
+            setattr(instancia, campo.attname, campo.to_python(valor))
+    return instancia, relaciones
+
+
+def _dependencias(modelo):
+    return {campo.related_model for campo in modelo._meta.concrete_fields if campo.is_relation} - {modelo}
+
+
+def orden_dependencias(modelos):
+    # Cada modelo va después de los modelos a los que apunta:
+    # categoria -> producto, cliente/caja -> sale -> saleitem
+    restantes = set(modelos)
+    orden = []
+    while restantes:
+        listos = [m for m in restantes if not _dependencias(m) & restantes]
+        if not listos:
+            listos = list(restantes)  # ciclo: las FK se verifican al confirmar
+        listos.sort(key=lambda m: m._meta.label_lower)
+        orden += listos
+        restantes -= set(listos)
+    return orden
+
+
+def insertar(modelo, instancias, tamano_lote=TAMANO_LOTE):
+    # bulk_create llama a pre_save, que pisa las fechas auto_now(_add) con la
+    # hora actual: se guardan antes y se reponen con un bulk_update
+    fechas = [
+        campo for campo in modelo._meta.concrete_fields
+        if (getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False))
+        and any(getattr(instancia, campo.attname) is not None for instancia in instancias)
+    ]
+    originales = [[getattr(instancia, campo.attname) for campo in fechas] for instancia in instancias]
+
+    modelo.objects.bulk_create(instancias, batch_size=tamano_lote)
+
+    if fechas:
+        for instancia, valores in zip(instancias, originales):
+            for campo, valor in zip(fechas, valores):
+                if valor is not None:
+                    setattr(instancia, campo.attname, valor)
+        modelo.objects.bulk_update(instancias, [campo.name for campo in fechas], batch_size=tamano_lote)
+
+
+def _insertar_relaciones(relaciones, tamano_lote):
+    for campo, filas in relaciones.items():
+        intermedia = campo.remote_field.through
+        origen = campo.m2m_field_name() + '_id'
+        destino = campo.m2m_reverse_field_name() + '_id'
+        intermedia.objects.bulk_create(
+            [intermedia(**{origen: instancia.pk, destino: id_}) for instancia, ids in filas for id_ in ids],
+            batch_size=tamano_lote,
+        )
+
+
+def _reiniciar_secuencias(modelos):
+    # Tras insertar con pk explícita, los autoincrementales de PostgreSQL
+    # deben continuar después del mayor id (lo mismo que hace loaddata)
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), modelos):
+            cursor.execute(sql)
+
+
+def vaciar(modelos):
+    # Borra los registros de los modelos del respaldo, de los que apuntan a
+    # otros hacia atrás, con un DELETE por tabla: QuerySet.delete() los recorre
+    # fila por fila con señales que registrarían devoluciones, bajas para
+    # exportar y ventas diarias, y todo eso se recalcula al final. Si otra
+    # tabla con filas apunta al modelo se usa QuerySet.delete(), que aplica el
+    # on_delete de esa relación.
+    conjunto = set(modelos)
+    with aplicando_cambios(), connection.cursor() as cursor:
+        for modelo in reversed(orden_dependencias(conjunto)):
+            externas = {
+                campo.related_model for campo in modelo._meta.get_fields(include_hidden=True)
+                if campo.auto_created and not campo.concrete and campo.related_model not in conjunto
+            }
+            if any(externa._base_manager.exists() for externa in externas):
+                modelo._base_manager.all().delete()
+            else:
+                cursor.execute(f"DELETE FROM {connection.ops.quote_name(modelo._meta.db_table)}")
+
+
+def _completar(restaurados, cajas):
+    # Datos derivados que bulk_create no mantiene
+    if restaurados[Sale._meta.label_lower]:
+        ajustar_series_venta()
+        if VentaDiaria._meta.label_lower not in restaurados:
+            reconstruir()
+
+    if cajas and CajaMovimiento._meta.label_lower not in restaurados:
+        # Dumps anteriores al libro de caja: el total entra como ajuste inicial
+        CajaMovimiento.objects.bulk_create([
+            CajaMovimiento(caja_id=caja_id, tipo=CajaMovimiento.AJUSTE, monto=total, descripcion="Saldo restaurado")
+            for caja_id, total in cajas if total
+        ])
+
+    if restaurados[Producto._meta.label_lower] or restaurados[Categoria._meta.label_lower]:
+        notificar_productos(None)
+
+
+def registros(archivo, resultado):
+    # (modelo, instancia, relaciones) de cada registro restaurable del archivo
+    lector = LectorRespaldo(archivo)
+    for registro in lector.objetos():
+        etiqueta = registro.get('model') if isinstance(registro, dict) else None
+        modelo = modelo_de(etiqueta) if isinstance(etiqueta, str) else None
+        if modelo is None:
+            resultado.omitidos[str(etiqueta)] += 1
+            continue
+        try:
+            instancia, muchos = construir_instancia(modelo, registro, resultado)
+        except (ValidationError, ValueError, TypeError) as e:
+            resultado.agregar_error(etiqueta, registro.get('pk'), str(e))
+            continue
+        yield modelo, instancia, muchos
+
+    resultado.reparados = lector.reparados
+    resultado.truncado = lector.truncado
+    resultado.posicion = lector.posicion
+
+
+def modelos_del_respaldo(archivo):
+    # Primera lectura con --limpiar: solo qué modelos trae el respaldo
+    modelos = set()
+    for registro in LectorRespaldo(archivo).objetos():
+        etiqueta = registro.get('model') if isinstance(registro, dict) else None
+        modelo = modelo_de(etiqueta) if isinstance(etiqueta, str) else None
+        if modelo is not None:
+            modelos.add(modelo)
+    return modelos
+
+
+def restaurar(archivo, limpiar=False, simular=False, tamano_lote=TAMANO_LOTE):
+    # archivo: abierto en modo binario. Con limpiar se borran antes los
+    # registros de los modelos que trae el respaldo (el archivo se lee dos
+    # veces); con simular solo se lee. Los registros se insertan por lotes de
+    # tamano_lote a medida que se leen: nunca está todo el respaldo en memoria.
+    # Las FK se verifican al confirmar, así que el orden del archivo no importa.
+    resultado = ResultadoRestauracion()
+
+    if simular:
+        for modelo, _, _ in registros(archivo, resultado):
+            resultado.restaurados[modelo._meta.label_lower] += 1
+        return resultado
+
+    with transaction.atomic(), agrupar_notificaciones():
+        if limpiar:
+            modelos = modelos_del_respaldo(archivo)
+            archivo.seek(0)
+            vaciar(modelos)
+
+        lotes = defaultdict(list)
+        intermedias = set()
+        cajas = []  # (id, total) para los dumps sin libro de caja
+
+        def guardar(modelo, lote):
+            insertar(modelo, [instancia for instancia, _ in lote], tamano_lote)
+            relaciones = defaultdict(list)
+            for instancia, muchos in lote:
+                for campo, ids in muchos.items():
+                    if ids:
+                        relaciones[campo].append((instancia, ids))
+            _insertar_relaciones(relaciones, tamano_lote)
+            intermedias.update(campo.remote_field.through for campo in relaciones)
+            resultado.restaurados[modelo._meta.label_lower] += len(lote)
+            if modelo is Caja:
+                cajas.extend((instancia.pk, instancia.total) for instancia, _ in lote)
+            lote.clear()
+
+        for modelo, instancia, muchos in registros(archivo, resultado):
+            lote = lotes[modelo]
+            lote.append((instancia, muchos))
+            if len(lote) >= tamano_lote:
+                guardar(modelo, lote)
+        for modelo, lote in lotes.items():
+            if lote:
+                guardar(modelo, lote)
+
+        _reiniciar_secuencias(list(lotes) + list(intermedias))
+        _completar(resultado.restaurados, cajas)
+
+    return resultado
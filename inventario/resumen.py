@@ -0,0 +1,60 @@
+from decimal import Decimal
+
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Categoria, Producto, ResumenCategoria
+
+CAMPOS_RESUMEN = ['productos', 'unidades', 'total_inversion', 'ganancia', 'actualizado']
+
+
+def actualizar_resumen(categoria_ids=None):
+    # Recalcula el resumen de las categorías indicadas (None = todas) con una
+    # consulta agrupada sobre el índice de categoria y un solo upsert
+    categorias = Categoria.objects.all()
+    if categoria_ids is not None:
+        categorias = categorias.filter(id__in=set(categoria_ids))
+    ids = list(categorias.values_list('id', flat=True))
+    if not ids:
+        return
+
+    totales = {
+        fila['categoria_id']: fila
+        for fila in Producto.objects.filter(activo=True, categoria_id__in=ids)
+        .values('categoria_id')
+        .annotate(
+            n=Count('id'),
+            unidades=Sum('cantidad'),
+            inversion=Sum('total_inversion'),
+            utilidad=Sum('ganancia'),
+        )
+        .order_by()
+    }
+
+    ahora = timezone.now()
+    resumenes = []
+    for categoria_id in ids:
+        fila = totales.get(categoria_id, {})
+        resumenes.append(ResumenCategoria(
+            categoria_id=categoria_id,
+            productos=fila.get('n') or 0,
+            unidades=fila.get('unidades') or Decimal("0"),
+            total_inversion=fila.get('inversion') or Decimal("0"),
+            ganancia=fila.get('utilidad') or Decimal("0"),
+            actualizado=ahora,
+        ))
+
+    ResumenCategoria.objects.bulk_create(
+        resumenes,
+        update_conflicts=True,
+        unique_fields=['categoria'],
+        update_fields=CAMPOS_RESUMEN,
+    )
+
+
+def totales_inventario():
+    return ResumenCategoria.objects.aggregate(
+        productos=Sum('productos'),
+        total_inversion=Sum('total_inversion'),
+        ganancia=Sum('ganancia'),
+    )
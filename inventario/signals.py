@@ -0,0 +1,183 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+from .busqueda import indice
+from .libro_caja import registrar_movimiento
+from .models import MODELOS_CAMBIOS, Caja, CajaMovimiento, Categoria, Eliminacion, Producto, Sale, SaleItem
+from .numeracion import avanzar_catalogo, marcar_catalogo_completo
+from .resumen import actualizar_resumen
+from .ventas_diarias import pasar_a_sin_caja, quitar_venta_diaria
+
+# Las escrituras masivas (bulk_create, bulk_update, update) no disparan
+# post_save: quien las hace envía esta señal con los ids tocados, o ids=None
+# si cambió todo el catálogo. `categorias` lleva las categorías afectadas
+# cuando se conocen (por ejemplo las de productos ya borrados).
+productos_modificados = Signal()
+
+_agrupacion = threading.local()
+_replica = threading.local()
+
+
+def notificar_productos(ids=None, categorias=None):
+    pendiente = getattr(_agrupacion, 'pendiente', None)
+    if pendiente is not None:
+        if ids is None:
+            pendiente['todo'] = True
+        else:
+            pendiente['ids'].update(ids)
+        pendiente['categorias'].update(categorias or ())
+        return
+
+    ids = None if ids is None else list(ids)
+    categorias = None if categorias is None else list(categorias)
+    # Se envía al confirmar la transacción para no publicar cambios revertidos
+    transaction.on_commit(
+        lambda: productos_modificados.send(sender=Producto, ids=ids, categorias=categorias)
+    )
+
+
+@contextmanager
+def agrupar_notificaciones():
+    # Dentro del bloque las notificaciones por fila (p. ej. los post_delete de un
+    # borrado masivo) se acumulan y se envían una sola vez al salir
+    # Devuelve lo acumulado para que quien lo necesite lo guarde y lo vacíe
+    if getattr(_agrupacion, 'pendiente', None) is not None:
+        yield _agrupacion.pendiente
+        return
+
+    pendiente = _agrupacion.pendiente = {'todo': False, 'ids': set(), 'categorias': set()}
+    try:
+        yield pendiente
+    finally:
+        _agrupacion.pendiente = None
+
+    if pendiente['todo']:
+        notificar_productos(None, pendiente['categorias'])
+    elif pendiente['ids'] or pendiente['categorias']:
+        notificar_productos(pendiente['ids'], pendiente['categorias'])
+
+
+@contextmanager
+def aplicando_cambios():
+    # Los cambios que llegan de otra base (aplicar_cambios) ya traen sus
+    # movimientos de caja y fechas: dentro del bloque las bajas de ventas no
+    # registran devoluciones ni tocan las ventas diarias (se reconstruyen al final)
+    anterior = getattr(_replica, 'activo', False)
+    _replica.activo = True
+    try:
+        yield
+    finally:
+        _replica.activo = anterior
+
+
+def _aplicando_cambios():
+    return getattr(_replica, 'activo', False)
+
+
+# --------------------------
+# ÍNDICE DE BÚSQUEDA
+# --------------------------
+@receiver(productos_modificados)
+def actualizar_indice(sender, ids=None, **kwargs):
+    if ids is None:
+        indice.invalidar()
+    else:
+        indice.actualizar(ids)  # los que ya no existen se quitan del índice
+
+
+# --------------------------
+# VERSIÓN DEL CATÁLOGO
+# --------------------------
+@receiver(productos_modificados)
+def avanzar_version_catalogo(sender, ids=None, **kwargs):
+    avanzar_catalogo()
+    if ids is None:
+        marcar_catalogo_completo()
+
+
+# --------------------------
+# RESUMEN POR CATEGORÍA
+# --------------------------
+@receiver(productos_modificados)
+def actualizar_resumen_categorias(sender, ids=None, categorias=None, **kwargs):
+    if ids is None:
+        actualizar_resumen()
+        return
+
+    categorias = set(categorias or ())
+    pendientes = set(ids)
+    if pendientes:
+        categorias.update(
+            Producto.objects.filter(id__in=pendientes).values_list('categoria_id', flat=True).distinct()
+        )
+    actualizar_resumen(categorias)
+
+
+# --------------------------
+# CAMBIOS FILA POR FILA
+# --------------------------
+@receiver(post_save, sender=Producto)
+def producto_guardado(sender, instance, **kwargs):
+    categorias = {instance.categoria_id, getattr(instance, '_categoria_original', None)} - {None}
+    instance._categoria_original = instance.categoria_id
+    notificar_productos([instance.pk], categorias)
+
+
+@receiver(post_delete, sender=Producto)
+def producto_eliminado(sender, instance, **kwargs):
+    notificar_productos([instance.pk], [instance.categoria_id])
+
+
+@receiver(post_save, sender=Categoria)
+def categoria_guardada(sender, instance, **kwargs):
+    # El nombre de la categoría forma parte del índice
+    notificar_productos(Producto.objects.filter(categoria=instance).values_list('id', flat=True), [instance.pk])
+
+
+# --------------------------
+# LIBRO DE CAJA Y VENTAS DIARIAS
+# --------------------------
+@receiver(post_delete, sender=Sale)
+def venta_eliminada(sender, instance, **kwargs):
+    if _aplicando_cambios():
+        return
+    quitar_venta_diaria(instance)
+    # Una venta borrada de una caja abierta se registra como devolución
+    if instance.caja_id and instance.total and Caja.objects.filter(pk=instance.caja_id, abierta=True).exists():
+        registrar_movimiento(
+            instance.caja_id, CajaMovimiento.DEVOLUCION, -instance.total,
+            descripcion=f"Venta {instance.numero_venta} eliminada",
+        )
+
+
+@receiver(pre_delete, sender=Caja)
+def caja_eliminada(sender, instance, **kwargs):
+    # Antes de que Django deje en NULL la caja de sus acumulados diarios
+    pasar_a_sin_caja(instance.pk)
+
+
+# --------------------------
+# NOTAS DE VENTA
+# --------------------------
+@receiver(post_delete, sender=SaleItem)
+def item_eliminado(sender, instance, **kwargs):
+    if _aplicando_cambios():
+        return
+    # Nueva versión de la venta para que su nota en caché se vuelva a generar
+    Sale.objects.filter(pk=instance.sale_id).update(actualizado=timezone.now())
+
+
+# --------------------------
+# BAJAS PARA EXPORTAR CAMBIOS
+# --------------------------
+def registrar_eliminacion(sender, instance, **kwargs):
+    Eliminacion.objects.create(modelo=sender._meta.label_lower, objeto_id=str(instance.pk))
+
+
+for _modelo in MODELOS_CAMBIOS:
+    post_delete.connect(registrar_eliminacion, sender=_modelo, dispatch_uid=f'eliminacion_{_modelo._meta.label_lower}')
@@ -0,0 +1,1160 @@
+import gzip
+import json
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, Sum
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl.worksheet._read_only import ReadOnlyWorksheet
+
+from .busqueda import LIMITE_RESULTADOS, IndiceProductos, indice
+from .cambios import CambiosInvalidos, aplicar_cambios, exportar_cambios
+from .exportacion import COLUMNAS_INVENTARIO, escribir_xlsx
+from .importacion import (
+    TIEMPO_TRABAJO_CAIDO, abrir_workbook, crear_trabajo, ejecutar_trabajo, leer_fila, nombre_categoria,
+    sincronizar_workbook,
+)
+from .libro_caja import cerrar_caja, crear_corte, saldo_caja
+from .metricas import MetricasMiddleware, metricas
+from .models import (
+    Caja, CajaMovimiento, Categoria, Cliente, Eliminacion, Producto, Reajuste, ResumenCategoria, Sale, SaleItem,
+    Secuencia, TrabajoImportacion, VentaDiaria,
+)
+from .numeracion import version_catalogo
+from .reajuste import aplicar_reajuste, deshacer_reajuste
+from .rendimiento import comparar, ejecutar, generar_datos
+from .respaldo import restaurar
+from .signals import notificar_productos, productos_modificados
+from .ventas_diarias import rango_periodo, reconstruir, totales_periodo
+from .ventas_servicio import StockInsuficiente, VentaInvalida, registrar_venta
+from .ventas_views import VENTAS_POR_PAGINA
+
+
+class RegistrarVentaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cajero", password="clave")
+        cls.caja = Caja.objects.create(usuario=cls.usuario, monto_inicial=Decimal("100.00"))
+        cls.cliente = Cliente.objects.create(nombre="Cliente")
+        Secuencia.objects.create(serie="venta-Nota")
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        cls.productos = [
+            Producto.objects.create(
+                nombre=f"Producto {i}", marca="Marca", categoria=categoria,
+                cantidad=100, precio_compra=Decimal("10.00"),
+            )
+            for i in range(50)
+        ]
+
+    def lineas(self, n):
+        return [(p.id, 2, Decimal("13.00")) for p in self.productos[:n]]
+
+    def test_numero_de_consultas_no_depende_de_las_lineas(self):
+        # savepoint, productos, número (update + select), venta, items, stock,
+        # movimiento, venta diaria, release
+        VentaDiaria.objects.create(fecha=timezone.localdate(), caja=self.caja, tipo_comprobante="Nota")
+        for n in (1, 10, 50):
+            with self.subTest(lineas=n), self.assertNumQueries(10):
+                registrar_venta(self.cliente, "Nota", self.lineas(n), caja=self.caja)
+
+    def test_descuenta_stock_y_actualiza_totales(self):
+        venta = registrar_venta(self.cliente, "Nota", self.lineas(10), caja=self.caja)
+
+        self.assertEqual(venta.total, Decimal("260.00"))
+        self.assertEqual(venta.items.count(), 10)
+        producto = Producto.objects.get(pk=self.productos[0].pk)
+        self.assertEqual(producto.cantidad, Decimal("98.00"))
+        self.assertEqual(producto.total_inversion, Decimal("980.00"))
+        self.assertEqual(saldo_caja(self.caja), Decimal("260.00"))
+
+    def test_ventas_diarias_coinciden_con_reconstruccion(self):
+        registrar_venta(self.cliente, "Nota", self.lineas(10), caja=self.caja)
+        registrar_venta(self.cliente, "Boleta", self.lineas(2), caja=self.caja)
+        Sale.objects.filter(tipo_comprobante="Boleta").get().delete()
+        registrar_venta(self.cliente, "Nota", self.lineas(1), caja=self.caja)
+
+        hoy = timezone.localdate()
+        desde, hasta = rango_periodo("mes", hoy.strftime("%Y-%m"))
+        incremental = totales_periodo(desde, hasta)
+        self.assertEqual(incremental['ventas'], 2)
+        self.assertEqual(incremental['total'], Decimal("286.00"))
+
+        reconstruir()
+        self.assertEqual(totales_periodo(desde, hasta), incremental)
+
+    def test_borrar_caja_une_sus_ventas_diarias_con_las_sin_caja(self):
+        registrar_venta(self.cliente, "Nota", self.lineas(1))
+        otra = Caja.objects.create(usuario=self.usuario, monto_inicial=Decimal("0.00"), abierta=False)
+        registrar_venta(self.cliente, "Nota", self.lineas(2), caja=otra)
+
+        otra.delete()
+        fila = VentaDiaria.objects.get(caja__isnull=True)
+        self.assertEqual((fila.ventas, fila.total), (2, Decimal("78.00")))
+
+    def test_editar_tipo_dia_o_caja_mueve_la_venta_de_fila(self):
+        def filas():
+            return {
+                (f.fecha, f.caja_id, f.tipo_comprobante): (f.ventas, f.total)
+                for f in VentaDiaria.objects.exclude(ventas=0)
+            }
+
+        venta = registrar_venta(self.cliente, "Nota", self.lineas(1), caja=self.caja)
+        otra = Caja.objects.create(usuario=self.usuario, monto_inicial=Decimal("0.00"), abierta=False)
+        hoy = timezone.localdate()
+
+        editada = Sale.objects.get(pk=venta.pk)
+        editada.tipo_comprobante = "Boleta"
+        editada.save()
+        self.assertEqual(filas(), {(hoy, self.caja.pk, "Boleta"): (1, Decimal("26.00"))})
+        self.assertEqual(Sale.objects.get(pk=venta.pk).tipo_comprobante, "Boleta")
+
+        editada.fecha -= timedelta(days=1)
+        editada.caja = otra
+        editada.save()
+        esperado = {(hoy - timedelta(days=1), otra.pk, "Boleta"): (1, Decimal("26.00"))}
+        self.assertEqual(filas(), esperado)
+
+        reconstruir()
+        self.assertEqual(filas(), esperado)
+
+    def test_ventas_diarias_sin_caja_son_unicas_por_dia_y_tipo(self):
+        hoy = timezone.localdate()
+        VentaDiaria.objects.create(fecha=hoy, caja=None, tipo_comprobante="Nota", ventas=1, total=Decimal("1.00"))
+        VentaDiaria.objects.create(fecha=hoy, caja=self.caja, tipo_comprobante="Nota", ventas=1, total=Decimal("1.00"))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VentaDiaria.objects.create(fecha=hoy, caja=None, tipo_comprobante="Nota", ventas=1, total=Decimal("1.00"))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            VentaDiaria.objects.create(fecha=hoy, caja=self.caja, tipo_comprobante="Nota", ventas=1, total=Decimal("1.00"))
+
+    def test_productos_inactivos_se_informan_como_no_encontrados(self):
+        inactivo = self.productos[1]
+        Producto.objects.filter(pk=inactivo.pk).update(activo=False)
+
+        with self.assertRaisesMessage(VentaInvalida, f"Productos no encontrados: [{inactivo.pk}]"):
+            registrar_venta(self.cliente, "Nota", self.lineas(2), caja=self.caja)
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).cantidad, Decimal("100.00"))
+
+        self.client.force_login(self.usuario)
+        lineas = [{'id': p.pk, 'cantidad': 1} for p in self.productos[:2]] + [{'id': 999999, 'cantidad': 1}]
+        datos = self.client.post(
+            reverse('verificar_carrito_api'), json.dumps({'lineas': lineas}), content_type='application/json',
+        ).json()
+        self.assertEqual((datos['ok'], datos['no_encontrados']), (False, [inactivo.pk, 999999]))
+
+    def test_stock_insuficiente_no_registra_nada(self):
+        lineas = self.lineas(3) + [(self.productos[3].id, 500, Decimal("13.00"))]
+
+        with self.assertRaises(StockInsuficiente) as error:
+            registrar_venta(self.cliente, "Nota", lineas, caja=self.caja)
+
+        self.assertEqual(len(error.exception.faltantes), 1)
+        self.assertFalse(Sale.objects.exists())
+        self.assertFalse(SaleItem.objects.exists())
+        self.assertEqual(Secuencia.objects.get(serie="venta-Nota").ultimo, 0)
+        self.assertEqual(Producto.objects.get(pk=self.productos[0].pk).cantidad, Decimal("100.00"))
+
+    def test_formulario_rechaza_precios_no_finitos_y_tipos_desconocidos(self):
+        self.client.force_login(self.usuario)
+        datos = {
+            'cliente': "Cliente", 'tipo_comprobante': "Nota",
+            'producto_id[]': [self.productos[0].pk], 'cantidad[]': [1],
+        }
+        for cambios in ({'precio[]': ["NaN"]}, {'precio[]': ["Infinity"]},
+                        {'precio[]': ["13.00"], 'tipo_comprobante': "Recibo"}):
+            with self.subTest(**cambios):
+                respuesta = self.client.post(reverse('ventas_nueva'), {**datos, **cambios})
+                self.assertRedirects(respuesta, reverse('ventas_nueva'), fetch_redirect_response=False)
+        self.assertFalse(Sale.objects.exists())
+        with self.assertRaises(VentaInvalida):
+            registrar_venta(self.cliente, "Nota", [(self.productos[0].pk, 1, Decimal("-Infinity"))])
+
+
+class VentasConcurrentesTests(TransactionTestCase):
+    # Varios cajeros venden el mismo producto a la vez, cada uno con su
+    # conexión. En SQLite requiere DB_PERFIL=produccion (base de prueba en
+    # archivo, WAL, busy_timeout y BEGIN IMMEDIATE).
+    CAJEROS = 6
+    VENTAS_POR_CAJERO = 5
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("La base SQLite en memoria no admite escrituras concurrentes; usa DB_PERFIL=produccion")
+
+    def test_ventas_simultaneas_sin_bloqueos_ni_sobreventa(self):
+        usuario = User.objects.create_user("cajero", password="clave")
+        caja = Caja.objects.create(usuario=usuario, monto_inicial=Decimal("0.00"))
+        cliente = Cliente.objects.create(nombre="Cliente")
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        intentos = self.CAJEROS * self.VENTAS_POR_CAJERO
+        stock = intentos - 4
+        producto = Producto.objects.create(nombre="Martillo", categoria=categoria, cantidad=stock, precio_compra=Decimal("10.00"))
+
+        barrera = threading.Barrier(self.CAJEROS)
+        sin_stock = []
+        errores = []
+
+        def cajero():
+            try:
+                barrera.wait()
+                for _ in range(self.VENTAS_POR_CAJERO):
+                    try:
+                        registrar_venta(cliente, "Nota", [(producto.pk, 1, Decimal("13.00"))], caja=caja)
+                    except StockInsuficiente:
+                        sin_stock.append(1)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero) for _ in range(self.CAJEROS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(sin_stock), intentos - stock)
+        self.assertEqual(Producto.objects.get(pk=producto.pk).cantidad, Decimal("0.00"))
+        numeros = sorted(Sale.objects.values_list('numero_venta', flat=True))
+        self.assertEqual(numeros, list(range(1, stock + 1)))
+        self.assertEqual(saldo_caja(caja), Decimal("13.00") * stock)
+        self.assertEqual(totales_periodo(None, None)['ventas'], stock)
+
+
+class LibroCajaTests(TestCase):
+    def test_saldo_con_ediciones_borrados_y_cierre(self):
+        usuario = User.objects.create_user("cajero", password="clave")
+        caja = Caja.objects.create(usuario=usuario, monto_inicial=Decimal("50.00"))
+        cliente = Cliente.objects.create(nombre="Cliente")
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        producto = Producto.objects.create(nombre="Martillo", categoria=categoria, cantidad=10, precio_compra=Decimal("5.00"))
+
+        def venta(precio):
+            venta = Sale.objects.create(cliente=cliente, caja=caja, tipo_comprobante="Nota")
+            item = SaleItem.objects.create(sale=venta, producto=producto, cantidad=1, precio=precio)
+            venta.save()
+            return venta, item
+
+        primera, item = venta(Decimal("100.00"))
+        segunda, _ = venta(Decimal("40.00"))
+        item.precio = Decimal("80.00")
+        item.save()
+        primera.save()
+        segunda.delete()
+        self.assertEqual(saldo_caja(caja), Decimal("80.00"))
+        self.assertEqual(caja.movimientos.count(), 4)
+
+        cerrar_caja(caja, Decimal("130.00"))
+        caja.refresh_from_db()
+        self.assertFalse(caja.abierta)
+        self.assertEqual(caja.total, Decimal("80.00"))
+        self.assertEqual(caja.cortes.get().movimientos, 4)
+
+    def test_saldo_solo_lee_y_los_cortes_no_lo_cambian(self):
+        caja = Caja.objects.create(usuario=User.objects.create_user("cajero"), monto_inicial=Decimal("0.00"))
+        CajaMovimiento.objects.bulk_create([
+            CajaMovimiento(caja=caja, tipo=CajaMovimiento.VENTA, monto=Decimal("2.50")) for _ in range(300)
+        ])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(saldo_caja(caja), Decimal("750.00"))
+        self.assertFalse(caja.cortes.exists())
+
+        crear_corte(caja, hasta=timezone.now())
+        self.assertEqual(caja.cortes.get().movimientos, 300)
+        self.assertEqual(saldo_caja(caja), Decimal("750.00"))
+
+
+class NumeracionTests(TestCase):
+    def test_series_independientes_por_tipo_de_comprobante(self):
+        cliente = Cliente.objects.create(nombre="Cliente")
+        numeros = [
+            Sale.objects.create(cliente=cliente, tipo_comprobante=tipo).numero_venta
+            for tipo in ("Nota", "Boleta", "Nota", "Factura", "Boleta")
+        ]
+        self.assertEqual(numeros, [1, 1, 2, 1, 2])
+
+
+class PreciosCalculadosTests(TestCase):
+    def calculados(self, producto_id):
+        return Producto.objects.filter(pk=producto_id).values_list('precio_venta', 'ganancia', 'margen').get()
+
+    def test_columnas_calculadas_con_escrituras_masivas(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        martillo, alicate = Producto.objects.bulk_create([
+            Producto(nombre="Martillo", categoria=categoria, cantidad=2, precio_compra=Decimal("10.00")),
+            Producto(nombre="Alicate", categoria=categoria, cantidad=1, precio_compra=Decimal("0.00")),
+        ])
+        self.assertEqual(self.calculados(martillo.pk), (Decimal("13.00"), Decimal("6.00"), Decimal("30.00")))
+        self.assertEqual(self.calculados(alicate.pk), (Decimal("0.00"), Decimal("0.00"), Decimal("0.00")))
+
+        Producto.objects.filter(pk=martillo.pk).update(porcentaje_ganancia=Decimal("50.00"))
+        self.assertEqual(self.calculados(martillo.pk), (Decimal("15.00"), Decimal("10.00"), Decimal("50.00")))
+
+        alicate.precio_compra = Decimal("8.00")
+        alicate.porcentaje_ganancia = Decimal("25.00")
+        Producto.objects.bulk_update([alicate], ['precio_compra', 'porcentaje_ganancia'])
+        self.assertEqual(self.calculados(alicate.pk), (Decimal("10.00"), Decimal("2.00"), Decimal("25.00")))
+
+
+class RestaurarRespaldoTests(TestCase):
+    def test_respaldo_latin1_cortado_y_con_modelos_desconocidos(self):
+        dump = (
+            '[{"model": "inventario.producto", "pk": 5, "fields": {"nombre": "Martillo", "marca": "M",'
+            ' "categoria": 7, "cantidad": "2.00", "precio_compra": "10.00", "porcentaje_ganancia": "30.00",'
+            ' "precio_venta": "0.00", "ganancia": "0.00", "viejo": 1}},'
+            '{"model": "inventario.categoria", "pk": 7, "fields": {"nombre": "ACCESORIO DE BA\xd1O"}},'
+            '{"model": "producto", "fields": {}},'
+            '{"model": "inventario.cliente", "pk": 1, "fields": {"nombre": "Cliente", "documento": null}},'
+            '{"model": "inventario.saleitem", "pk": 1, "fields": {"sale": 3, "producto": 5, "cantidad": 1, "precio": "13.00"}},'
+            '{"model": "inventario.sale", "pk": 3, "fields": {"cliente": 1, "tipo_comprobante": "Nota",'
+            ' "fecha": "2025-08-18T21:48:13Z", "numero_venta": 8, "total": "13.00"}},'
+            '{"model": "inventario.categoria", "pk": 8, "fields": {"nom'
+        ).encode('latin-1')
+
+        resultado = restaurar(BytesIO(dump))
+
+        self.assertTrue(resultado.truncado)
+        self.assertEqual(resultado.reparados, 1)
+        self.assertEqual(resultado.omitidos['producto'], 1)
+        self.assertEqual(resultado.campos_ignorados['inventario.producto'], {'viejo'})
+        self.assertEqual(Categoria.objects.get().nombre, "ACCESORIO DE BAÑO")
+        producto = Producto.objects.get()
+        self.assertEqual(producto.precio_venta, Decimal("13.00"))
+        self.assertEqual(producto.ganancia, Decimal("6.00"))
+        venta = Sale.objects.get()
+        self.assertEqual(venta.fecha.year, 2025)
+        self.assertEqual(Secuencia.objects.get(serie="venta-Nota").ultimo, 8)
+        self.assertEqual(VentaDiaria.objects.get().total, Decimal("13.00"))
+
+    def test_limpiar_por_lotes_sin_efectos_de_borrar_fila_por_fila(self):
+        categoria = Categoria.objects.create(nombre="VIEJA")
+        viejo = Producto.objects.create(nombre="Viejo", categoria=categoria, cantidad=5, precio_compra=Decimal("1.00"))
+        registrar_venta(Cliente.objects.create(nombre="Viejo"), "Nota", [(viejo.pk, 1, Decimal("2.00"))])
+        item = {'sale': 3, 'producto': 5, 'cantidad': 1, 'precio': "13.00"}
+        venta = {'cliente': 1, 'tipo_comprobante': "Nota", 'fecha': "2025-08-18T21:48:13Z", 'numero_venta': 8, 'total': "26.00"}
+        dump = json.dumps([
+            {'model': "inventario.saleitem", 'pk': 1, 'fields': item},
+            {'model': "inventario.saleitem", 'pk': 2, 'fields': item},
+            {'model': "inventario.sale", 'pk': 3, 'fields': venta},
+            {'model': "inventario.cliente", 'pk': 1, 'fields': {'nombre': "Cliente"}},
+            {'model': "inventario.producto", 'pk': 5, 'fields': {'nombre': "Martillo", 'categoria': 7, 'cantidad': "2.00"}},
+            {'model': "inventario.categoria", 'pk': 7, 'fields': {'nombre': "HERRAMIENTAS"}},
+        ]).encode()
+
+        resultado = restaurar(BytesIO(dump), limpiar=True, tamano_lote=1)
+
+        self.assertEqual(resultado.restaurados['inventario.saleitem'], 2)
+        self.assertEqual(list(Producto.objects.values_list('nombre', flat=True)), ["Martillo"])
+        self.assertEqual(list(Sale.objects.values_list('numero_venta', flat=True)), [8])
+        self.assertFalse(Eliminacion.objects.exists())
+        self.assertEqual(VentaDiaria.objects.get().total, Decimal("26.00"))
+
+
+class CambiosIncrementalesTests(TestCase):
+    def test_exporta_cambios_y_bajas_y_los_aplica_completos(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        viejo = Producto.objects.create(nombre="Viejo", categoria=categoria, cantidad=1, precio_compra=Decimal("1.00"))
+        desde = timezone.now()
+        martillo = Producto.objects.create(nombre="Martillo", categoria=categoria, cantidad=5, precio_compra=Decimal("10.00"))
+        viejo.delete()
+
+        salida = StringIO()
+        _, registros = exportar_cambios(salida, desde, timezone.now())
+        lineas = salida.getvalue().splitlines()
+        self.assertEqual(registros, 2)
+        self.assertIn('"Martillo"', lineas[1])
+        self.assertIn('"eliminado": true', lineas[2])
+
+        Producto.objects.filter(pk=martillo.pk).update(cantidad=0)
+        with self.assertRaises(CambiosInvalidos):
+            aplicar_cambios(lineas[:-1])  # sin la línea final
+        self.assertEqual(Producto.objects.get(pk=martillo.pk).cantidad, Decimal("0.00"))
+
+        resultado = aplicar_cambios(lineas)
+        self.assertEqual(resultado['guardados']['inventario.producto'], 1)
+        martillo.refresh_from_db()
+        self.assertEqual(martillo.cantidad, Decimal("5.00"))
+        self.assertEqual(martillo.precio_venta, Decimal("13.00"))
+
+
+class ReajusteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        cls.productos = [
+            Producto.objects.create(
+                nombre=f"Producto {i}", categoria=cls.categoria, cantidad=5, precio_compra=Decimal("10.00"),
+            )
+            for i in range(3)
+        ]
+
+    def precios(self, campo='precio_compra'):
+        return list(Producto.objects.order_by('id').values_list(campo, flat=True))
+
+    def test_aplica_y_deshace_sin_pisar_ediciones_posteriores(self):
+        filtro = {'categoria': self.categoria.pk}
+        reajuste = aplicar_reajuste(filtro, Reajuste.PRECIO_COMPRA, Reajuste.PORCENTAJE, Decimal("10"))
+        self.assertEqual(self.precios(), [Decimal("11.00")] * 3)
+        self.assertEqual(Producto.objects.first().precio_venta, Decimal("14.30"))
+
+        editado = Producto.objects.get(pk=self.productos[0].pk)
+        editado.precio_compra = Decimal("20.00")
+        editado.save()
+
+        self.assertEqual(deshacer_reajuste(reajuste), 2)
+        self.assertEqual(self.precios(), [Decimal("20.00"), Decimal("10.00"), Decimal("10.00")])
+        with self.assertRaises(ValueError):
+            deshacer_reajuste(reajuste)
+
+    def test_no_deshace_si_un_reajuste_posterior_toco_los_mismos_productos(self):
+        primero = aplicar_reajuste({'ids': [self.productos[0].pk]}, Reajuste.PRECIO_COMPRA, Reajuste.SUMAR, Decimal("1"))
+        segundo = aplicar_reajuste({'categoria': self.categoria.pk}, Reajuste.PRECIO_COMPRA, Reajuste.SUMAR, Decimal("1"))
+
+        with self.assertRaises(ValueError):
+            deshacer_reajuste(primero)
+        self.assertEqual(self.precios()[0], Decimal("12.00"))
+
+        deshacer_reajuste(segundo)
+        deshacer_reajuste(primero)
+        self.assertEqual(self.precios(), [Decimal("10.00")] * 3)
+
+    def test_rechaza_un_porcentaje_de_ganancia_que_no_cabe_en_la_columna(self):
+        filtro = {'categoria': self.categoria.pk}
+        for operacion, valor in ((Reajuste.PORCENTAJE, Decimal("5000")), (Reajuste.FIJAR, Decimal("1000"))):
+            with self.subTest(operacion=operacion), self.assertRaises(ValueError):
+                aplicar_reajuste(filtro, Reajuste.PORCENTAJE_GANANCIA, operacion, valor)
+        self.assertEqual(self.precios('porcentaje_ganancia'), [Decimal("30.00")] * 3)
+        self.assertFalse(Reajuste.objects.exists())
+
+        aplicar_reajuste(filtro, Reajuste.PORCENTAJE_GANANCIA, Reajuste.FIJAR, Decimal("999.99"))
+        self.assertEqual(Producto.objects.first().precio_venta, Decimal("110.00"))
+
+
+def libro_excel(hojas):
+    # Excel de importación: {categoría: [[nombre, marca, cantidad, UM, precio], ...]}
+    archivo = escribir_xlsx(hojas.items(), COLUMNAS_INVENTARIO[:5])
+    with archivo:
+        libro = BytesIO(archivo.read())
+    libro.name = "inventario.xlsx"
+    return libro
+
+
+class SincronizacionTests(TestCase):
+    def test_solo_escribe_cambios_y_desactiva_faltantes(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        datos = {'categoria': categoria, 'cantidad': 3, 'unidad_medida': "UND"}
+        martillo = Producto.objects.create(nombre="Martillo", marca="M", precio_compra=Decimal("10.00"), **datos)
+        alicate = Producto.objects.create(nombre="Alicate", marca="A", precio_compra=Decimal("5.00"), **datos)
+        serrucho = Producto.objects.create(nombre="Serrucho", marca="S", precio_compra=Decimal("7.00"), **datos)
+        antes = martillo.actualizado
+
+        resultado = sincronizar_workbook(libro_excel({"HERRAMIENTAS": [
+            ["martillo ", "m", 3, "UND", "10.00"],  # misma clave y mismos datos
+            ["Alicate", "A", 3, "UND", "6.50"],
+            ["Taladro", "T", 1, "UND", "120.00"],
+        ]}), desactivar=True)
+
+        self.assertEqual(
+            (resultado.sin_cambios, resultado.actualizados, resultado.altas, resultado.desactivados), (1, 1, 1, 1)
+        )
+        martillo.refresh_from_db()
+        self.assertEqual(martillo.actualizado, antes)
+        alicate.refresh_from_db()
+        self.assertEqual((alicate.precio_compra, alicate.precio_venta), (Decimal("6.50"), Decimal("8.45")))
+        serrucho.refresh_from_db()
+        self.assertFalse(serrucho.activo)
+        self.assertTrue(Producto.objects.filter(nombre="Taladro", categoria=categoria, activo=True).exists())
+
+
+    def test_avisa_solo_de_los_productos_que_cambiaron(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        datos = {'categoria': categoria, 'cantidad': 3, 'unidad_medida': "UND"}
+        Producto.objects.create(nombre="Martillo", marca="M", precio_compra=Decimal("10.00"), **datos)
+        alicate = Producto.objects.create(nombre="Alicate", marca="A", precio_compra=Decimal("5.00"), **datos)
+        serrucho = Producto.objects.create(nombre="Serrucho", marca="S", precio_compra=Decimal("7.00"), **datos)
+        avisos = []
+
+        def recibir(sender, ids=None, **kwargs):
+            avisos.append(ids)
+
+        productos_modificados.connect(recibir)
+        self.addCleanup(productos_modificados.disconnect, recibir)
+        with self.captureOnCommitCallbacks(execute=True):
+            sincronizar_workbook(libro_excel({"HERRAMIENTAS": [
+                ["Martillo", "M", 3, "UND", "10.00"],
+                ["Alicate", "A", 3, "UND", "6.50"],
+                ["Taladro", "T", 1, "UND", "120.00"],
+            ]}), desactivar=True)
+        taladro = Producto.objects.get(nombre="Taladro")
+        self.assertEqual(len(avisos), 1)
+        self.assertEqual(set(avisos[0]), {alicate.pk, serrucho.pk, taladro.pk})
+
+        avisos.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            sincronizar_workbook(libro_excel({"HERRAMIENTAS": [
+                ["Martillo", "M", 3, "UND", "10.00"],
+                ["Alicate", "A", 3, "UND", "6.50"],
+                ["Taladro", "T", 1, "UND", "120.00"],
+            ]}), desactivar=True)
+        self.assertEqual(avisos, [])
+
+
+class TrabajoImportacionTests(TestCase):
+    def test_dos_consultas_de_un_trabajo_caido_lo_reanudan_una_vez(self):
+        usuario = User.objects.create_user("cajero", password="clave")
+        self.client.force_login(usuario)
+        trabajo = crear_trabajo(libro_excel({"HERRAMIENTAS": [["Martillo", "M", 3, "UND", 10]]}), usuario)
+        TrabajoImportacion.objects.filter(pk=trabajo.pk).update(
+            estado=TrabajoImportacion.PROCESANDO,
+            actualizado=timezone.now() - timedelta(seconds=TIEMPO_TRABAJO_CAIDO + 1),
+        )
+
+        # El hilo lanzado aún no avanza: la segunda consulta no debe lanzar otro
+        with mock.patch('inventario.views.lanzar_trabajo') as lanzar:
+            for _ in range(2):
+                respuesta = self.client.get(reverse('importar_estado', args=[trabajo.pk]))
+                self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(lanzar.call_count, 1)
+
+    def test_por_pasos_lee_cada_hoja_una_sola_vez(self):
+        filas = [[f"Producto {n}", "M", n, "UND", 10 + n] for n in range(5)]
+        trabajo = crear_trabajo(libro_excel({"HERRAMIENTAS": filas, "PINTURAS": filas}))
+
+        with mock.patch.object(
+            ReadOnlyWorksheet, 'iter_rows', autospec=True, side_effect=ReadOnlyWorksheet.iter_rows,
+        ) as iter_rows:
+            ejecutar_trabajo(trabajo.pk, max_filas=2)
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoImportacion.COMPLETADO)
+        self.assertEqual(trabajo.altas, 10)
+        self.assertEqual(Producto.objects.filter(categoria__nombre="PINTURAS").count(), 5)
+        self.assertEqual(iter_rows.call_count, 2)
+
+
+    def test_avisa_una_sola_vez_al_terminar_con_los_productos_tocados(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        datos = {'categoria': categoria, 'cantidad': 3, 'unidad_medida': "UND"}
+        igual = Producto.objects.create(nombre="Producto 0", marca="M", precio_compra=Decimal("10.00"), **datos)
+        cambiado = Producto.objects.create(nombre="Producto 1", marca="M", precio_compra=Decimal("1.00"), **datos)
+        filas = [[f"Producto {n}", "M", 3, "UND", 10 + n] for n in range(5)]
+        avisos = []
+
+        def recibir(sender, ids=None, **kwargs):
+            avisos.append(ids)
+
+        productos_modificados.connect(recibir)
+        self.addCleanup(productos_modificados.disconnect, recibir)
+        trabajo = crear_trabajo(libro_excel({"HERRAMIENTAS": filas, "PINTURAS": filas[:2]}))
+        with self.captureOnCommitCallbacks(execute=True):
+            ejecutar_trabajo(trabajo.pk, max_filas=2)
+
+        tocados = set(Producto.objects.exclude(pk=igual.pk).values_list('id', flat=True))
+        self.assertIn(cambiado.pk, tocados)
+        self.assertEqual(len(avisos), 1)
+        self.assertEqual(set(avisos[0]), tocados)
+
+        avisos.clear()
+        trabajo = crear_trabajo(libro_excel({"HERRAMIENTAS": filas}), modo=TrabajoImportacion.REEMPLAZAR)
+        with self.captureOnCommitCallbacks(execute=True):
+            ejecutar_trabajo(trabajo.pk, max_filas=2)
+        self.assertEqual(avisos, [None])
+
+
+    def test_reemplazar_por_lotes_guarda_el_precio_como_precio_de_compra(self):
+        filas = [
+            ["Martillo", "M", 3, "UND", 10],
+            ["Alicate", "A", 2, "UND", "S/ 8.50"],
+            ["Taladro", "T", 1, "UND", "1,250.00"],
+        ]
+        trabajo = crear_trabajo(libro_excel({"HERRAMIENTAS": filas}), modo=TrabajoImportacion.REEMPLAZAR)
+        ejecutar_trabajo(trabajo.pk, max_filas=2)
+
+        precios = {
+            p.nombre: (p.precio_compra, p.precio_venta, p.total_inversion)
+            for p in Producto.objects.all()
+        }
+        self.assertEqual(precios, {
+            "Martillo": (Decimal("10.00"), Decimal("13.00"), Decimal("30.00")),
+            "Alicate": (Decimal("8.50"), Decimal("11.05"), Decimal("17.00")),
+            "Taladro": (Decimal("1250.00"), Decimal("1625.00"), Decimal("1250.00")),
+        })
+
+
+class ExportacionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cajero", password="clave")
+        for nombre in ("HERRAMIENTAS", "ACCESORIO DE BAÑO"):
+            categoria = Categoria.objects.create(nombre=nombre)
+            Producto.objects.create(nombre="Martillo", marca="M", categoria=categoria, cantidad=3, precio_compra=Decimal("10.00"))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def test_inventario_xlsx_se_puede_volver_a_importar(self):
+        respuesta = self.client.get(reverse('exportar_inventario'))
+        libro = abrir_workbook(BytesIO(b"".join(respuesta.streaming_content)))
+
+        self.assertEqual([nombre_categoria(hoja) for hoja in libro.worksheets], ["ACCESORIO DE BAÑO", "HERRAMIENTAS"])
+        fila = next(libro.worksheets[1].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(leer_fila(fila)['precio_compra'], Decimal("10"))
+
+    def test_items_csv_del_rango(self):
+        cliente = Cliente.objects.create(nombre="Cliente")
+        registrar_venta(cliente, "Nota", [(Producto.objects.first().pk, 2, Decimal("13.00"))])
+        hoy = timezone.localdate().isoformat()
+
+        respuesta = self.client.get(reverse('exportar_ventas'), {
+            'formato': 'csv', 'detalle': 'items', 'fecha_inicio': hoy, 'fecha_fin': hoy,
+        })
+        lineas = b"".join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(len(lineas), 2)
+        self.assertTrue(lineas[1].endswith(",2,13.00,26.00"))
+
+
+class HistorialCajaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user("ana", password="clave")
+        cls.beto = User.objects.create_user("beto", password="clave")
+        cls.cliente = Cliente.objects.create(nombre="Cliente")
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        cls.martillo = Producto.objects.create(
+            nombre="Martillo", categoria=categoria, cantidad=1000, precio_compra=Decimal("10.00"),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.ana)
+
+    def caja(self, usuario, ventas=(), **datos):
+        caja = Caja.objects.create(usuario=usuario, monto_inicial=Decimal("50.00"), **datos)
+        for cantidad in ventas:
+            registrar_venta(self.cliente, "Nota", [(self.martillo.pk, cantidad, Decimal("13.00"))], caja=caja)
+        return caja
+
+    def pedir(self, **parametros):
+        return self.client.get(reverse('historial_cajas'), parametros)
+
+    def test_totales_coinciden_con_las_ventas(self):
+        cerrada = self.caja(self.ana, ventas=(1, 2), abierta=False, monto_cierre=Decimal("80.00"))
+        abierta = self.caja(self.beto, ventas=(3,))
+        self.caja(self.beto)
+
+        filas = {caja.pk: caja for caja in self.pedir().context['pagina']}
+        self.assertEqual(len(filas), 3)
+        for caja in filas.values():
+            with self.subTest(caja=caja.pk):
+                reales = Sale.objects.filter(caja=caja).aggregate(n=Count('id'), t=Sum('total'))
+                self.assertEqual(caja.num_ventas, reales['n'])
+                self.assertEqual(caja.total_ventas, reales['t'] or Decimal("0.00"))
+                self.assertEqual(caja.esperado, caja.monto_inicial + caja.total_ventas)
+
+        self.assertEqual((filas[cerrada.pk].total_ventas, filas[cerrada.pk].esperado), (Decimal("39.00"), Decimal("89.00")))
+        self.assertEqual(filas[cerrada.pk].diferencia, Decimal("-9.00"))
+        self.assertIsNone(filas[abierta.pk].diferencia)
+
+    def test_filtra_por_usuario_y_fecha(self):
+        propia = self.caja(self.ana)
+        antigua = self.caja(self.beto)
+        Caja.objects.filter(pk=antigua.pk).update(fecha_apertura=timezone.now() - timedelta(days=10))
+        reciente = self.caja(self.beto)
+
+        self.assertEqual([c.pk for c in self.pedir(usuario=self.ana.pk).context['pagina']], [propia.pk])
+        hoy = timezone.localdate().isoformat()
+        self.assertEqual(
+            [c.pk for c in self.pedir(usuario=self.beto.pk, desde=hoy, hasta=hoy).context['pagina']], [reciente.pk]
+        )
+
+    def test_pagina_de_a_30_sin_consultas_por_caja(self):
+        for _ in range(35):
+            self.caja(self.ana, ventas=(1,))
+
+        # sesión, usuario, conteo, cajas con sus totales y usuarios del filtro
+        with self.assertNumQueries(5):
+            primera = self.pedir()
+        self.assertEqual(len(primera.context['pagina']), 30)
+        self.assertContains(primera, "Página 1 de 2")
+        segunda = self.pedir(usuario=self.ana.pk, page=2)
+        self.assertEqual(len(segunda.context['pagina']), 5)
+        self.assertContains(segunda, f"?usuario={self.ana.pk}&page=1")
+
+
+class ListadoVentasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cajero", password="clave")
+        cls.cliente = Cliente.objects.create(nombre="Cliente")
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def ventas(self, n, fecha):
+        inicio = Sale.objects.count()
+        creadas = Sale.objects.bulk_create([
+            Sale(cliente=self.cliente, tipo_comprobante="Nota", numero_venta=inicio + i + 1) for i in range(n)
+        ])
+        ids = [venta.pk for venta in creadas]
+        Sale.objects.filter(pk__in=ids).update(fecha=fecha)  # fecha es auto_now_add
+        return ids
+
+    def test_paginas_con_la_misma_fecha_no_repiten_ni_saltan_ventas(self):
+        ids = self.ventas(VENTAS_POR_PAGINA * 2 + 5, timezone.now())
+
+        vistos, paginas, despues = [], 0, None
+        while True:
+            datos = self.client.get(reverse('ventas_api'), {'despues': despues} if despues else {}).json()
+            vistos += [venta['id'] for venta in datos['ventas']]
+            paginas += 1
+            despues = datos['siguiente']
+            if not despues:
+                break
+        self.assertEqual(paginas, 3)
+        self.assertEqual(vistos, sorted(ids, reverse=True))
+
+    def test_cursor_desbordado_devuelve_la_primera_pagina(self):
+        ids = self.ventas(3, timezone.now())
+        for despues in (f"{10 ** 18}-1", f"{10 ** 30}-1", "-1-1"):
+            with self.subTest(despues=despues):
+                respuesta = self.client.get(reverse('ventas_api'), {'despues': despues})
+                self.assertEqual(respuesta.status_code, 200)
+                self.assertEqual([venta['id'] for venta in respuesta.json()['ventas']], sorted(ids, reverse=True))
+
+    def test_fecha_fin_incluye_las_ventas_hasta_el_final_del_dia(self):
+        dia = date(2025, 3, 14)
+        noche = timezone.make_aware(datetime.combine(dia, time(23, 59, 30)))
+        dentro = self.ventas(1, noche)
+        self.ventas(1, noche + timedelta(minutes=1))  # ya es el día siguiente
+
+        datos = self.client.get(reverse('ventas_api'), {
+            'fecha_inicio': dia.isoformat(), 'fecha_fin': dia.isoformat(),
+        }).json()
+        self.assertEqual([venta['id'] for venta in datos['ventas']], dentro)
+
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        metricas.reiniciar()
+
+    def test_detecta_consultas_repetidas(self):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+
+        def vista_n_mas_1(request):
+            for _ in range(12):
+                Categoria.objects.get(pk=categoria.pk)
+            Producto.objects.filter(pk__in=[1, 2]).count()
+            Producto.objects.filter(pk__in=[1, 2, 3]).count()
+            return HttpResponse()
+
+        with self.assertLogs('inventario.metricas', level='WARNING'):
+            MetricasMiddleware(vista_n_mas_1)(RequestFactory().get('/'))
+
+        texto = metricas.texto()
+        self.assertIn('ferreteria_n_mas_1_total{vista="sin_ruta"} 1', texto)
+        self.assertIn('ferreteria_peticion_consultas_bucket{vista="sin_ruta",le="10"} 0', texto)
+        self.assertIn('ferreteria_peticion_consultas_count{vista="sin_ruta"} 1', texto)
+
+    def test_endpoint_por_vista_solo_para_staff(self):
+        usuario = User.objects.create_user("cajero", password="clave")
+        self.client.force_login(usuario)
+        self.client.get(reverse('listar_ventas'))
+        self.assertEqual(self.client.get(reverse('metricas')).status_code, 403)
+
+        usuario.is_staff = True
+        usuario.save()
+        respuesta = self.client.get(reverse('metricas'))
+        self.assertContains(respuesta, 'ferreteria_peticion_segundos_count{vista="listar_ventas"} 1')
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+
+class RendimientoTests(TestCase):
+    def test_genera_datos_y_mide_escenarios(self):
+        usuario = generar_datos(categorias=3, productos=30, ventas=40, cajas_cerradas=2)
+        self.assertEqual(Sale.objects.count(), 40)
+        self.assertEqual(Caja.objects.filter(abierta=True).count(), 1)
+        self.assertEqual(VentaDiaria.objects.aggregate(n=Sum('ventas'))['n'], 40)
+
+        with self.settings(IMPORTACION_EN_HILO=False):
+            resultados = ejecutar(usuario, repeticiones=2, solo=['nota_venta', 'importar_excel'])
+        self.assertEqual(set(resultados), {'nota_venta', 'importar_excel'})
+        self.assertEqual(Sale.objects.count(), 40)
+
+        base = {'nota_venta': {**resultados['nota_venta'], 'consultas': 1}}
+        self.assertEqual(len(comparar(resultados, base)), 1)
+
+
+class ResumenInventarioTests(TestCase):
+    def setUp(self):
+        self.herramientas = Categoria.objects.create(nombre="HERRAMIENTAS")
+        self.pinturas = Categoria.objects.create(nombre="PINTURAS")
+
+    def crear(self, nombre, categoria, cantidad, precio_compra, **datos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Producto.objects.create(
+                nombre=nombre, categoria=categoria, cantidad=cantidad, precio_compra=Decimal(precio_compra), **datos
+            )
+
+    def assertResumenFresco(self):
+        # El resumen debe coincidir con una agregación directa de los productos activos
+        for categoria in Categoria.objects.all():
+            with self.subTest(categoria=categoria.nombre):
+                fresco = Producto.objects.filter(categoria=categoria, activo=True).aggregate(
+                    productos=Count('id'), unidades=Sum('cantidad'),
+                    total_inversion=Sum('total_inversion'), ganancia=Sum('ganancia'),
+                )
+                resumen = ResumenCategoria.objects.get(categoria=categoria)
+                self.assertEqual(
+                    (resumen.productos, resumen.unidades, resumen.total_inversion, resumen.ganancia),
+                    tuple(fresco[campo] or 0 for campo in ('productos', 'unidades', 'total_inversion', 'ganancia')),
+                )
+
+    def test_sigue_altas_ediciones_cambios_de_categoria_y_bajas(self):
+        martillo = self.crear("Martillo", self.herramientas, 3, "10.00")
+        self.crear("Brocha", self.pinturas, 5, "4.00")
+        self.crear("Alicate viejo", self.herramientas, 7, "9.00", activo=False)
+        self.assertResumenFresco()
+        self.assertEqual(ResumenCategoria.objects.get(categoria=self.herramientas).total_inversion, Decimal("30.00"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            martillo.cantidad = 4
+            martillo.save()
+        self.assertResumenFresco()
+
+        # Leído de la base: _categoria_original permite actualizar ambas categorías
+        movido = Producto.objects.get(pk=martillo.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            movido.categoria = self.pinturas
+            movido.save()
+        self.assertResumenFresco()
+        self.assertEqual(ResumenCategoria.objects.get(categoria=self.herramientas).productos, 0)
+        self.assertEqual(ResumenCategoria.objects.get(categoria=self.pinturas).productos, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            movido.delete()
+        self.assertResumenFresco()
+
+    def test_lista_productos_muestra_el_total_agregado(self):
+        self.crear("Martillo", self.herramientas, 3, "10.00")
+        self.crear("Brocha", self.pinturas, 5, "4.50")
+        self.crear("Alicate viejo", self.herramientas, 7, "9.00", activo=False)
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+
+        respuesta = self.client.get(reverse('lista_productos'))
+        fresco = Producto.objects.filter(activo=True).aggregate(t=Sum('total_inversion'))['t']
+        self.assertEqual(respuesta.context['valor_total_inventario'], fresco)
+        self.assertContains(respuesta, "S/ 52,50")
+
+    def test_comando_reconstruye_el_resumen(self):
+        self.crear("Martillo", self.herramientas, 3, "10.00")
+        self.crear("Brocha", self.pinturas, 5, "4.00")
+        ResumenCategoria.objects.all().delete()
+        Producto.objects.filter(nombre="Brocha").update(cantidad=6)
+
+        salida = StringIO()
+        call_command('reconstruir_resumen', stdout=salida)
+        self.assertResumenFresco()
+        self.assertIn("2 productos", salida.getvalue())
+
+
+class TablaCategoriaCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        metricas.reiniciar()
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.herramientas = Categoria.objects.create(nombre="HERRAMIENTAS")
+            self.pinturas = Categoria.objects.create(nombre="PINTURAS")
+            self.martillo = Producto.objects.create(
+                nombre="Martillo", marca="M", categoria=self.herramientas, cantidad=3, precio_compra=Decimal("10.00")
+            )
+            Producto.objects.create(nombre="Brocha", marca="B", categoria=self.pinturas, cantidad=5, precio_compra=Decimal("4.00"))
+
+    def pedir(self, categoria):
+        return self.client.get(reverse('productos_categoria', args=[categoria.id]))
+
+    def test_editar_un_producto_solo_renderiza_su_categoria(self):
+        self.pedir(self.herramientas)
+        self.pedir(self.pinturas)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.martillo.precio_compra = Decimal("20.00")
+            self.martillo.save()
+
+        self.assertContains(self.pedir(self.herramientas), "S/ 20,00")
+        self.pedir(self.pinturas)
+        self.assertEqual(metricas.cache[('tabla_categoria', 'fallo')], 3)
+        self.assertEqual(metricas.cache[('tabla_categoria', 'acierto')], 1)
+
+    def test_primera_pestana_usa_la_misma_cache(self):
+        self.pedir(self.herramientas)
+        respuesta = self.client.get(reverse('lista_productos'))
+        self.assertContains(respuesta, "<td>Martillo</td>", html=False)
+        self.assertEqual(metricas.cache[('tabla_categoria', 'acierto')], 1)
+
+
+class CargaPorCategoriaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.herramientas = Categoria.objects.create(nombre="HERRAMIENTAS")
+            self.pinturas = Categoria.objects.create(nombre="PINTURAS")
+            datos = {'cantidad': 3, 'precio_compra': Decimal("10.00")}
+            Producto.objects.create(nombre="Martillo", categoria=self.herramientas, **datos)
+            Producto.objects.create(nombre="Serrucho", categoria=self.herramientas, activo=False, **datos)
+            Producto.objects.create(nombre="Brocha", categoria=self.pinturas, **datos)
+
+    def test_pagina_inicial_solo_renderiza_la_primera_categoria(self):
+        respuesta = self.client.get(reverse('lista_productos'))
+        self.assertContains(respuesta, "<td>Martillo</td>", html=False)
+        self.assertNotContains(respuesta, "<td>Brocha</td>", html=False)
+        self.assertNotContains(respuesta, "Serrucho")
+        self.assertContains(respuesta, "PINTURAS")
+        self.assertContains(respuesta, f'data-url="{reverse("productos_categoria", args=[self.pinturas.id])}"')
+        self.assertContains(respuesta, "Cargando productos...", count=1)
+
+    def test_fragmento_de_la_categoria_pedida(self):
+        respuesta = self.client.get(reverse('productos_categoria', args=[self.pinturas.id]))
+        self.assertContains(respuesta, "<td>Brocha</td>", html=False)
+        self.assertNotContains(respuesta, "Martillo")
+        self.assertNotContains(respuesta, "<html")
+
+        for i in range(60):
+            Producto.objects.create(nombre=f"Pintura {i:02d}", categoria=self.pinturas, cantidad=1)
+        cache.clear()
+        segunda = self.client.get(reverse('productos_categoria', args=[self.pinturas.id]), {'page': 2})
+        self.assertContains(segunda, "Mostrando 51-61 de 61 productos.")
+
+        self.assertEqual(self.client.get(reverse('productos_categoria', args=[999999])).status_code, 404)
+
+
+class NotaVentaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        productos = [
+            Producto.objects.create(nombre=nombre, categoria=categoria, cantidad=10, precio_compra=Decimal("10.00"))
+            for nombre in ("Martillo", "Alicate")
+        ]
+        cliente = Cliente.objects.create(nombre="Cliente")
+        cls.venta = registrar_venta(cliente, "Nota", [(p.pk, 1, Decimal("13.00")) for p in productos])
+
+    def setUp(self):
+        cache.clear()
+
+    def test_responde_304_con_if_none_match_y_con_if_modified_since(self):
+        url = reverse('nota_venta', args=[self.venta.pk])
+        primera = self.client.get(url)
+        self.assertEqual(primera.status_code, 200)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=primera['Last-Modified']).status_code, 304)
+
+    def test_borrar_un_item_cambia_el_etag(self):
+        url = reverse('nota_venta', args=[self.venta.pk])
+        antes = self.client.get(url)['ETag']
+
+        self.venta.items.get(producto__nombre="Martillo").delete()
+        despues = self.client.get(url, HTTP_IF_NONE_MATCH=antes)
+        self.assertNotEqual(despues['ETag'], antes)
+        self.assertNotContains(despues, "Martillo")
+        self.assertContains(despues, "Alicate")
+
+
+class VersionCatalogoTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.martillo = Producto.objects.create(
+                nombre="Martillo", categoria=categoria, cantidad=3, precio_compra=Decimal("10.00"),
+            )
+
+    def test_avanza_al_guardar_y_al_borrar_productos(self):
+        inicial = version_catalogo()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.martillo.precio_compra = Decimal("20.00")
+            self.martillo.save()
+        guardado = version_catalogo()
+        self.assertGreater(guardado, inicial)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.martillo.delete()
+        self.assertGreater(version_catalogo(), guardado)
+
+    def test_catalogo_sin_cambios_responde_304(self):
+        url = f"{reverse('productos_api')}?ids={self.martillo.pk}"
+        primera = self.client.get(url)
+        self.assertEqual(primera.json()['productos'][0]['precio'], "13.00")
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag']).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.filter(pk=self.martillo.pk).update(precio_compra=Decimal("20.00"))
+            notificar_productos([self.martillo.pk])
+        cambiada = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(cambiada.status_code, 200)
+        self.assertEqual(cambiada.json()['productos'][0]['precio'], "26.00")
+
+
+class CatalogoApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        self.martillo = Producto.objects.create(nombre="Martillo", marca="M", categoria=categoria, cantidad=3, precio_compra=Decimal("10.00"))
+        self.alicate = Producto.objects.create(nombre="Alicate", marca="A", categoria=categoria, cantidad=2, precio_compra=Decimal("8.00"))
+
+    def pedir(self, **parametros):
+        respuesta = self.client.get(reverse('catalogo_api'), parametros, HTTP_ACCEPT_ENCODING='gzip')
+        if respuesta.get('Content-Encoding') == 'gzip':  # no se comprimen respuestas muy cortas
+            return respuesta, json.loads(gzip.decompress(respuesta.content))
+        return respuesta, respuesta.json()
+
+    def test_completo_y_luego_solo_cambios(self):
+        # Suficientes filas para que la respuesta valga la pena comprimirla
+        for i in range(30):
+            Producto.objects.create(nombre=f"Clavo {i}", marca="C", categoria=self.martillo.categoria, cantidad=1)
+        respuesta, completo = self.pedir()
+        self.assertEqual(respuesta['Content-Encoding'], 'gzip')
+        self.assertTrue(completo['completo'])
+        self.assertEqual([fila[1] for fila in completo['productos'][:2]], ["Martillo", "Alicate"])
+        self.assertEqual(len(completo['productos']), 32)
+        self.assertEqual(
+            self.client.get(reverse('catalogo_api'), HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304
+        )
+
+        desde = timezone.now()
+        self.martillo.precio_compra = Decimal("20.00")
+        self.martillo.save()
+        alicate_id = self.alicate.id
+        self.alicate.delete()
+
+        _, cambios = self.pedir(desde=desde.isoformat())
+        self.assertFalse(cambios['completo'])
+        self.assertEqual(cambios['productos'], [[self.martillo.id, "Martillo", "M", "HERRAMIENTAS", "26.00", "3.00"]])
+        self.assertEqual(cambios['eliminados'], [alicate_id])
+
+    def test_importacion_fuerza_catalogo_completo(self):
+        desde = timezone.now()
+        with self.captureOnCommitCallbacks(execute=True):
+            notificar_productos(None)
+        _, datos = self.pedir(desde=desde.isoformat())
+        self.assertTrue(datos['completo'])
+
+
+class BusquedaTests(TestCase):
+    def setUp(self):
+        herramientas = Categoria.objects.create(nombre="HERRAMIENTAS")
+        self.gasfiteria = Categoria.objects.create(nombre="GASFITERÍA")
+        datos = {'cantidad': 3, 'precio_compra': Decimal("10.00")}
+        self.martillo = Producto.objects.create(nombre="Martillo de uña", marca="Stanley", categoria=herramientas, **datos)
+        self.caneria = Producto.objects.create(nombre="Cañería PVC", marca="Pavco", categoria=self.gasfiteria, **datos)
+        self.inactivo = Producto.objects.create(
+            nombre="Martillo viejo", marca="Stanley", categoria=herramientas, activo=False, **datos
+        )
+        self.indice = IndiceProductos()
+        self.indice.construir()
+
+    def nombres(self, consulta, **kwargs):
+        return [fila['nombre'] for fila in self.indice.buscar(consulta, **kwargs)]
+
+    def test_prefijos_sin_tildes_ni_mayusculas(self):
+        self.assertEqual(self.nombres("MART stan"), ["Martillo de uña"])
+        self.assertEqual(self.nombres("una"), ["Martillo de uña"])
+        self.assertEqual(self.nombres("cañe"), ["Cañería PVC"])
+        self.assertEqual(self.nombres("caneria gasfit"), ["Cañería PVC"])
+        self.assertEqual(self.nombres("martillo pavco"), [])
+
+    def test_productos_inactivos_no_aparecen(self):
+        self.assertNotIn("Martillo viejo", self.nombres("martillo"))
+
+        Producto.objects.filter(pk=self.martillo.pk).update(activo=False)
+        self.indice.actualizar([self.martillo.pk])
+        self.assertEqual(self.nombres("martillo"), [])
+
+    def test_actualizar_no_reconstruye_el_indice(self):
+        Producto.objects.filter(pk=self.martillo.pk).update(nombre="Comba")
+        with mock.patch.object(self.indice, 'construir') as construir, self.assertNumQueries(1):
+            self.indice.actualizar([self.martillo.pk])
+            self.assertEqual(self.nombres("comba"), ["Comba"])
+            self.assertEqual(self.nombres("martillo"), [])
+            self.assertEqual(self.nombres("stanley"), ["Comba"])
+
+        caneria_id = self.caneria.pk
+        self.caneria.delete()
+        with self.assertNumQueries(1):
+            self.indice.actualizar([caneria_id])
+        self.assertEqual(self.nombres("caneria"), [])
+        self.assertFalse(construir.called)
+
+    def test_api_respeta_el_limite_y_la_consulta_vacia(self):
+        self.client.force_login(User.objects.create_user("cajero", password="clave"))
+        for i in range(LIMITE_RESULTADOS + 5):
+            Producto.objects.create(nombre=f"Tornillo {i}", categoria=self.gasfiteria, cantidad=1)
+        indice.invalidar()
+        url = reverse('buscar_productos_api')
+
+        self.assertEqual(len(self.client.get(url, {'q': "torn"}).json()['resultados']), LIMITE_RESULTADOS)
+        self.assertEqual(len(self.client.get(url, {'q': "torn", 'limite': 3}).json()['resultados']), 3)
+        self.assertEqual(len(self.client.get(url, {'q': "torn", 'limite': "x"}).json()['resultados']), LIMITE_RESULTADOS)
+        self.assertEqual(self.client.get(url, {'q': "  "}).json(), {'resultados': []})
+
+
+class VentasLoteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("cajero", password="clave")
+        Caja.objects.create(usuario=cls.usuario, monto_inicial=Decimal("100.00"))
+        categoria = Categoria.objects.create(nombre="HERRAMIENTAS")
+        cls.martillo = Producto.objects.create(nombre="Martillo", marca="M", categoria=categoria, cantidad=5, precio_compra=Decimal("10.00"))
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def enviar(self, *ventas):
+        return self.client.post(reverse('ventas_lote_api'), json.dumps({'ventas': ventas}), content_type='application/json').json()
+
+    def venta(self, clave, cantidad):
+        return {
+            'clave': clave, 'cliente': "Cliente", 'tipo_comprobante': "Nota",
+            'lineas': [{'id': self.martillo.id, 'cantidad': cantidad, 'precio': "13.00"}],
+        }
+
+    def test_reenviar_el_lote_no_repite_ventas(self):
+        lote = [self.venta("a", 2), self.venta("b", 10), self.venta("c", 1)]
+        primero = self.enviar(*lote)['resultados']
+        self.assertEqual([r['estado'] for r in primero], ["registrada", "rechazada", "registrada"])
+        self.assertIn("Stock insuficiente", primero[1]['error'])
+
+        segundo = self.enviar(*lote)['resultados']
+        self.assertTrue(all(r['repetido'] for r in segundo))
+        self.assertEqual([r.get('venta') for r in segundo], [r.get('venta') for r in primero])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(Producto.objects.get(pk=self.martillo.pk).cantidad, 2)
+
+    def test_clave_con_otros_datos(self):
+        self.enviar(self.venta("a", 1))
+        resultado = self.enviar(self.venta("a", 2))['resultados'][0]
+        self.assertEqual(resultado['estado'], "error")
+        self.assertEqual(Sale.objects.count(), 1)
+
+    def test_formulario_enviado_dos_veces(self):
+        datos = {
+            'clave': "x1", 'cliente': "Cliente", 'tipo_comprobante': "Nota",
+            'producto_id[]': [self.martillo.id], 'cantidad[]': [1], 'precio[]': ["13.00"],
+        }
+        primera = self.client.post(reverse('ventas_nueva'), datos)
+        segunda = self.client.post(reverse('ventas_nueva'), datos)
+        self.assertEqual(primera['Location'], segunda['Location'])
+        self.assertEqual(Sale.objects.count(), 1)
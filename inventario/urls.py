@@ -12,10 +12,17 @@ urlpatterns = [
     # Inventario    
     # -----------------------------
     path('productos/', views.lista_productos, name='lista_productos'),
+    path('productos/categoria/<int:categoria_id>/', views.productos_categoria, name='productos_categoria'),
     path('productos/agregar/', views.agregar_producto, name='agregar_producto'),
     path('productos/editar/<int:producto_id>/', views.editar_producto, name='editar_producto'),
     path('productos/eliminar/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/reajustar/', views.reajustar_precios, name='reajustar_precios'),
+    path('productos/reajustar/<int:reajuste_id>/deshacer/', views.deshacer_reajuste_view, name='deshacer_reajuste'),
+    path('productos/exportar/', views.descargar_inventario, name='exportar_inventario'),
     path('importar/', views.importar_excel, name='importar_excel'),
+    path('importar/estado/<int:trabajo_id>/', views.importar_estado, name='importar_estado'),
+    path('importar/resultado/<int:trabajo_id>/', views.importar_resultado, name='importar_resultado'),
+    path('importar/aplicar/<int:trabajo_id>/', views.importar_aplicar, name='importar_aplicar'),
 
     # -----------------------------
     # Ventas
@@ -24,6 +31,8 @@ urlpatterns = [
     path('ventas/nueva/', ventas_views.registrar_venta, name='ventas_nueva'),
     path('ventas/smartclick/<int:sale_id>/', ventas_views.smartclick_redirect, name='smartclick_redirect'),
     path('ventas/nota/<int:sale_id>/', ventas_views.nota_venta, name='nota_venta'),
+    path('ventas/notas/<str:fecha>/', ventas_views.notas_del_dia, name='notas_del_dia'),
+    path('ventas/exportar/', ventas_views.descargar_ventas, name='exportar_ventas'),
 
     # -----------------------------
     # Caja
@@ -37,6 +46,13 @@ urlpatterns = [
     # API
     # -----------------------------
     path('api/producto/<int:pk>/', views.producto_api, name='producto_api'),
+    path('api/productos/', views.productos_api, name='productos_api'),
+    path('api/carrito/verificar/', views.verificar_carrito_api, name='verificar_carrito_api'),
+    path('api/productos/buscar/', views.buscar_productos_api, name='buscar_productos_api'),
+    path('api/catalogo/', views.catalogo_api, name='catalogo_api'),
+    path('api/ventas/', ventas_views.ventas_api, name='ventas_api'),
+    path('api/ventas/lote/', ventas_views.ventas_lote_api, name='ventas_lote_api'),
+    path('metrics', views.metricas_view, name='metricas'),
 
     # -----------------------------
     # Autenticación
@@ -0,0 +1,142 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Sale, VentaDiaria
+
+
+def dia_de(venta):
+    return timezone.localdate(venta.fecha)
+
+
+def sumar(fecha, caja_id, tipo_comprobante, ventas, total):
+    # Incremento atómico de la fila del día (UPDATE ... SET total = total + x);
+    # si aún no existe se crea, y si otro proceso la creó antes se reintenta
+    filtro = VentaDiaria.objects.filter(fecha=fecha, caja_id=caja_id, tipo_comprobante=tipo_comprobante)
+    cambios = {'ventas': F('ventas') + ventas, 'total': F('total') + total}
+    if filtro.update(**cambios):
+        return
+    try:
+        with transaction.atomic():
+            VentaDiaria.objects.create(
+                fecha=fecha, caja_id=caja_id, tipo_comprobante=tipo_comprobante, ventas=ventas, total=total,
+            )
+    except IntegrityError:
+        filtro.update(**cambios)
+
+
+def inicio_del_dia(dia, dias=0):
+    return timezone.make_aware(datetime.combine(dia + timedelta(days=dias), time.min))
+
+
+def registrar_venta_diaria(venta, total_anterior=None, caja_anterior_id=None, nueva=True,
+                           tipo_anterior=None, fecha_anterior=None):
+    # Una venta editada que cambia de caja, tipo o día sale de su fila anterior
+    # y entra en la nueva; si solo cambia el total se suma la diferencia
+    actual = (dia_de(venta), venta.caja_id, venta.tipo_comprobante)
+    if nueva:
+        sumar(*actual, 1, venta.total)
+        return
+
+    total_anterior = total_anterior or Decimal("0.00")
+    anterior = (
+        timezone.localdate(fecha_anterior) if fecha_anterior else actual[0],
+        caja_anterior_id,
+        tipo_anterior or venta.tipo_comprobante,
+    )
+    if anterior != actual:
+        sumar(*anterior, -1, -total_anterior)
+        sumar(*actual, 1, venta.total)
+    elif venta.total != total_anterior:
+        sumar(*actual, 0, venta.total - total_anterior)
+
+
+def quitar_venta_diaria(venta):
+    sumar(dia_de(venta), venta.caja_id, venta.tipo_comprobante, -1, -venta.total)
+
+
+def pasar_a_sin_caja(caja_id):
+    # Al borrar una caja sus ventas quedan sin caja (SET_NULL): sus filas se
+    # suman a las de "sin caja" del mismo día y tipo en vez de duplicar la clave
+    filas = VentaDiaria.objects.filter(caja_id=caja_id)
+    with transaction.atomic():
+        for fila in filas:
+            sumar(fila.fecha, None, fila.tipo_comprobante, fila.ventas, fila.total)
+        filas.delete()
+
+
+# --------------------------
+# RECONSTRUCCIÓN
+# --------------------------
+def reconstruir(desde=None, hasta=None):
+    # Recalcula los días indicados (ambos inclusive; None = sin límite) desde Sale
+    ventas = Sale.objects.all()
+    acumulados = VentaDiaria.objects.all()
+    if desde:
+        ventas = ventas.filter(fecha__gte=inicio_del_dia(desde))
+        acumulados = acumulados.filter(fecha__gte=desde)
+    if hasta:
+        ventas = ventas.filter(fecha__lt=inicio_del_dia(hasta, dias=1))
+        acumulados = acumulados.filter(fecha__lte=hasta)
+
+    filas = (
+        ventas.annotate(dia=TruncDate('fecha', tzinfo=timezone.get_current_timezone()))
+        .values('dia', 'caja_id', 'tipo_comprobante')
+        .annotate(n=Count('id'), suma=Sum('total'))
+        .order_by()
+    )
+    with transaction.atomic():
+        acumulados.delete()
+        creadas = VentaDiaria.objects.bulk_create([
+            VentaDiaria(
+                fecha=fila['dia'], caja_id=fila['caja_id'], tipo_comprobante=fila['tipo_comprobante'],
+                ventas=fila['n'], total=fila['suma'] or 0,
+            )
+            for fila in filas
+        ])
+    return len(creadas)
+
+
+# --------------------------
+# CONSULTAS POR PERIODO
+# --------------------------
+def rango_periodo(periodo, valor):
+    # "dia" 2025-03-14, "mes" 2025-03, "anio" 2025 -> (desde, hasta) exclusivo
+    if periodo == "dia":
+        desde = date.fromisoformat(valor)
+        return desde, desde + timedelta(days=1)
+    if periodo == "mes":
+        anio, mes = (int(parte) for parte in valor.split("-"))
+        desde = date(anio, mes, 1)
+        return desde, date(anio + mes // 12, mes % 12 + 1, 1)
+    if periodo == "anio":
+        anio = int(valor)
+        return date(anio, 1, 1), date(anio + 1, 1, 1)
+    raise ValueError(f"Periodo desconocido: {periodo}")
+
+
+def totales_periodo(desde, hasta):
+    # Totales y desglose por tipo de comprobante entre dos fechas (hasta
+    # exclusivo; None = sin límite)
+    filas = VentaDiaria.objects.all()
+    if desde:
+        filas = filas.filter(fecha__gte=desde)
+    if hasta:
+        filas = filas.filter(fecha__lt=hasta)
+    por_tipo = {
+        fila['tipo_comprobante']: fila
+        for fila in filas.values('tipo_comprobante')
+        .annotate(ventas=Sum('ventas'), total=Sum('total'))
+        .order_by('tipo_comprobante')
+        if fila['ventas'] or fila['total']  # tipos cuyas ventas se borraron todas
+    }
+    return {
+        'ventas': sum(fila['ventas'] for fila in por_tipo.values()),
+        'total': sum((fila['total'] for fila in por_tipo.values()), Decimal("0.00")),
+        'por_tipo': por_tipo,
+    }
+
@@ -0,0 +1,209 @@
+import hashlib
+import json
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+
+from .libro_caja import registrar_movimiento
+from .models import CajaMovimiento, Cliente, EnvioVenta, Producto, Sale, SaleItem
+from .signals import agrupar_notificaciones, notificar_productos
+from .ventas_diarias import registrar_venta_diaria
+
+
+class VentaInvalida(Exception):
+    pass
+
+
+class StockInsuficiente(VentaInvalida):
+    def __init__(self, faltantes):
+        # faltantes: lista de (producto, cantidad_pedida, disponible)
+        self.faltantes = faltantes
+        detalle = ", ".join(
+            f"{producto.nombre} (pedido {pedido}, disponible {disponible})"
+            for producto, pedido, disponible in faltantes
+        )
+        super().__init__(f"Stock insuficiente para: {detalle}")
+
+
+def agrupar_lineas(lineas):
+    # lineas: iterable de (producto_id, cantidad, precio). Si un producto se
+    # repite, sus cantidades se suman para validar el stock una sola vez.
+    pedidos = {}
+    for producto_id, cantidad, precio in lineas:
+        producto_id = int(producto_id)
+        cantidad = int(cantidad)
+        precio = Decimal(precio)
+        if cantidad <= 0:
+            raise VentaInvalida("La cantidad debe ser mayor que cero.")
+        if not precio.is_finite():  # NaN o Infinity no se pueden comparar ni guardar
+            raise VentaInvalida("El precio no es un número válido.")
+        if precio < 0:
+            raise VentaInvalida("El precio no puede ser negativo.")
+        pedidos[producto_id] = pedidos.get(producto_id, 0) + cantidad
+    return pedidos
+
+
+def _faltantes(productos, pedidos):
+    return [
+        (productos[pid], cantidad, productos[pid].cantidad)
+        for pid, cantidad in pedidos.items()
+        if productos[pid].cantidad < cantidad
+    ]
+
+
+def _vendibles():
+    # Los productos inactivos no se venden: se informan como no encontrados
+    return Producto.objects.filter(activo=True)
+
+
+def _exigir_encontrados(pedidos, productos):
+    no_encontrados = set(pedidos) - set(productos)
+    if no_encontrados:
+        raise VentaInvalida(f"Productos no encontrados: {sorted(no_encontrados)}")
+
+
+def verificar_carrito(lineas):
+    # Revisión previa del carrito (sin bloquear ni escribir): lineas es un
+    # iterable de (producto_id, cantidad). Devuelve los faltantes de stock y los
+    # ids inexistentes, todos de una vez, con una sola consulta.
+    pedidos = agrupar_lineas((producto_id, cantidad, 0) for producto_id, cantidad in lineas)
+    productos = _vendibles().in_bulk(list(pedidos))
+    no_encontrados = sorted(set(pedidos) - set(productos))
+    encontrados = {pid: cantidad for pid, cantidad in pedidos.items() if pid in productos}
+    return _faltantes(productos, encontrados), no_encontrados
+
+
+def registrar_venta(cliente, tipo_comprobante, lineas, caja=None):
+    # Registra la venta completa en una transacción con un número fijo de
+    # consultas, sin importar cuántas líneas tenga:
+    #   productos (con bloqueo) -> venta -> items (bulk) -> stock (un UPDATE) -> movimiento de caja
+    #   -> venta diaria
+    lineas = list(lineas)
+    if not lineas:
+        raise VentaInvalida("La venta no tiene productos.")
+    pedidos = agrupar_lineas(lineas)
+
+    with transaction.atomic():
+        productos = _vendibles().select_for_update().in_bulk(list(pedidos))
+        _exigir_encontrados(pedidos, productos)
+
+        faltantes = _faltantes(productos, pedidos)
+        if faltantes:
+            raise StockInsuficiente(faltantes)
+
+        items = [
+            SaleItem(producto=productos[int(pid)], cantidad=int(cantidad), precio=Decimal(precio))
+            for pid, cantidad, precio in lineas
+        ]
+        total = sum((item.cantidad * item.precio for item in items), Decimal("0.00"))
+
+        venta = Sale(cliente=cliente, tipo_comprobante=tipo_comprobante, total=total, caja=caja)
+        venta.save(recalcular=False)
+
+        for item in items:
+            item.sale = venta
+        SaleItem.objects.bulk_create(items)
+
+        # Descuento de stock en un solo UPDATE. La condición cantidad >= pedido
+        # protege también en motores sin SELECT ... FOR UPDATE (SQLite).
+        dinero = DecimalField(max_digits=15, decimal_places=2)
+        nueva_cantidad = Case(
+            *[When(pk=pid, then=F('cantidad') - Value(Decimal(cantidad))) for pid, cantidad in pedidos.items()],
+            output_field=dinero,
+        )
+        condicion = Q()
+        for pid, cantidad in pedidos.items():
+            condicion |= Q(pk=pid, cantidad__gte=cantidad)
+        actualizados = _vendibles().filter(condicion).update(cantidad=nueva_cantidad, actualizado=timezone.now())
+        if actualizados != len(pedidos):
+            # Otro proceso vendió el stock o desactivó un producto entre la
+            # lectura y el UPDATE
+            productos = _vendibles().in_bulk(list(pedidos))
+            _exigir_encontrados(pedidos, productos)
+            raise StockInsuficiente(_faltantes(productos, pedidos))
+
+        if caja is not None:
+            registrar_movimiento(
+                caja, CajaMovimiento.VENTA, total, venta=venta,
+                descripcion=f"Venta {venta.numero_venta}",
+            )
+        registrar_venta_diaria(venta)
+
+        notificar_productos(pedidos.keys(), {p.categoria_id for p in productos.values()})
+
+    return venta
+
+
+# --------------------------
+# ENVÍOS CON CLAVE (IDEMPOTENTES)
+# --------------------------
+TIPOS_COMPROBANTE = dict(Sale._meta.get_field('tipo_comprobante').choices)
+
+
+class ClaveReutilizada(VentaInvalida):
+    pass
+
+
+def huella_envio(cliente_nombre, tipo_comprobante, lineas):
+    datos = [cliente_nombre, tipo_comprobante, [[str(valor) for valor in linea] for linea in lineas]]
+    return hashlib.sha256(json.dumps(datos, ensure_ascii=False).encode()).hexdigest()
+
+
+def _envio_previo(clave, huella):
+    envio = EnvioVenta.objects.select_related('venta').get(clave=clave)
+    if envio.huella != huella:
+        raise ClaveReutilizada("La clave ya se usó para una venta con otros datos.")
+    return envio
+
+
+def registrar_envio(clave, cliente_nombre, tipo_comprobante, lineas, caja=None, usuario=None):
+    # Registra la venta identificada por `clave` (generada por el cliente) y
+    # guarda el resultado, también si se rechaza por stock o por datos no
+    # válidos. Con una clave ya usada devuelve el resultado guardado sin
+    # aplicar nada. Devuelve (envio, repetido).
+    lineas = list(lineas)
+    huella = huella_envio(cliente_nombre, tipo_comprobante, lineas)
+    if EnvioVenta.objects.filter(clave=clave).exists():
+        return _envio_previo(clave, huella), True
+
+    envio = EnvioVenta(clave=clave, huella=huella, usuario=usuario)
+    try:
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    if tipo_comprobante not in TIPOS_COMPROBANTE:
+                        raise VentaInvalida(f"Tipo de comprobante no válido: {tipo_comprobante}")
+                    if not cliente_nombre:
+                        raise VentaInvalida("Falta el cliente.")
+                    cliente, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
+                    envio.venta = registrar_venta(cliente, tipo_comprobante, lineas, caja=caja)
+                    envio.estado = EnvioVenta.REGISTRADA
+            except (ValueError, ArithmeticError):
+                envio.estado, envio.error = EnvioVenta.RECHAZADA, "Cantidad o precio no válido."
+            except VentaInvalida as e:
+                envio.estado, envio.error = EnvioVenta.RECHAZADA, str(e)
+            # La clave es única: si otra petición la registró mientras tanto,
+            # este INSERT falla y la venta de arriba se deshace con él
+            envio.save()
+    except IntegrityError:
+        if not EnvioVenta.objects.filter(clave=clave).exists():
+            raise
+        return _envio_previo(clave, huella), True
+    return envio, False
+
+
+def registrar_lote(envios, caja=None, usuario=None):
+    # envios: lista de (clave, cliente_nombre, tipo_comprobante, lineas). Todo
+    # se confirma en una transacción; cada venta va en su propio savepoint, así
+    # una rechazada no deshace las demás. Devuelve [(envio, repetido)] o, para
+    # las que no se pudieron procesar (clave reutilizada), el error.
+    resultados = []
+    with transaction.atomic(), agrupar_notificaciones():
+        for clave, cliente_nombre, tipo_comprobante, lineas in envios:
+            try:
+                resultados.append(registrar_envio(clave, cliente_nombre, tipo_comprobante, lineas, caja, usuario))
+            except ClaveReutilizada as e:
+                resultados.append(e)
+    return resultados
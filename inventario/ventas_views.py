@@ -1,13 +1,29 @@
+import json
 from django.shortcuts import render, redirect, get_object_or_404
 from django.forms import modelform_factory, inlineformset_factory
 from django.urls import reverse
 from django.contrib import messages
 from .forms import ProductoForm, SaleForm, SaleItemForm
-from .models import Producto, Categoria, Cliente, Sale, SaleItem, Caja
-from decimal import Decimal
-from django.db.models import Sum
+from .models import Producto, Categoria, Cliente, Sale, SaleItem, Caja, EnvioVenta, VentaDiaria
+from .exportacion import FORMATOS, exportar_ventas
+from .libro_caja import cerrar_caja as cerrar_caja_libro, saldo_caja
+from .metricas import metricas
+from .ventas_diarias import inicio_del_dia, rango_periodo, totales_periodo
+from .ventas_servicio import (
+    TIPOS_COMPROBANTE, VentaInvalida, registrar_envio, registrar_lote, registrar_venta as registrar_venta_servicio,
+)
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.http import Http404, HttpResponse, JsonResponse
+from django.template.loader import render_to_string
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_POST
 from django.utils.timezone import now
-from datetime import datetime
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 
@@ -35,34 +51,68 @@ def abrir_caja(request):
 def cerrar_caja(request, caja_id):
     caja = get_object_or_404(Caja, id=caja_id)
     if request.method == "POST":
-        monto_cierre = request.POST.get('monto_cierre')
-        caja.monto_cierre = monto_cierre
-        caja.fecha_cierre = timezone.now()
-        caja.abierta = False
-        caja.save()
+        cerrar_caja_libro(caja, request.POST.get('monto_cierre'))
         return redirect('historial_cajas')
-    return render(request, 'inventario/cerrar_caja.html', {'caja': caja})
+    return render(request, 'inventario/cerrar_caja.html', {
+        'caja': caja,
+        'saldo_caja': saldo_caja(caja) if caja.abierta else caja.total,
+    })
+
+
+CAJAS_POR_PAGINA = 30
+
+
+def cajas_con_totales(queryset):
+    # Ventas de cada caja leídas de las ventas diarias con subconsultas, para
+    # traer todo en una sola consulta junto con el usuario
+    dinero = DecimalField(max_digits=15, decimal_places=2)
+    por_caja = VentaDiaria.objects.filter(caja=OuterRef('pk')).values('caja')
+    return queryset.select_related('usuario').annotate(
+        num_ventas=Coalesce(Subquery(por_caja.annotate(n=Sum('ventas')).values('n')), 0),
+        total_ventas=Coalesce(Subquery(por_caja.annotate(t=Sum('total')).values('t')), Value(Decimal("0.00")), output_field=dinero),
+    ).annotate(
+        esperado=ExpressionWrapper(F('monto_inicial') + F('total_ventas'), output_field=dinero),
+        diferencia=ExpressionWrapper(F('monto_cierre') - F('esperado'), output_field=dinero),
+    )
 
 
 @login_required
 def historial_caja(request):
-    cajas = Caja.objects.all().order_by('-fecha_apertura')
-    return render(request, 'inventario/historial_caja.html', {'cajas': cajas})
+    cajas = Caja.objects.order_by('-fecha_apertura', '-id')
+
+    usuario_id = request.GET.get('usuario')
+    if usuario_id and usuario_id.isdigit():
+        cajas = cajas.filter(usuario_id=usuario_id)
+    desde = leer_fecha(request.GET.get('desde'))
+    hasta = leer_fecha(request.GET.get('hasta'))
+    if desde:
+        cajas = cajas.filter(fecha_apertura__gte=inicio_del_dia(desde))
+    if hasta:
+        cajas = cajas.filter(fecha_apertura__lt=inicio_del_dia(hasta, dias=1))
+
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+
+    pagina = Paginator(cajas_con_totales(cajas), CAJAS_POR_PAGINA).get_page(request.GET.get('page'))
+    return render(request, 'inventario/historial_caja.html', {
+        'pagina': pagina,
+        'usuarios': User.objects.filter(caja__isnull=False).distinct().order_by('username'),
+        'filtros': parametros.urlencode(),
+    })
 
 
 @login_required
 def cerrar_caja_periodo(request, periodo, valor):
-    if periodo == "dia":
-        ventas = Sale.objects.filter(fecha__date=valor)
-    elif periodo == "mes":
-        year, month = valor.split("-")
-        ventas = Sale.objects.filter(fecha__year=year, fecha__month=month)
-    elif periodo == "anio":
-        ventas = Sale.objects.filter(fecha__year=valor)
-    else:
-        ventas = Sale.objects.none()
-
-    total = ventas.aggregate(Sum("total"))["total"] or 0
+    # Lee las ventas diarias acumuladas (rango sobre el índice de fecha) en vez
+    # de recorrer todas las ventas del periodo
+    try:
+        desde, hasta = rango_periodo(periodo, valor)
+    except ValueError:
+        messages.error(request, f"Periodo no válido: {periodo} {valor}")
+        return redirect("historial_cajas")
+
+    totales = totales_periodo(desde, hasta)
+    total = totales['total']
 
     # Crear caja de resumen sin usar 'estado'
     Caja.objects.create(
@@ -74,8 +124,12 @@ def cerrar_caja_periodo(request, periodo, valor):
         abierta=True
     )
 
-    messages.success(request, f"Caja del {periodo} {valor} cerrada con total {total}")
-    return redirect("historial_caja")
+    desglose = ", ".join(f"{tipo}: {fila['ventas']}" for tipo, fila in totales['por_tipo'].items())
+    messages.success(
+        request,
+        f"Caja del {periodo} {valor} cerrada con total {total} ({totales['ventas']} ventas; {desglose or 'sin ventas'})",
+    )
+    return redirect("historial_cajas")
 
 
 # -----------------------------
@@ -92,33 +146,121 @@ SaleItemFormSet = inlineformset_factory(
 )
 
 
+# Listado por cursor (keyset) sobre (fecha, id): cada página es un rango del
+# índice venta_fecha_idx, sin OFFSET, y tarda lo mismo con miles de ventas
+VENTAS_POR_PAGINA = 50
+_EPOCA = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def cursor_venta(venta):
+    # "<microsegundos desde 1970>-<id>", exacto y seguro en la URL
+    return f"{(venta.fecha - _EPOCA) // timedelta(microseconds=1)}-{venta.id}"
+
+
+def leer_cursor(valor):
+    try:
+        micro, venta_id = valor.split("-")
+        return _EPOCA + timedelta(microseconds=int(micro)), int(venta_id)
+    except (AttributeError, ValueError, OverflowError):
+        return None
+
+
+def leer_fecha(valor):
+    try:
+        return date.fromisoformat(valor) if valor else None
+    except ValueError:
+        return None
+
+
+def pagina_ventas(request):
+    # Filtros por día completo: "hasta" incluye todas las ventas de ese día
+    desde = leer_fecha(request.GET.get('fecha_inicio'))
+    hasta = leer_fecha(request.GET.get('fecha_fin'))
+
+    ventas = Sale.objects.select_related('cliente').order_by('-fecha', '-id')
+    if desde:
+        ventas = ventas.filter(fecha__gte=inicio_del_dia(desde))
+    if hasta:
+        ventas = ventas.filter(fecha__lt=inicio_del_dia(hasta, dias=1))
+
+    cursor = leer_cursor(request.GET.get('despues'))
+    if cursor:
+        fecha, venta_id = cursor
+        ventas = ventas.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=venta_id))
+
+    # Una fila de más para saber si hay otra página
+    filas = list(ventas[:VENTAS_POR_PAGINA + 1])
+    siguiente = cursor_venta(filas[VENTAS_POR_PAGINA - 1]) if len(filas) > VENTAS_POR_PAGINA else None
+    filas = filas[:VENTAS_POR_PAGINA]
+
+    return {
+        'ventas': filas,
+        'siguiente': siguiente,
+        'total_pagina': sum((venta.total for venta in filas), Decimal("0.00")),
+        'desde': desde,
+        'hasta': hasta,
+    }
+
+
 @login_required
 def listar_ventas(request):
-    ventas = Sale.objects.all().order_by('-fecha')
-
-    # Filtros por fecha
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
+    pagina = pagina_ventas(request)
 
-    if fecha_inicio:
-        fecha_inicio = timezone.make_aware(datetime.strptime(fecha_inicio, "%Y-%m-%d"))
-        ventas = ventas.filter(fecha__gte=fecha_inicio)
-    if fecha_fin:
-        fecha_fin = timezone.make_aware(datetime.strptime(fecha_fin, "%Y-%m-%d"))
-        ventas = ventas.filter(fecha__lte=fecha_fin)
+    # Totales del periodo filtrado desde las ventas diarias (una consulta)
+    hasta = pagina['hasta'] + timedelta(days=1) if pagina['hasta'] else None
+    periodo = totales_periodo(pagina['desde'], hasta)
 
     # Caja abierta actual
     caja_abierta = Caja.objects.filter(abierta=True).first()
 
+    parametros = request.GET.copy()
+    parametros.pop('despues', None)
+
     return render(request, 'inventario/listar_ventas.html', {
-        'ventas': ventas,
-        'caja_abierta': caja_abierta
+        **pagina,
+        'periodo': periodo,
+        'filtros': parametros.urlencode(),
+        'caja_abierta': caja_abierta,
+        'saldo_caja': saldo_caja(caja_abierta) if caja_abierta else None,
     })
 
 
+@login_required
+def ventas_api(request):
+    # Variante JSON del listado para el scroll infinito
+    pagina = pagina_ventas(request)
+    return JsonResponse({
+        'ventas': [
+            {
+                'id': venta.id,
+                'numero_venta': venta.numero_venta,
+                'fecha': timezone.localtime(venta.fecha).strftime("%d/%m/%Y %H:%M"),
+                'cliente': str(venta.cliente),
+                'tipo_comprobante': venta.tipo_comprobante,
+                'total': str(venta.total),
+                'nota_url': reverse('nota_venta', args=[venta.id]),
+            }
+            for venta in pagina['ventas']
+        ],
+        'siguiente': pagina['siguiente'],
+        'total_pagina': str(pagina['total_pagina']),
+    })
+
+
+@login_required
+def descargar_ventas(request):
+    # Ventas (o sus items con ?detalle=items) del rango filtrado, en XLSX o CSV
+    formato = request.GET.get('formato')
+    return exportar_ventas(
+        formato if formato in FORMATOS else 'xlsx',
+        leer_fecha(request.GET.get('fecha_inicio')),
+        leer_fecha(request.GET.get('fecha_fin')),
+        detalle=request.GET.get('detalle') == 'items',
+    )
+
+
 @login_required
 def registrar_venta(request):
-    productos = Producto.objects.all()
     caja_abierta = Caja.objects.filter(abierta=True).first()
 
     if not caja_abierta:
@@ -135,45 +277,108 @@ def registrar_venta(request):
         if not cliente_nombre or not producto_ids:
             messages.error(request, "Debes ingresar el cliente y al menos un producto.")
             return redirect('ventas_nueva')
+        if tipo_comprobante not in TIPOS_COMPROBANTE:
+            messages.error(request, "Tipo de comprobante no válido.")
+            return redirect('ventas_nueva')
 
-        cliente_obj, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
-        venta = Sale.objects.create(cliente=cliente_obj, tipo_comprobante=tipo_comprobante, total=0)
-
-        total_venta = Decimal("0.00")
-
+        lineas = []
         for pid, cant, prec in zip(producto_ids, cantidades, precios):
             if not cant or not prec:
                 continue
             try:
-                cantidad = int(cant)
-                precio = Decimal(prec)
-            except ValueError:
+                lineas.append((int(pid), int(cant), Decimal(prec)))
+            except (ValueError, InvalidOperation):
                 continue
 
-            producto = get_object_or_404(Producto, id=pid)
-
-            if producto.cantidad < cantidad:
-                messages.error(request, f"Stock insuficiente para {producto.nombre}. Disponible: {producto.cantidad}")
-                return redirect('ventas_nueva')
-
-            subtotal = cantidad * precio
-            total_venta += subtotal
-
-            SaleItem.objects.create(sale=venta, producto=producto, cantidad=cantidad, precio=precio)
-            producto.cantidad -= cantidad
-            producto.save()
-
-        venta.total = total_venta
-        venta.save()
+        # La página envía una clave única por venta: un doble clic o un
+        # reenvío del formulario devuelve la venta ya registrada
+        clave = request.POST.get('clave', '').strip()[:64]
+        repetido = False
+        try:
+            if clave:
+                envio, repetido = registrar_envio(
+                    clave, cliente_nombre, tipo_comprobante, lineas, caja=caja_abierta, usuario=request.user
+                )
+                if envio.estado == EnvioVenta.RECHAZADA or envio.venta is None:
+                    raise VentaInvalida(envio.error or "La venta de este envío ya no existe.")
+                venta = envio.venta
+            else:
+                cliente_obj, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
+                venta = registrar_venta_servicio(cliente_obj, tipo_comprobante, lineas, caja=caja_abierta)
+        except VentaInvalida as e:
+            messages.error(request, str(e))
+            return redirect('ventas_nueva')
+        total_venta = venta.total
 
-        messages.success(request, f"Venta registrada correctamente. Total: S/. {total_venta:.2f}")
+        if repetido:
+            messages.info(request, f"La venta {venta.numero_venta} ya estaba registrada.")
+        else:
+            messages.success(request, f"Venta registrada correctamente. Total: S/. {total_venta:.2f}")
 
         if tipo_comprobante in ['Boleta', 'Factura']:
             return redirect('smartclick_redirect', sale_id=venta.id)
         else:
             return redirect('nota_venta', sale_id=venta.id)
 
-    return render(request, 'inventario/registrar_venta.html', {'productos': productos})
+    # Los productos se buscan desde la página con la API de búsqueda
+    return render(request, 'inventario/registrar_venta.html')
+
+
+# Ventas por lote desde los puntos de venta (cola sin conexión, reintentos)
+MAX_VENTAS_LOTE = 100
+
+
+def resultado_envio(clave, resultado):
+    if isinstance(resultado, Exception):
+        return {'clave': clave, 'estado': 'error', 'error': str(resultado)}
+    envio, repetido = resultado
+    datos = {'clave': clave, 'estado': envio.estado, 'repetido': repetido}
+    if envio.venta is not None:
+        datos.update({
+            'venta': envio.venta.id,
+            'numero_venta': envio.venta.numero_venta,
+            'tipo_comprobante': envio.venta.tipo_comprobante,
+            'total': str(envio.venta.total),
+            'nota_url': reverse('nota_venta', args=[envio.venta.id]),
+        })
+    if envio.error:
+        datos['error'] = envio.error
+    return datos
+
+
+@login_required
+@require_POST
+def ventas_lote_api(request):
+    # Cuerpo JSON: {"ventas": [{"clave": "<uuid>", "cliente": "...", "tipo_comprobante": "Nota",
+    # "lineas": [{"id": 1, "cantidad": 2, "precio": "13.00"}, ...]}, ...]}. Todas se confirman en
+    # una transacción con un resultado por venta; una clave ya enviada devuelve su resultado
+    # original (repetido: true) sin volver a registrar nada.
+    try:
+        envios = [
+            (
+                str(venta['clave']).strip(),
+                str(venta.get('cliente') or '').strip(),
+                venta.get('tipo_comprobante'),
+                [(linea['id'], linea['cantidad'], linea['precio']) for linea in venta['lineas']],
+            )
+            for venta in json.loads(request.body)['ventas']
+        ]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Formato no válido'}, status=400)
+    if not 0 < len(envios) <= MAX_VENTAS_LOTE:
+        return JsonResponse({'error': f'Envía entre 1 y {MAX_VENTAS_LOTE} ventas'}, status=400)
+    if any(not 0 < len(clave) <= 64 for clave, *_ in envios):
+        return JsonResponse({'error': 'Cada venta necesita una clave de hasta 64 caracteres'}, status=400)
+
+    # Sin caja abierta no se guarda nada: el cliente puede reintentar después
+    caja = Caja.objects.filter(abierta=True).first()
+    if caja is None:
+        return JsonResponse({'error': 'No hay ninguna caja abierta'}, status=409)
+
+    resultados = registrar_lote(envios, caja=caja, usuario=request.user)
+    return JsonResponse({
+        'resultados': [resultado_envio(envio[0], resultado) for envio, resultado in zip(envios, resultados)],
+    })
 
 
 def smartclick_redirect(request, sale_id):
@@ -183,25 +388,77 @@ def smartclick_redirect(request, sale_id):
     return redirect('/ventas/')  # Ajusta según tu flujo
 
 
-def nota_venta(request, sale_id):
-    sale = get_object_or_404(Sale, id=sale_id)
-    items = SaleItem.objects.filter(sale=sale)
-
-    items_con_subtotal = []
-    total = 0
-    for item in items:
-        subtotal = item.cantidad * item.precio
-        items_con_subtotal.append({
-            'producto': item.producto,
-            'cantidad': item.cantidad,
-            'precio': item.precio,
-            'subtotal': subtotal,
-        })
-        total += subtotal
+# -----------------------------
+# Notas de venta
+# -----------------------------
+# Subir al cambiar la plantilla de la nota para descartar las guardadas en caché
+NOTA_VERSION = 1
+NOTA_CACHE_SEGUNDOS = 60 * 60 * 24
+
+
+def _version_nota(request, sale_id):
+    # Una sola consulta por petición, compartida por el ETag y Last-Modified
+    if not hasattr(request, '_version_nota'):
+        request._version_nota = Sale.objects.filter(pk=sale_id).values_list('actualizado', flat=True).first()
+    return request._version_nota
+
 
-    context = {
-        'sale': sale,
-        'items': items_con_subtotal,
-        'total': total,
+def etag_nota(request, sale_id):
+    actualizado = _version_nota(request, sale_id)
+    if actualizado:
+        return f"nota-{NOTA_VERSION}-{sale_id}-{actualizado.timestamp():.6f}"
+    return None
+
+
+def ultima_modificacion_nota(request, sale_id):
+    return _version_nota(request, sale_id)
+
+
+def datos_nota(venta):
+    # venta debe traer items__producto precargados
+    items = list(venta.items.all())
+    return {
+        'sale': venta,
+        'items': items,
+        'total': sum((item.subtotal() for item in items), 0),
     }
-    return render(request, 'ventas/nota_venta.html', context)
+
+
+@condition(etag_func=etag_nota, last_modified_func=ultima_modificacion_nota)
+def nota_venta(request, sale_id):
+    # La nota se renderiza una vez por versión de la venta (Sale.actualizado);
+    # las visitas repetidas del navegador reciben 304 sin renderizar nada
+    etag = etag_nota(request, sale_id)
+    if etag is None:
+        raise Http404("Venta no encontrada")
+
+    clave = f"nota_venta:{etag}"
+    html = cache.get(clave)
+    metricas.contar_cache('nota_venta', html is not None)
+    if html is None:
+        venta = Sale.objects.select_related('cliente').prefetch_related('items__producto').get(pk=sale_id)
+        html = render_to_string('ventas/nota_venta.html', datos_nota(venta))
+        cache.set(clave, html, NOTA_CACHE_SEGUNDOS)
+
+    response = HttpResponse(html)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+def notas_del_dia(request, fecha):
+    # Todas las notas de un día en un solo documento: tres consultas en total
+    dia = leer_fecha(fecha)
+    if dia is None:
+        raise Http404("Fecha no válida")
+
+    ventas = (
+        Sale.objects.filter(fecha__gte=inicio_del_dia(dia), fecha__lt=inicio_del_dia(dia, dias=1))
+        .select_related('cliente')
+        .prefetch_related('items__producto')
+        .order_by('fecha', 'id')
+    )
+    return render(request, 'ventas/notas_dia.html', {
+        'fecha': dia,
+        'notas': [datos_nota(venta) for venta in ventas],
+    })
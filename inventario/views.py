@@ -1,6 +1,6 @@
 from decimal import Decimal
+import json
 import pandas as pd
-import openpyxl
 import re
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
@@ -9,10 +9,27 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.db import transaction
 from django.db.models import Q, Sum, F
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.template.loader import render_to_string
+from django.urls import reverse
 from django.forms import inlineformset_factory
-from .models import Producto, Categoria, Cliente, Sale, SaleItem, Caja
-from .forms import ProductoForm, SaleForm, SaleItemForm
+from .models import Producto, Categoria, Cliente, Sale, SaleItem, Caja, TrabajoImportacion, Reajuste
+from .forms import ProductoForm, ReajusteForm, SaleForm, SaleItemForm
+from .busqueda import indice, LIMITE_MAXIMO, LIMITE_RESULTADOS
+from .catalogo import catalogo, leer_marca
+from .resumen import totales_inventario
+from .exportacion import FORMATOS, exportar_inventario
+from .metricas import metricas
+from .importacion import aplicar_vista_previa, crear_trabajo, lanzar_trabajo, reclamar_trabajo
+from .numeracion import version_catalogo
+from .reajuste import aplicar_reajuste, deshacer_reajuste, vista_previa
+from .ventas_servicio import VentaInvalida, verificar_carrito
+from django.utils.cache import patch_cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition, require_POST
 from django.db import transaction
 from django.shortcuts import render, redirect
 from django.contrib import messages
@@ -21,18 +38,11 @@ from .forms import SaleForm
 from decimal import Decimal, InvalidOperation
 from django.shortcuts import render
 from django.contrib.auth.decorators import login_required
-from django.db.models import F, ExpressionWrapper, FloatField, Q
+from django.db.models import F, ExpressionWrapper, FloatField, Q, Case, When, Value, DecimalField
+from django.core.paginator import Paginator
 from .models import Producto, Categoria
 
 
-# --------------------------
-# HISTORIAL DE CAJA
-# --------------------------
-def historial_caja(request):
-    cajas = Caja.objects.all()
-    return render(request, "inventario/historial_caja.html", {"cajas": cajas})
-
-
 # --------------------------
 # AUTENTICACIÓN
 # --------------------------
@@ -81,131 +91,167 @@ def importar_excel(request):
             messages.error(request, "Por favor, selecciona un archivo Excel.")
             return redirect("importar_excel")
 
-        try:
-            # ⚠️ Esto borra todos los productos antes de importar
-            # Si quieres que sume, quítalo
-            Producto.objects.all().delete()
-
-            workbook = openpyxl.load_workbook(archivo_excel)
-
-            for hoja in workbook.sheetnames:
-                categoria_nombre = hoja.strip().upper()
-                categoria_obj, _ = Categoria.objects.get_or_create(nombre=categoria_nombre)
-                hoja_excel = workbook[hoja]
-
-                for fila in hoja_excel.iter_rows(min_row=2, values_only=True):
-                    try:
-                        nombre       = str(fila[0]).strip() if fila[0] else ""
-                        marca        = str(fila[1]).strip() if fila[1] else ""
-                        cantidad_raw = fila[2]
-                        unidad_medida= str(fila[3]).strip() if fila[3] else ""
-                        precio_raw   = fila[4]
-
-                        if not nombre:  # si no hay nombre, no se guarda
-                            continue
-
-                        # --- cantidad ---
-                        try:
-                            cantidad = int(cantidad_raw) if cantidad_raw not in [None, ""] else 0
-                        except (ValueError, TypeError):
-                            cantidad = 0
-
-                        # --- precio ---
-                        valor = str(precio_raw).strip() if precio_raw is not None else "0"
-                        if valor in ["", "nan", None]:
-                            precio = Decimal("0")
-                        else:
-                            try:
-                                valor = valor.replace("S/", "").replace(",", "").strip()
-                                precio = Decimal(valor)
-                            except InvalidOperation:
-                                precio = Decimal("0")
-
-                        Producto.objects.create(
-                            nombre=nombre,
-                            marca=marca,
-                            categoria=categoria_obj,
-                            cantidad=cantidad,
-                            unidad_medida=unidad_medida,
-                            precio_venta=precio,
-                            precio_compra=0,
-                            porcentaje_ganancia=30
-                        )
-
-                    except Exception as e:
-                        # Si una fila falla, la saltamos pero seguimos importando las demás
-                        print(f"Fila con error: {fila} -> {e}")
-                        continue
-
-            # Eliminar categorías vacías
-            for cat in Categoria.objects.all():
-                if not Producto.objects.filter(categoria=cat).exists():
-                    cat.delete()
-
-            messages.success(request, "Productos importados correctamente.")
-            return redirect("lista_productos")
-
-        except Exception as e:
-            messages.error(request, f"Error al importar: {str(e)}")
-            return redirect("importar_excel")
+        modo = request.POST.get("modo", TrabajoImportacion.SINCRONIZAR)
+        if modo not in dict(TrabajoImportacion.MODOS):
+            modo = TrabajoImportacion.SINCRONIZAR
+
+        # La importación corre como trabajo fuera de la petición; la página consulta su avance
+        trabajo = crear_trabajo(
+            archivo_excel,
+            usuario=request.user,
+            modo=modo,
+            simular=bool(request.POST.get("vista_previa")),
+            desactivar_faltantes=bool(request.POST.get("desactivar_faltantes")),
+        )
+        lanzar_trabajo(trabajo)
+        return redirect(f"{reverse('importar_excel')}?trabajo={trabajo.id}")
+
+    trabajo = None
+    trabajo_id = request.GET.get("trabajo")
+    if trabajo_id and trabajo_id.isdigit():
+        trabajo = TrabajoImportacion.objects.filter(id=trabajo_id).first()
+
+    return render(request, "inventario/importar_excel.html", {
+        'trabajo': trabajo,
+        'modos': TrabajoImportacion.MODOS,
+    })
+
+
+@login_required
+def importar_estado(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoImportacion, id=trabajo_id)
+
+    # Si el proceso que lo ejecutaba murió, se reanuda desde el último paso
+    # confirmado. Solo la consulta que logra reclamarlo lo vuelve a lanzar.
+    if reclamar_trabajo(trabajo):
+        lanzar_trabajo(trabajo)
+
+    return JsonResponse({
+        'id': trabajo.id,
+        'estado': trabajo.estado,
+        'terminado': trabajo.terminado,
+        'hoja_actual': trabajo.hoja_actual,
+        'indice_hoja': trabajo.indice_hoja,
+        'total_hojas': trabajo.total_hojas,
+        'filas_procesadas': trabajo.filas_procesadas,
+        'filas_con_error': trabajo.filas_con_error,
+        'modo': trabajo.modo,
+        'simular': trabajo.simular,
+        'altas': trabajo.altas,
+        'actualizados': trabajo.actualizados,
+        'desactivados': trabajo.desactivados,
+        'sin_cambios': trabajo.sin_cambios,
+        'mensaje': trabajo.mensaje,
+    })
 
-    return render(request, "inventario/importar_excel.html")
+
+@login_required
+def importar_resultado(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoImportacion, id=trabajo_id)
+    return render(request, "inventario/importar_resultado.html", {'resultado': trabajo})
+
+
+@login_required
+def importar_aplicar(request, trabajo_id):
+    # Aplica los cambios de una vista previa ya revisada
+    vista_previa = get_object_or_404(TrabajoImportacion, id=trabajo_id, simular=True)
+    if request.method != "POST" or vista_previa.estado != TrabajoImportacion.COMPLETADO:
+        return redirect("importar_resultado", trabajo_id=vista_previa.id)
+
+    trabajo = aplicar_vista_previa(vista_previa, usuario=request.user)
+    lanzar_trabajo(trabajo)
+    return redirect(f"{reverse('importar_excel')}?trabajo={trabajo.id}")
 
 # --------------------------
-# LISTA PRODUCTOS
+# EXPORTAR INVENTARIO
 # --------------------------
 @login_required
-def lista_productos(request):
-    query = request.GET.get('q', '').strip()
-    categorias = Categoria.objects.all().order_by('nombre')
-    valor_total_inventario = 0
-    productos_por_categoria = {}
+def descargar_inventario(request):
+    # Una hoja por categoría con las columnas del importador, o un CSV
+    formato = request.GET.get('formato')
+    return exportar_inventario(formato if formato in FORMATOS else 'xlsx')
 
-    # Crear diccionario con id de categoría como clave
-    for categoria in categorias:
-        productos_por_categoria[categoria.id] = []
 
-    # Obtener productos con select_related para no hacer muchas consultas
-    productos = Producto.objects.select_related('categoria').all().order_by('categoria__nombre', 'nombre')
+# --------------------------
+# LISTA PRODUCTOS
+# --------------------------
+PRODUCTOS_POR_PAGINA = 50
+# Las versiones viejas de una tabla quedan sin usar y vencen solas
+TABLA_CACHE_SEGUNDOS = 60 * 60 * 24
 
-    if query:
-        productos = productos.filter(Q(nombre__icontains=query) | Q(marca__icontains=query))
 
-    # Llenar diccionario y calcular totales
-    for p in productos:
-        precio_compra = p.precio_compra or 0
-        precio_venta = p.precio_venta or 0
-        cantidad = p.cantidad or 0
+def productos_con_totales(queryset):
+    # Totales por fila: columnas calculadas por la base de datos (margen
+    # también lo es, y se puede ordenar o filtrar por él)
+    return queryset.annotate(inversion=F('total_inversion'), utilidad=F('ganancia'))
 
-        total_inversion = precio_compra * cantidad
-        ganancia = (precio_venta - precio_compra) * cantidad
-        porcentaje_ganancia = ((precio_venta - precio_compra) / precio_compra * 100) if precio_compra > 0 else 0
 
-        valor_total_inventario += total_inversion
+def pagina_productos(request, queryset):
+    paginator = Paginator(productos_con_totales(queryset), PRODUCTOS_POR_PAGINA)
+    return paginator.get_page(request.GET.get('page'))
 
-        productos_por_categoria[p.categoria.id].append({
-            'obj': p,
-            'total_inversion': total_inversion,
-            'ganancia': ganancia,
-            'porcentaje_ganancia': porcentaje_ganancia,
-        })
 
-    productos_filtrados = []
-    if query:
-        for lista in productos_por_categoria.values():
-            productos_filtrados.extend(lista)
+def tabla_categoria(request, categoria):
+    # HTML de una página de la tabla de la categoría. Se guarda en caché con
+    # la fecha de su resumen como versión: el resumen se recalcula cada vez
+    # que cambia un producto o la categoría (ver signals.productos_modificados),
+    # así editar un martillo solo vuelve a renderizar HERRAMIENTAS.
+    def renderizar():
+        productos = Producto.objects.filter(activo=True, categoria=categoria).order_by('nombre')
+        return render_to_string('inventario/_tabla_productos.html', {
+            'categoria': categoria,
+            'pagina': pagina_productos(request, productos),
+        }, request)
+
+    resumen = getattr(categoria, 'resumen', None)
+    if resumen is None:
+        return renderizar()  # categoría nueva, aún sin versión
+
+    numero = request.GET.get('page', '')
+    clave = f"tabla_productos:{categoria.id}:{resumen.actualizado.timestamp()}:{numero if numero.isdigit() else 1}"
+    html = cache.get(clave)
+    metricas.contar_cache('tabla_categoria', html is not None)
+    if html is None:
+        html = renderizar()
+        cache.set(clave, html, TABLA_CACHE_SEGUNDOS)
+    return html
+
+
+@login_required
+def lista_productos(request):
+    query = request.GET.get('q', '').strip()
+    categorias = Categoria.objects.select_related('resumen').order_by('nombre')
+    productos = Producto.objects.filter(activo=True)
 
+    # Totales leídos del resumen por categoría, no de cada producto
     context = {
         'categorias': categorias,
-        'productos_por_categoria': productos_por_categoria,
-        'valor_total_inventario': valor_total_inventario,
+        'valor_total_inventario': totales_inventario()['total_inversion'] or 0,
         'query': query,
-        'productos_filtrados': productos_filtrados,
     }
 
+    if query:
+        filtrados = (
+            productos.filter(Q(nombre__icontains=query) | Q(marca__icontains=query))
+            .select_related('categoria')
+            .order_by('categoria__nombre', 'nombre')
+        )
+        context['pagina'] = pagina_productos(request, filtrados)
+    else:
+        # Solo se renderiza la primera pestaña; las demás se piden al abrirlas
+        primera = categorias.first()
+        if primera:
+            context['tabla_primera'] = tabla_categoria(request, primera)
+
     return render(request, 'inventario/lista_productos.html', context)
 
 
+@login_required
+def productos_categoria(request, categoria_id):
+    # Fragmento HTML con una página de productos de la categoría
+    categoria = get_object_or_404(Categoria.objects.select_related('resumen'), id=categoria_id)
+    return HttpResponse(tabla_categoria(request, categoria))
+
 
 # --------------------------
 # CRUD PRODUCTO
@@ -252,21 +298,165 @@ def eliminar_producto(request, producto_id):
     return render(request, 'inventario/confirmar_eliminar.html', {'producto': producto})
 
 
+# --------------------------
+# REAJUSTE MASIVO DE PRECIOS
+# --------------------------
+@login_required
+def reajustar_precios(request):
+    # GET con filtros: vista previa. POST: aplica el reajuste en un solo UPDATE.
+    datos = request.POST if request.method == 'POST' else (request.GET or None)
+    form = ReajusteForm(datos)
+    previa = None
+
+    if form.is_bound and form.is_valid():
+        datos = form.cleaned_data
+        try:
+            if request.method == 'POST':
+                reajuste = aplicar_reajuste(
+                    form.filtro(), datos['campo'], datos['operacion'], datos['valor'], usuario=request.user
+                )
+                messages.success(request, f"Reajuste #{reajuste.pk} aplicado a {reajuste.productos} productos.")
+                return redirect('reajustar_precios')
+            previa = vista_previa(form.filtro(), datos['campo'], datos['operacion'], datos['valor'])
+        except ValueError as e:  # algún valor no cabría en la columna
+            form.add_error(None, str(e))
+
+    return render(request, 'inventario/reajustar_precios.html', {
+        'form': form,
+        'previa': previa,
+        'reajustes': Reajuste.objects.select_related('usuario').order_by('-creado')[:10],
+    })
+
+
+@login_required
+@require_POST
+def deshacer_reajuste_view(request, reajuste_id):
+    reajuste = get_object_or_404(Reajuste, id=reajuste_id)
+    try:
+        restaurados = deshacer_reajuste(reajuste)
+        mensaje = f"Reajuste #{reajuste.pk} deshecho ({restaurados} productos)."
+        if restaurados < reajuste.productos:
+            mensaje += f" {reajuste.productos - restaurados} se editaron o borraron después y no se tocaron."
+        messages.success(request, mensaje)
+    except ValueError as e:
+        messages.error(request, str(e))
+    return redirect('reajustar_precios')
+
+
+# --------------------------
+# MÉTRICAS
+# --------------------------
+def metricas_view(request):
+    # Para Prometheus: con METRICAS_TOKEN se pide "Authorization: Bearer <token>";
+    # sin token configurado solo las ve el personal (staff)
+    token = getattr(settings, "METRICAS_TOKEN", "")
+    if token:
+        if not constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            return HttpResponse(status=401)
+    elif not request.user.is_staff:
+        return HttpResponse(status=403)
+    return HttpResponse(metricas.texto(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # --------------------------
 # API PRODUCTO
 # --------------------------
+# Máximo de productos por consulta a la API por lotes
+MAX_PRODUCTOS_API = 200
+
+
+def datos_producto(producto):
+    return {
+        'id': producto.id,
+        'nombre': producto.nombre,
+        'precio': str(producto.precio_venta),
+        'stock': str(producto.cantidad),
+    }
+
+
+def etag_catalogo(request, *args, **kwargs):
+    # Igual mientras no cambie ningún producto ni su stock: el navegador
+    # revalida y recibe 304 sin que se consulten los productos
+    if not hasattr(request, '_version_catalogo'):
+        request._version_catalogo = version_catalogo()
+    return f"catalogo-{request._version_catalogo}"
+
+
+def respuesta_catalogo(data, status=200):
+    response = JsonResponse(data, status=status)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+@login_required
+@condition(etag_func=etag_catalogo)
 def producto_api(request, pk):
     try:
-        producto = Producto.objects.get(pk=pk)
-        data = {
-            'id': producto.id,
-            'nombre': producto.nombre,
-            'precio': producto.precio_venta,
-            'stock': producto.cantidad,
-        }
-        return JsonResponse(data)
+        return respuesta_catalogo(datos_producto(Producto.objects.get(pk=pk)))
     except Producto.DoesNotExist:
-        return JsonResponse({'error': 'Producto no encontrado'}, status=404)
+        return respuesta_catalogo({'error': 'Producto no encontrado'}, status=404)
+
+
+@login_required
+@condition(etag_func=etag_catalogo)
+def productos_api(request):
+    # ?ids=1,2,3 -> precio y stock de todos en una consulta
+    ids = [int(parte) for parte in request.GET.get('ids', '').split(',') if parte.strip().isdigit()]
+    if len(ids) > MAX_PRODUCTOS_API:
+        return JsonResponse({'error': f'Máximo {MAX_PRODUCTOS_API} productos por consulta'}, status=400)
+
+    productos = Producto.objects.in_bulk(ids)
+    return respuesta_catalogo({
+        'version': request._version_catalogo,
+        'productos': [datos_producto(productos[pid]) for pid in ids if pid in productos],
+        'no_encontrados': [pid for pid in ids if pid not in productos],
+    })
+
+
+@gzip_page
+@login_required
+@condition(etag_func=etag_catalogo)
+def catalogo_api(request):
+    # Sin ?desde= el catálogo completo; con ?desde=<marca de la respuesta
+    # anterior> solo los cambios. La página de ventas lo guarda en el navegador.
+    return respuesta_catalogo({
+        'version': request._version_catalogo,
+        **catalogo(leer_marca(request.GET.get('desde'))),
+    })
+
+
+@login_required
+@require_POST
+def verificar_carrito_api(request):
+    # Cuerpo JSON: {"lineas": [{"id": 1, "cantidad": 3}, ...]}. Informa todas
+    # las líneas sin stock suficiente de una vez, antes de registrar la venta.
+    try:
+        lineas = json.loads(request.body)['lineas']
+        faltantes, no_encontrados = verificar_carrito((linea['id'], linea['cantidad']) for linea in lineas)
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Formato no válido'}, status=400)
+    except VentaInvalida as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    return JsonResponse({
+        'ok': not faltantes and not no_encontrados,
+        'faltantes': [
+            {'id': producto.id, 'nombre': producto.nombre, 'pedido': pedido, 'disponible': str(disponible)}
+            for producto, pedido, disponible in faltantes
+        ],
+        'no_encontrados': no_encontrados,
+    })
+
+
+@login_required
+def buscar_productos_api(request):
+    consulta = request.GET.get('q', '').strip()
+    try:
+        limite = min(int(request.GET.get('limite', LIMITE_RESULTADOS)), LIMITE_MAXIMO)
+    except ValueError:
+        limite = LIMITE_RESULTADOS
+
+    return JsonResponse({'resultados': indice.buscar(consulta, limite)})
 
 
 # --------------------------